@@ -0,0 +1,296 @@
+'''
+JsonPathScannerClass
+
+Finds a single value in a (large) JSON file, by key path, without parsing the
+rest of the file.
+
+The Preferences file of a heavily used profile can be many megabytes, and
+json.load() builds a Python object for every value in it, when all that's
+wanted is devtools.preferences.script-snippets.  This class instead mmaps the
+file and walks just the objects along the path:
+o Keys along the path are compared as they're found
+o Any other value is skipped by compiled regexes (a whole string, scalar or
+  run of members with plain values in one match, and the inside of an
+  object/array up to its next bracket), without decoding or keeping it
+o Only the bytes of the value at the end of the path are copied out, and only
+  those are handed to json.loads()
+
+So the work done in Python is per member of the objects along the path and per
+bracket of the values skipped, not per value in the file, and only the pages
+of the file that are scanned are read in.
+
+The byte offsets of the value are also available (find()), which is what
+lets a value be replaced in place without rewriting the rest of the file.
+
+Example:
+    scanner = JsonPathScannerClass("Preferences")
+    snippets_json = scanner.read(['devtools', 'preferences',
+                                  'script-snippets'])
+
+Only object keys are supported in the path (not array indexes), which is all
+the Preferences file needs.
+'''
+
+import json
+import mmap
+import os
+import re
+import shutil
+
+
+class JsonPathScannerClass:
+
+    _chunk_size = 1024 * 1024
+
+    _whitespace = re.compile(rb'[ \t\r\n]*')
+
+    _string = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+    # Everything up to the next bracket, including any complete strings, so
+    # skipping an object/array only takes a Python step per bracket.
+    _skip_to_bracket = re.compile(
+        rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*', re.DOTALL)
+
+    # Numbers, true, false, null.
+    _scalar_chars = re.compile(rb'[^,}\]\s]*')
+
+    # Constructor
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file      = None
+        self.map       = b''
+        self.pos       = 0    # Current file offset
+
+    '''
+    A regex matching any run of members (each followed by a comma) whose
+    value is a string or scalar, and whose key isn't key (or has escapes, so
+    it has to be decoded to compare it), starting at the first key.
+    '''
+    @staticmethod
+    def get_skip_members(key):
+        key_bytes = re.escape(json.dumps(key, ensure_ascii=False)[1:-1].encode('utf-8'))
+        return re.compile(
+            rb'(?:(?!"' + key_bytes + rb'")"[^"\\]*"[ \t\r\n]*:[ \t\r\n]*'
+            rb'(?:"[^"\\]*(?:\\.[^"\\]*)*"|[^,}\]\s"{\[]+)'
+            rb'[ \t\r\n]*,[ \t\r\n]*)*', re.DOTALL)
+
+    '''
+    Return the next non-whitespace byte (as an int) without consuming it, or
+    None at the end of the file.
+    '''
+    def peek(self):
+        self.pos = JsonPathScannerClass._whitespace.match(self.map,
+                                                          self.pos).end()
+        if self.pos < len(self.map):
+            return self.map[self.pos]
+        return None
+
+    def expect(self, char):
+        found = self.peek()
+        if found != ord(char):
+            raise ValueError('Expected "{0}" at offset {1}, found {2}'.format(
+                char, self.pos,
+                'end of file' if found == None else '"{0}"'.format(chr(found))))
+        self.pos += 1
+
+    '''
+    Skip over a string, starting at its opening quote.  Returns the file
+    offset just past the closing quote.
+    '''
+    def skip_string(self):
+        if self.peek() != ord('"'):
+            self.expect('"')
+
+        match = JsonPathScannerClass._string.match(self.map, self.pos)
+        if match == None:
+            raise ValueError('Unterminated string in "{0}"'.format(
+                self.file_name))
+
+        self.pos = match.end()
+        return self.pos
+
+    '''
+    Read a string and return it decoded (used for keys).
+    '''
+    def read_string(self):
+        start = self.peek_offset()
+        end = self.skip_string()
+        raw = self.map[start + 1:end - 1]
+        if b'\\' in raw:
+            return json.loads(self.map[start:end])
+        return raw.decode('utf-8')
+
+    def peek_offset(self):
+        if self.peek() == None:
+            raise ValueError('Unexpected end of file in "{0}"'.format(
+                self.file_name))
+        return self.pos
+
+    '''
+    Skip over a whole value of any type.
+    '''
+    def skip_value(self):
+        char = self.map[self.peek_offset()]
+
+        if char == ord('"'):
+            self.skip_string()
+        elif char in b'{[':
+            self.skip_container()
+        else:
+            self.pos = JsonPathScannerClass._scalar_chars.match(
+                self.map, self.pos).end()
+
+    '''
+    Skip over an object or array, by counting brackets (strings are skipped
+    by the same regex, so brackets inside them don't count).
+    '''
+    def skip_container(self):
+        skip_to_bracket = JsonPathScannerClass._skip_to_bracket.match
+        data = self.map
+        pos = self.pos
+        depth = 0
+
+        while True:
+            pos = skip_to_bracket(data, pos).end()
+
+            if pos >= len(data) or data[pos] == 0x22: # "
+                self.pos = pos
+                raise ValueError('Unterminated object/array in "{0}"'.
+                                 format(self.file_name))
+
+            char = data[pos]
+            pos += 1
+            if char == 0x7b or char == 0x5b: # { [
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self.pos = pos
+                    return
+
+    '''
+    Find the value at the given key path, and return its (start, end) file
+    offsets (end is exclusive).
+
+    Raises KeyError if any key along the path doesn't exist.
+    '''
+    def find(self, path):
+        self.pos = 0
+
+        for depth, key in enumerate(path):
+            if self.peek() != ord('{'):
+                raise KeyError('.'.join(path[:depth + 1]))
+            self.pos += 1
+
+            skip_members = JsonPathScannerClass.get_skip_members(key).match
+
+            while True:
+                if self.peek() == ord('}'):
+                    raise KeyError('.'.join(path[:depth + 1]))
+
+                self.pos = skip_members(self.map, self.pos).end()
+
+                name = self.read_string()
+                self.expect(':')
+
+                if name == key:
+                    break
+
+                self.skip_value()
+
+                if self.peek() == ord(','):
+                    self.pos += 1
+
+        start = self.peek_offset()
+        self.skip_value()
+
+        return start, self.pos
+
+    '''
+    Open the file, and map it (an empty file can't be mapped, but it has
+    nothing to find anyway).
+    '''
+    def open(self):
+        self.file = open(self.file_name, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.map = b''
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.map = b''
+        self.file.close()
+
+    '''
+    Return the raw bytes of the value at the given key path.
+    '''
+    def read_raw(self, path):
+        self.open()
+        try:
+            start, end = self.find(path)
+            return self.map[start:end]
+        finally:
+            self.close()
+
+    '''
+    Return the value at the given key path, decoded.  Nothing else in the
+    file is decoded.
+    '''
+    def read(self, path):
+        return json.loads(self.read_raw(path))
+
+    '''
+    Replace the raw bytes of the value at the given key path with raw_value
+    (which must already be valid JSON), leaving every other byte of the file
+    as it was.
+
+    The new file is written to a temp file next to it, by copying the bytes
+    before and after the value around the new value (nothing is decoded),
+    and then renamed over the original, so the file is never half written.
+
+    Raises KeyError if the path isn't in the file, and OSError if the file
+    changed (size or mtime) while it was being copied.
+
+    Returns the (start, end) byte offsets the old value had.
+    '''
+    def replace_raw(self, path, raw_value):
+        temp_file_name = "{0}.{1}.tmp".format(self.file_name, os.getpid())
+
+        self.open()
+        try:
+            stat = os.fstat(self.file.fileno())
+            start, end = self.find(path)
+
+            try:
+                with open(temp_file_name, 'wb') as temp_file:
+                    self.file.seek(0)
+                    self.copy_bytes(temp_file, start)
+                    temp_file.write(raw_value)
+                    self.file.seek(end)
+                    self.copy_bytes(temp_file, stat.st_size - end)
+
+                current = os.stat(self.file_name)
+                if (current.st_size != stat.st_size or
+                    current.st_mtime_ns != stat.st_mtime_ns):
+                    raise OSError('"{0}" changed while it was being '
+                                  'written'.format(self.file_name))
+
+                shutil.copymode(self.file_name, temp_file_name)
+            except BaseException:
+                os.remove(temp_file_name)
+                raise
+        finally:
+            self.close()
+
+        os.replace(temp_file_name, self.file_name)
+        return start, end
+
+    def copy_bytes(self, output_file, count):
+        while count > 0:
+            data = self.file.read(min(count, JsonPathScannerClass._chunk_size))
+            if len(data) == 0:
+                raise OSError('Unexpected end of "{0}"'.format(self.file_name))
+            output_file.write(data)
+            count -= len(data)
@@ -0,0 +1,156 @@
+'''
+PreferencesModelClass
+
+The whole Preferences file, for --query, with a binary cache so querying the
+same profiles again doesn't parse their (often many megabyte) JSON again.
+
+A query is a dotted key path, where each segment can have glob wildcards
+(* ? [...], see fnmatch), and list items are matched by index:
+
+    devtools.preferences.*
+    extensions.settings.*.manifest.name
+    devtools.preferences.script-snippets.*.name
+
+A "." that is part of a key is escaped as "\.", ex. "profile.content_settings.
+exceptions.cookies.https://www\.example\.com:443,*".
+
+Several Preferences values are JSON encoded strings inside the JSON (ex.
+devtools.preferences.script-snippets).  Those are only decoded when a query
+goes past them (like the last example above), and then just once per load.
+A query that stops at such a value gets the string itself.
+
+The cache is one file per Preferences file in the cache directory, named
+after a hash of the Preferences file's full path.  It's the parsed values in
+marshal format (much faster to load than JSON, with the nested JSON strings
+still undecoded), and is only used if the Preferences file still has the
+same size and mtime.  Otherwise the Preferences file is parsed and the cache
+file rewritten.
+'''
+
+import fnmatch
+import gc
+import hashlib
+import json
+import marshal
+import os
+import re
+
+
+class PreferencesModelClass:
+
+    _version = 1 # Bump this if the format of the cache file changes.
+
+    # Constructor
+    def __init__(self, preferences_file, cache_directory):
+        self.preferences_file = preferences_file
+        self.cache_file = os.path.join(cache_directory, "{0}.bin".format(
+            hashlib.sha1(os.path.normcase(os.path.abspath(preferences_file)).
+                         encode('utf-8')).hexdigest()))
+        self.root = None
+        self.decoded = {} # id of a JSON encoded string -> (string, value)
+
+    '''
+    Split a query into its key segments, on the dots that aren't escaped.
+    '''
+    @staticmethod
+    def parse_path(path):
+        return [ segment.replace('\\.', '.')
+                 for segment in re.split(r'(?<!\\)\.', path) ]
+
+    @staticmethod
+    def format_path(keys):
+        return '.'.join(str(key).replace('.', '\\.') for key in keys)
+
+    '''
+    Load the Preferences file, from the cache if it's current.  Returns True
+    if it came from the cache.
+    '''
+    def load(self):
+        # A Preferences file is many thousands of small dicts and lists, and
+        # building them kept setting off the cyclic garbage collector, which
+        # took longer than the parsing itself.  Nothing loaded can be a cycle.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.load_root()
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def load_root(self):
+        stat = os.stat(self.preferences_file)
+        key  = (PreferencesModelClass._version, stat.st_size,
+                stat.st_mtime_ns)
+
+        try:
+            # One read: marshal.load() reads a file in lots of small pieces.
+            with open(self.cache_file, 'rb') as f:
+                cache_key, root = marshal.loads(f.read())
+            if cache_key == key:
+                self.root = root
+                return True
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        with open(self.preferences_file, 'r', encoding='utf-8') as f:
+            self.root = json.load(f)
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = "{0}.{1}.tmp".format(self.cache_file, os.getpid())
+        with open(temp_file, 'wb') as f:
+            f.write(marshal.dumps((key, self.root)))
+        os.replace(temp_file, self.cache_file)
+
+        return False
+
+    '''
+    The children of a value, as (key, value) tuples.  A JSON encoded string
+    is decoded (once, the decoded value is kept for the next query that goes
+    into it).
+    '''
+    def get_children(self, value):
+        if isinstance(value, str):
+            if id(value) in self.decoded:
+                value = self.decoded[id(value)][1]
+            elif value.lstrip().startswith(('{', '[')):
+                try:
+                    decoded = json.loads(value)
+                except ValueError:
+                    return []
+                # The string is kept too, so its id isn't reused.
+                self.decoded[id(value)] = (value, decoded)
+                value = decoded
+
+        if isinstance(value, dict):
+            return value.items()
+        if isinstance(value, list):
+            return enumerate(value)
+        return []
+
+    '''
+    Find every value matching the query.  Returns a list of (key path,
+    value) tuples, in file order.
+    '''
+    def query(self, path):
+        segments = PreferencesModelClass.parse_path(path)
+        matches  = [ ([], self.root) ]
+
+        for segment in segments:
+            is_glob = any(c in segment for c in '*?[')
+            next_matches = []
+
+            for keys, value in matches:
+                # Direct lookup where possible, instead of trying every key.
+                if not is_glob and isinstance(value, dict):
+                    if segment in value:
+                        next_matches.append((keys + [segment],
+                                             value[segment]))
+                    continue
+
+                for child_key, child in self.get_children(value):
+                    if fnmatch.fnmatchcase(str(child_key), segment):
+                        next_matches.append((keys + [child_key], child))
+
+            matches = next_matches
+
+        return matches
@@ -0,0 +1,194 @@
+'''
+SnapshotStoreClass
+
+Content addressed history of snippets, for --snapshot, --snapshot-log and
+--snapshot-diff.
+
+Each run of --snapshot records a snapshot: which snippets a profile had at
+that time, and their contents.  Contents are stored once per unique content
+(named by their sha256), so hundreds of snapshots of mostly unchanged
+snippets take about as much space as one copy of each version of each
+snippet, plus a small manifest per snapshot.
+
+Store layout:
+
+    STORE/
+        objects/9f/86d081884c7d65...   zlib compressed snippet contents,
+                                       named by sha256 of the contents
+        snapshots/<id>.json            one manifest per snapshot
+        log.jsonl                      one line per snapshot, so listing
+                                       snapshots is a single small read
+
+A snapshot manifest looks like:
+
+    {
+        "id": "20240906-012131-3f2a9c1e",
+        "timestamp": "2024-09-06 01:21:31",
+        "profile": "Chrome/Default",
+        "preferences_file": "C:\\Users\\Foo\\...\\Default\\Preferences",
+        "snippets": { "Scratch": "9f86d0...", ... }
+    }
+
+Snapshot ids sort by time, and can be abbreviated to any unique prefix.
+
+Everything is written to a temp file and renamed, so several processes
+(--all-profiles) can add to the same store at once.
+'''
+
+import hashlib
+import json
+import os
+import zlib
+
+from datetime import datetime
+
+
+class SnapshotStoreClass:
+
+    # Constructor
+    def __init__(self, store_directory):
+        self.store_directory    = store_directory
+        self.objects_directory  = os.path.join(store_directory, 'objects')
+        self.snapshot_directory = os.path.join(store_directory, 'snapshots')
+        self.log_file           = os.path.join(store_directory, 'log.jsonl')
+
+    @staticmethod
+    def get_hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def get_object_file(self, content_hash):
+        return os.path.join(self.objects_directory, content_hash[:2],
+                            content_hash[2:])
+
+    @staticmethod
+    def write_file(file_name, data):
+        temp_file = "{0}.{1}.tmp".format(file_name, os.getpid())
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, file_name)
+
+    '''
+    Store the content (if it isn't already), and return its hash.  Returns
+    (hash, True if it was new).
+    '''
+    def add_object(self, content):
+        data = content.encode('utf-8')
+        content_hash = SnapshotStoreClass.get_hash(data)
+        object_file = self.get_object_file(content_hash)
+
+        if os.path.isfile(object_file):
+            return content_hash, False
+
+        os.makedirs(os.path.dirname(object_file), exist_ok=True)
+        SnapshotStoreClass.write_file(object_file, zlib.compress(data, 9))
+        return content_hash, True
+
+    def read_object(self, content_hash):
+        with open(self.get_object_file(content_hash), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8')
+
+    '''
+    Return the log of snapshots, oldest first, as a list of dicts with id,
+    timestamp, profile and count (number of snippets).
+    '''
+    def read_log(self):
+        if not os.path.isfile(self.log_file):
+            return []
+
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            return [ json.loads(line) for line in f if line.strip() ]
+
+    '''
+    Find the snapshot id that starts with the given (abbreviated) id.  Raises
+    KeyError if there's no such snapshot, or more than one.
+    '''
+    def resolve_id(self, snapshot_id):
+        matches = [ entry['id'] for entry in self.read_log()
+                    if entry['id'].startswith(snapshot_id) ]
+
+        if len(matches) != 1:
+            raise KeyError('{0} snapshots match "{1}"'.format(
+                           'No' if len(matches) == 0 else 'Several',
+                           snapshot_id))
+        return matches[0]
+
+    def read_snapshot(self, snapshot_id):
+        snapshot_file = os.path.join(self.snapshot_directory,
+                                     "{0}.json".format(
+                                         self.resolve_id(snapshot_id)))
+        with open(snapshot_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    '''
+    Return the latest snapshot of the given profile, or None.
+    '''
+    def get_latest_snapshot(self, profile):
+        for entry in reversed(self.read_log()):
+            if entry['profile'] == profile:
+                return self.read_snapshot(entry['id'])
+        return None
+
+    '''
+    Record a snapshot of the given scripts (dicts with 'name' and 'content')
+    for the profile.
+
+    If the profile's latest snapshot already has exactly the same snippets,
+    nothing is recorded.
+
+    Returns (snapshot, number of new objects stored, True if a snapshot was
+    recorded), where snapshot is the new (or unchanged latest) manifest.
+    '''
+    def add_snapshot(self, profile, preferences_file, scripts):
+        snippets  = {}
+        num_new   = 0
+        for script in scripts:
+            content_hash, is_new = self.add_object(script['content'])
+            snippets[script['name']] = content_hash
+            num_new += is_new
+
+        latest = self.get_latest_snapshot(profile)
+        if latest and latest['snippets'] == snippets:
+            return latest, num_new, False
+
+        now = datetime.now()
+        snapshot = { 'timestamp'        : "{:%Y-%m-%d %H:%M:%S}".format(now),
+                     'profile'          : profile,
+                     'preferences_file' : os.path.abspath(preferences_file),
+                     'snippets'         : snippets }
+
+        contents = json.dumps(snapshot, sort_keys=True).encode('utf-8')
+        snapshot['id'] = "{0:%Y%m%d-%H%M%S}-{1}".format(
+            now, SnapshotStoreClass.get_hash(contents)[:8])
+
+        os.makedirs(self.snapshot_directory, exist_ok=True)
+        SnapshotStoreClass.write_file(
+            os.path.join(self.snapshot_directory,
+                         "{0}.json".format(snapshot['id'])),
+            json.dumps(snapshot, indent=4, sort_keys=True).encode('utf-8'))
+
+        # One write per line, in append mode, so lines from processes adding
+        # at the same time don't get mixed up.
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({ 'id'        : snapshot['id'],
+                                 'timestamp' : snapshot['timestamp'],
+                                 'profile'   : profile,
+                                 'count'     : len(snippets) }) + '\n')
+
+        return snapshot, num_new, True
+
+    '''
+    Compare two snapshots.  Only the hashes are compared, so no contents are
+    read.
+
+    Returns (added, removed, modified) lists of snippet names.
+    '''
+    def diff(self, snapshot_a, snapshot_b):
+        snippets_a = snapshot_a['snippets']
+        snippets_b = snapshot_b['snippets']
+
+        added    = sorted(name for name in snippets_b if name not in snippets_a)
+        removed  = sorted(name for name in snippets_a if name not in snippets_b)
+        modified = sorted(name for name in snippets_a if name in snippets_b and
+                          snippets_a[name] != snippets_b[name])
+
+        return added, removed, modified
@@ -0,0 +1,146 @@
+'''
+SnippetIndexClass
+
+Persistent trigram index of the snippets in one Preferences file, so --grep
+doesn't have to re-read the Preferences file and search every snippet on
+every run.
+
+Each Preferences file gets its own index file in the index directory, named
+after a hash of the Preferences file's full path.  Keeping them separate means
+profiles processed in parallel (--all-profiles) never write the same file, and
+a change to one profile only rebuilds that profile's index.
+
+An index file is JSON:
+
+    {
+        "version": 1,
+        "preferences_file": "C:\\Users\\Foo\\...\\Default\\Preferences",
+        "size": 5231234,
+        "mtime": 1700000000000000000,
+        "snippets": [ { "name": "Scratch", "content": "..." }, ... ],
+        "trigrams": { "fet": [0, 4, 9], "etc": [0, 4, 9, 12], ... }
+    }
+
+The index is only used if the Preferences file still has the same size and
+mtime, otherwise it's rebuilt from the Preferences file.
+
+Trigrams are taken from the lower cased contents, so an index lookup finds
+every snippet that *might* match (case sensitive or not), and the actual
+search is then only run on those.
+'''
+
+import hashlib
+import json
+import os
+
+
+class SnippetIndexClass:
+
+    _version = 1 # Bump this if the format of the index file changes.
+
+    # Constructor
+    def __init__(self, index_directory, preferences_file):
+        self.preferences_file = preferences_file
+        self.index_file = os.path.join(index_directory, "{0}.json".format(
+            hashlib.sha1(SnippetIndexClass.get_key(preferences_file).
+                         encode('utf-8')).hexdigest()))
+        self.size     = -1
+        self.mtime    = 0
+        self.snippets = []
+        self.trigrams = {} # trigram -> sorted list of indexes into snippets
+
+    @staticmethod
+    def get_key(file_name):
+        return os.path.normcase(os.path.abspath(file_name))
+
+    @staticmethod
+    def get_trigrams(text):
+        text = text.lower()
+        return { text[i:i + 3] for i in range(len(text) - 2) }
+
+    '''
+    Load the index file, if there is one and it matches the current size and
+    mtime of the Preferences file.
+
+    Returns True if the index is current (and loaded).
+    '''
+    def load(self):
+        stat = os.stat(self.preferences_file)
+        self.size  = stat.st_size
+        self.mtime = stat.st_mtime_ns
+
+        if not os.path.isfile(self.index_file):
+            return False
+
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                contents = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if (contents.get('version') != SnippetIndexClass._version or
+            contents.get('preferences_file') !=
+                SnippetIndexClass.get_key(self.preferences_file) or
+            contents.get('size') != self.size or
+            contents.get('mtime') != self.mtime):
+            return False
+
+        self.snippets = contents['snippets']
+        self.trigrams = contents['trigrams']
+        return True
+
+    '''
+    Build the index for the given snippets (as read from the Preferences file
+    when load() returned False).
+    '''
+    def build(self, snippets):
+        self.snippets = snippets
+        self.trigrams = {}
+
+        for index, snippet in enumerate(snippets):
+            for trigram in SnippetIndexClass.get_trigrams(snippet['content']):
+                self.trigrams.setdefault(trigram, []).append(index)
+
+    '''
+    Write the index file.  Written to a temp file and renamed, so a reader
+    never sees a partly written index.
+    '''
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+
+        temp_file = "{0}.{1}.tmp".format(self.index_file, os.getpid())
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({ 'version'          : SnippetIndexClass._version,
+                        'preferences_file' :
+                            SnippetIndexClass.get_key(self.preferences_file),
+                        'size'             : self.size,
+                        'mtime'            : self.mtime,
+                        'snippets'         : self.snippets,
+                        'trigrams'         : self.trigrams }, f)
+        os.replace(temp_file, self.index_file)
+
+    '''
+    Return the indexes of the snippets that contain every one of the given
+    literal strings (possibly, the trigram lookup is only a filter).
+
+    Literals shorter than 3 chars can't be looked up, and are ignored.  With
+    no usable literals at all, every snippet is a candidate.
+    '''
+    def get_candidates(self, literals):
+        candidates = None
+
+        for literal in literals:
+            for trigram in SnippetIndexClass.get_trigrams(literal):
+                postings = self.trigrams.get(trigram, [])
+                if candidates == None:
+                    candidates = set(postings)
+                else:
+                    candidates.intersection_update(postings)
+
+                if len(candidates) == 0:
+                    return []
+
+        if candidates == None:
+            return list(range(len(self.snippets)))
+
+        return sorted(candidates)
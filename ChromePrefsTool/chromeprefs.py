@@ -40,7 +40,8 @@ Edge
 ~/.config/google-chrome/Default/Preferences
 
 NOTE:  Parts of path may be slightly different, depending on which release
-channel you have installed or Profile you are operating under.
+channel you have installed or Profile you are operating under.  The
+-a/--all-profiles option looks through all of them.
 
 
 At the time this script was created, the Preferences file contains a large JSON
@@ -51,14 +52,46 @@ And within the dictionary: dict['devtools']['preferences']['script-snippets']
 
 And each Snippet has a 'name' and 'content' field.
 
-usage: chromeprefs.py [-h] -i INPUT_FILE [-o OUTPUT_DIRECTORY]
-                        [-n SCRIPT_NAME_PATTERN] [-l] [-c] [-s]
+Only that one value is decoded (JsonPathScannerClass.py skips over everything
+else with regexes, without decoding it).  prefsbench.py measures it against
+json.load() of the whole file: it takes about a quarter of the time on a 1 MB
+file with little in the way of snippets, and about two thirds of the time when
+the snippets are a large part of the file, since they still have to be
+decoded.
+
+usage: chromeprefs.py [-h] [-i INPUT_FILE] [-a]
+                        [--user-data-dir USER_DATA_DIRS [USER_DATA_DIRS ...]]
+                        [-j JOBS] [-o OUTPUT_DIRECTORY]
+                        [-n SCRIPT_NAME_PATTERN] [-g GREP_PATTERN]
+                        [--index-directory INDEX_DIRECTORY]
+                        [-q PATH [PATH ...]]
+                        [--cache-directory CACHE_DIRECTORY] [-l] [-c] [-s]
+                        [--archive ARCHIVE_FILE] [--snapshot STORE]
+                        [--snapshot-log STORE]
+                        [--snapshot-diff STORE SNAPSHOT_A SNAPSHOT_B]
+                        [--import IMPORT_DIRECTORY] [--prune]
+                        [--write-threads WRITE_THREADS] [-w]
+                        [--poll-interval POLL_INTERVAL] [--debounce DEBOUNCE]
 
     -h, --help            show this help message and exit
 
     -i INPUT_FILE, --input-file INPUT_FILE
                         Name of file to process
 
+    -a, --all-profiles    Instead of -i, process the Preferences file of every
+                          Chrome/Edge/Chromium profile found for the current
+                          user. Snippets are saved to
+                          <OUTPUT_DIRECTORY>/<Browser>/<Profile>
+
+    --user-data-dir USER_DATA_DIRS [USER_DATA_DIRS ...]
+                        Additional user data directories (ones holding
+                        "Default", "Profile 1", ...) for --all-profiles to
+                        search
+
+    -j JOBS, --jobs JOBS
+                        Number of profiles processed in parallel with
+                        --all-profiles.  Default is the number of CPUs.
+
     -o OUTPUT_DIRECTORY, --output-directory OUTPUT_DIRECTORY
                         Path to the directory where files are to be saved.
                         If omitted, current dir is used
@@ -66,6 +99,24 @@ usage: chromeprefs.py [-h] -i INPUT_FILE [-o OUTPUT_DIRECTORY]
                         Name of script to find (regex patterns supported)Ex:
                         snippet_(1|3), finds "snippet_1" and "snippet_3"
 
+    -g GREP_PATTERN, --grep GREP_PATTERN
+                        Only show snippets whose contents match this regex,
+                        along with the matching lines.  Ex: "fetch\(.*api/v2"
+
+    --index-directory INDEX_DIRECTORY
+                        Directory of the snippet index files used by --grep.
+                        Default is "snippetindex" next to this script.
+
+    -q PATH [PATH ...], --query PATH [PATH ...]
+                        Instead of snippets, show the Preferences values at
+                        these dotted key paths (glob wildcards allowed in each
+                        part).  Ex: "extensions.settings.*.manifest.name"
+
+    --cache-directory CACHE_DIRECTORY
+                        Directory of the parsed Preferences cache files used
+                        by --query.  Default is "prefscache" next to this
+                        script.
+
     -l, --list            List the file names
 
     -c, --show-contents   Show script contents in console
@@ -73,6 +124,41 @@ usage: chromeprefs.py [-h] -i INPUT_FILE [-o OUTPUT_DIRECTORY]
     -s, --save-contents   Save contents of the snippets foundFile will be named
                           <NAME>.js
 
+    --archive ARCHIVE_FILE
+                          Save the snippets found into this one archive file
+                          (.zip, .tar, .tar.gz/.tgz, .tar.bz2, .tar.xz), with
+                          an index.json of names, sizes and hashes
+
+    --snapshot STORE      Record a snapshot of the snippets found in this
+                          snapshot store directory (created if needed)
+
+    --snapshot-log STORE  List the snapshots in this snapshot store
+
+    --snapshot-diff STORE SNAPSHOT_A SNAPSHOT_B
+                          Show the differences between two snapshots in this
+                          snapshot store (ids can be abbreviated)
+
+    --import IMPORT_DIRECTORY
+                          Import the .js files in this directory (ex. saved
+                          with -s, then edited) back into the -i file's
+                          snippets.  The browser must be closed.
+
+    --prune               With -s, remove the files of snippets that were
+                          renamed or deleted since the last export
+
+    --write-threads WRITE_THREADS
+                          Number of threads used to write changed snippets
+                          with -s
+
+    -w, --watch           Keep watching the -i file, and save (-s is implied)
+                          any snippets that change, until Ctrl+C
+
+    --poll-interval POLL_INTERVAL
+                          Seconds between checks of the file with --watch
+
+    --debounce DEBOUNCE   Seconds the file has to stay unchanged, after a
+                          change, before it is read with --watch
+
 Example:
     chromeprefs.py
     -i "C:/Users/Foo/AppData/Local/Google/Chrome/User Data/Default/Preferences"
@@ -82,20 +168,172 @@ Example:
     in their name and will show the the contents as well as save to /Snippets
     directory.
 
-TODO:
-    - Support absence of -i/--input-file param, and find it for current user.
+    Exports are incremental: a manifest (snippets-manifest.json) in the
+    output directory has the hash and size of each snippet written, so only
+    new or changed snippets get written again (to a temp file, then renamed,
+    on a few threads).  Snippets that have since been renamed or deleted are
+    reported, and with --prune their old files are removed.
+
+    chromeprefs.py -i "<...>/Default/Preferences" --import ./Snippets
+
+    This is the reverse of -s: snippets edited (or added) as .js files in
+    ./Snippets are put back into the Preferences file, so DevTools has them
+    next time the browser starts (it must not be running, see
+    get_browser_lock()).  Only the bytes of the script-snippets value are
+    replaced, by copying the rest of the file around the new value into a
+    temp file and renaming it over the original.  Nothing else in the file
+    is decoded or re-encoded, so key order, formatting and everything else
+    Chrome wrote stay exactly as they were.
+
+    chromeprefs.py -i "<...>/Default/Preferences" --archive Snippets.zip
+
+    This will save all the snippets into one zip file, in a single write,
+    which is much faster than creating thousands of small files (especially
+    on a network drive).  Entry names have anything that can't be in a file
+    name replaced, and an index.json entry lists each snippet's name, entry
+    name, size and sha256.
+
+    chromeprefs.py --all-profiles --snapshot ./SnippetHistory
+    chromeprefs.py --snapshot-log ./SnippetHistory
+    chromeprefs.py --snapshot-diff ./SnippetHistory 20240906-0121 20240913
+
+    The first records a snapshot of every profile's snippets.  Contents are
+    stored compressed, once per unique content (named by hash), so repeated
+    snapshots only cost a small manifest plus whatever actually changed (a
+    profile with no changes at all doesn't get a new snapshot).  The log is
+    a single small file, and a diff compares hashes, only reading the
+    contents of snippets that changed.  See SnapshotStoreClass.py
+
+    chromeprefs.py -i "<...>/Default/Preferences" --watch -o ./Snippets
+
+    This will keep ./Snippets in sync with DevTools (ex. a directory under
+    version control) until Ctrl+C.  The file is only stat'ed each
+    --poll-interval, and once a change has settled (--debounce), just the
+    script-snippets value is read; if it's the same as before, nothing else
+    happens, otherwise the changed snippets are exported as above.
+
+    chromeprefs.py --all-profiles --grep "chrome\.storage\.local"
+
+    This will show every snippet, in every profile, that uses
+    chrome.storage.local, and the lines that use it.  The first search of a
+    profile builds a trigram index of its snippets (SnippetIndexClass.py), and
+    later searches just look up the parts of the pattern that have to be in
+    any match, and only search the snippets that have them.  A profile's
+    index is rebuilt when its Preferences file changes (size or mtime).
+
+    chromeprefs.py --all-profiles --query "extensions.settings.*.manifest.name"
+                   "devtools.preferences.script-snippets.*.name"
+
+    This will show the name of every extension installed, and of every
+    snippet, in every profile.  Each part of a query can have wildcards
+    (* ? [...]), list items are matched by index, and a "." that's part of a
+    key is written "\.".  Values that are JSON strings inside the JSON (like
+    script-snippets) are only decoded when a query goes into them.  The
+    parsed file is cached (PreferencesModelClass.py, marshal format, keyed by
+    the file's path, size and mtime), so querying again doesn't parse the
+    JSON again.
+
+    chromeprefs.py --all-profiles -l -s -o ./Snippets
+
+    This will find every profile of every Chrome/Edge/Chromium install (all
+    release channels) for the current user, and save each profile's snippets
+    to its own directory, ex. ./Snippets/Chrome/Default,
+    ./Snippets/Edge Beta/Profile 1.  Profiles are processed in parallel on a
+    pool of processes (-j/--jobs), and each one's output is shown in one
+    piece.
 '''
 
 import json
 import argparse
+import contextlib
+import difflib
+import hashlib
+import io
 import os
 import re
+import socket
+import sys
+import tarfile
+import time
+import zipfile
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+# The regex parser, for the literals --grep looks up in the snippet index
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Finds a single value in the Preferences file without parsing all of it
+from JsonPathScannerClass import JsonPathScannerClass
+
+# Persistent trigram index of snippet contents, used by --grep
+from SnippetIndexClass import SnippetIndexClass
+
+# Content addressed snippet history, used by --snapshot
+from SnapshotStoreClass import SnapshotStoreClass
+
+# Whole Preferences file (cached) for --query
+from PreferencesModelClass import PreferencesModelClass
+
+# Key path of the (JSON encoded) snippets string in the Preferences file
+script_snippets_path = ['devtools', 'preferences', 'script-snippets']
+
 # Global options object, produced by argparse.ArgumentParser.parse_args()
 options = None
 
+# Export manifest (see read_manifest()), written to the output directory
+manifest_name    = 'snippets-manifest.json'
+manifest_version = 1
+
+# Archive file extensions for --archive, and the zipfile/tarfile stream mode
+archive_modes = [
+    (('.zip',),            'zip'),
+    (('.tar.gz', '.tgz'),  'w|gz'),
+    (('.tar.bz2', '.tbz'), 'w|bz2'),
+    (('.tar.xz', '.txz'),  'w|xz'),
+    (('.tar',),            'w|'),
+]
+
+# Known user data directories (relative to the platform's base directory) for
+# --all-profiles, as (browser name, directory) tuples.  The browser name is
+# also the first level of the output subdirectories.
+user_data_dirs = {
+    'win32' : [
+        ('Chrome',        'Google/Chrome/User Data'),
+        ('Chrome Beta',   'Google/Chrome Beta/User Data'),
+        ('Chrome Dev',    'Google/Chrome Dev/User Data'),
+        ('Chrome Canary', 'Google/Chrome SxS/User Data'),
+        ('Chromium',      'Chromium/User Data'),
+        ('Edge',          'Microsoft/Edge/User Data'),
+        ('Edge Beta',     'Microsoft/Edge Beta/User Data'),
+        ('Edge Dev',      'Microsoft/Edge Dev/User Data'),
+        ('Edge Canary',   'Microsoft/Edge SxS/User Data'),
+    ],
+    'darwin' : [
+        ('Chrome',        'Google/Chrome'),
+        ('Chrome Beta',   'Google/Chrome Beta'),
+        ('Chrome Dev',    'Google/Chrome Dev'),
+        ('Chrome Canary', 'Google/Chrome Canary'),
+        ('Chromium',      'Chromium'),
+        ('Edge',          'Microsoft Edge'),
+        ('Edge Beta',     'Microsoft Edge Beta'),
+        ('Edge Dev',      'Microsoft Edge Dev'),
+        ('Edge Canary',   'Microsoft Edge Canary'),
+    ],
+    'linux' : [
+        ('Chrome',        'google-chrome'),
+        ('Chrome Beta',   'google-chrome-beta'),
+        ('Chrome Dev',    'google-chrome-unstable'),
+        ('Chromium',      'chromium'),
+        ('Edge',          'microsoft-edge'),
+        ('Edge Beta',     'microsoft-edge-beta'),
+        ('Edge Dev',      'microsoft-edge-dev'),
+    ],
+}
+
 '''
 read_input_file_into_dict
 
@@ -108,6 +346,24 @@ def read_input_file_into_dict(file_name):
     except Exception as err:
         output_string("{0}: {1}".format( type(err), err) )
 
+'''
+read_script_snippets
+
+Read just the script snippets out of the given Preferences file, and return
+them as a list of { 'name': ..., 'content': ... } dicts.
+
+The snippets are a JSON string inside the Preferences JSON, so they're decoded
+twice: once as the string value, and again as the list in it.  Nothing else
+in the file is decoded (see JsonPathScannerClass), so this is quicker than
+read_input_file_into_dict(), by how much depends on how much of the file
+isn't snippets (see prefsbench.py).
+
+Raises KeyError if the file has no devtools.preferences.script-snippets.
+'''
+def read_script_snippets(file_name):
+    scanner = JsonPathScannerClass(file_name)
+    return json.loads(scanner.read(script_snippets_path))
+
 '''
 write_script_to_file
 
@@ -117,59 +373,478 @@ The item is a simple object in the Preferences file that has 'name' and
 'content' fields.
 
 Resulting file will be written to:
-"<options.output_directory>\<script_name>.js"
+"<full_directory_path>\<file_name>"
+file_name defaults to "<script_name>.js" (with any characters that can't be in
+a file name replaced, see get_safe_file_name()); export_scripts() gives its
+own, so snippets whose names end up the same don't share a file.
+
+If full_directory_path isn't given, options.output_directory is used (and
+created if needed).  If options.output_directory was not provided by the user,
+the default is the current directory.
+
+The file is written to a temp file first and then renamed, so an existing
+file is never left half written.
 
-If options.output_directory was not provided by the user, the default is the
-current directory.
+Returns the size of the file written, or None if it wasn't written.
 '''
-def write_script_to_file( script ):
+def write_script_to_file( script, full_directory_path=None, file_name=None ):
     global options
 
     if (len(script['content']) == 0):
         output_string('No contents for script \"{0}\"'.format(script['name']))
-        return
+        return None
 
-    # If output directory doesn't exist, create it.
-    full_directory_path = os.path.abspath(options.output_directory)
-    #output_string( "full_directory_path: {0}".format(full_directory_path))
+    if full_directory_path == None:
+        full_directory_path = create_output_directory()
 
-    if not os.path.isdir(full_directory_path):
-        output_string("Creating Path: \"{0}\"".format(full_directory_path))
-        os.makedirs(full_directory_path, exist_ok=True)
+    if file_name == None:
+        file_name = "{0}.js".format(get_safe_file_name(script['name']))
 
-    full_path_Name = "{0}{1}{2}.js".format(os.path.abspath(
-        options.output_directory), os.sep, script['name'])
+    full_path_Name = "{0}{1}{2}".format(full_directory_path, os.sep, file_name)
+    temp_path_name = "{0}.tmp".format(full_path_Name)
 
     try:
-        with open(full_path_Name, 'w') as output_file:
+        with open(temp_path_name, 'w', encoding='utf-8',
+                  newline='') as output_file:
             output_file.write(script['content'])
+        os.replace(temp_path_name, full_path_Name)
     except OSError as err:
         output_string("[OSError] {0}: {1}".format( type(err), err) )
+        return None
     except Exception as err:
         output_string("[Exception] {0}: {1}".format( type(err), err) )
+        return None
 
     output_string( "Wrote {0} bytes to {1}".format(len(script['content']),
         full_path_Name))
 
+    return os.path.getsize(full_path_Name)
+
+'''
+read_script_from_file
+
+The reverse of write_script_to_file(): read a .js file back into a script
+item, with the given name.  Both use UTF-8 (what the Preferences file is in)
+and leave line endings as they are, so a snippet goes back exactly as it came
+out, whatever the OS.
+'''
+def read_script_from_file(full_path_name, name):
+    with open(full_path_name, 'r', encoding='utf-8',
+              newline='') as input_file:
+        return { 'name' : name, 'content' : input_file.read() }
+
+'''
+get_browser_lock
+
+Return the lock file showing the browser is running with the profile the
+Preferences file is in, or None if it isn't running.
+
+Chrome/Edge keep a lock in the user data directory (the directory the profile
+directories are in) while they run:
+o Linux/macOS: "SingletonLock", a symlink to "<hostname>-<pid>".  It's left
+  behind if the browser crashes, so it's ignored if that process is gone.
+o Windows: "lockfile", which the browser keeps open without sharing it, so it
+  can't be opened (or locked) by anyone else.  It's only opened to check,
+  never removed or changed.
+'''
+def get_browser_lock(file_name):
+    user_data_dir = os.path.dirname(os.path.dirname(os.path.abspath(file_name)))
+
+    singleton_lock = os.path.join(user_data_dir, 'SingletonLock')
+    if os.path.lexists(singleton_lock):
+        try:
+            host, _, pid = os.readlink(singleton_lock).rpartition('-')
+            if host == socket.gethostname():
+                os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return None # Left behind by a browser that's no longer running
+        except (OSError, ValueError):
+            pass
+        return singleton_lock
+
+    lock_file = os.path.join(user_data_dir, 'lockfile')
+    if sys.platform == 'win32' and os.path.isfile(lock_file):
+        import msvcrt
+
+        try:
+            with open(lock_file, 'ab') as f:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                except OSError:
+                    return lock_file
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        except PermissionError:
+            return lock_file
+        except OSError:
+            pass
+
+    return None
+
+'''
+get_snippets_value
+
+Encode the snippets the way they're stored in the Preferences file: a JSON
+list, as written by DevTools (JSON.stringify(), no whitespace), inside a JSON
+string, as written by Chrome (UTF-8 as is, with "<", U+2028 and U+2029
+escaped).
+'''
+def get_snippets_value(script_snippets):
+    snippets_json = json.dumps(script_snippets, ensure_ascii=False,
+                               separators=(',', ':'))
+    value = json.dumps(snippets_json, ensure_ascii=False)
+
+    return (value.replace('<', '\\u003C').replace('\u2028', '\\u2028').
+            replace('\u2029', '\\u2029').encode('utf-8'))
+
+'''
+import_scripts
+
+--import: the reverse of -s.  Read the .js files in options.import_directory
+back into the Preferences file's snippets, adding any that aren't there and
+updating the ones whose contents changed.  Snippets that don't have a file
+are left as they are.  With -n, only snippets whose names match are
+imported.
+
+File names are mapped back to snippet names with the export manifest, if the
+directory has one (names that had to be changed to be file names), otherwise
+the name is the file name without ".js".
+
+Only the script-snippets value is replaced (see
+JsonPathScannerClass.replace_raw()), every other byte of the file stays as
+it was, and nothing but the snippets is decoded or encoded.  The browser
+must not be running with the profile, or it would just write its own copy
+of the snippets back.
+'''
+def import_scripts(file_name):
+    global options
+
+    name_rx = compile_pattern(options.script_name_pattern)
+    if name_rx == False:
+        return
+
+    lock_file = get_browser_lock(file_name)
+    if lock_file != None:
+        output_string("The browser is running with this profile (\"{0}\")"
+                      .format(lock_file))
+        output_string("**** Close it and try again, nothing was imported")
+        return
+
+    import_directory = os.path.abspath(options.import_directory)
+    file_names = { entry['file'] : name for name, entry in read_manifest(
+                   os.path.join(import_directory, manifest_name)).items() }
+
+    try:
+        script_snippets = read_script_snippets(file_name)
+    except Exception as err:
+        output_string("Failed to read snippets from \"{0}\"".format(file_name))
+        output_string("[Exception] {0}: {1}".format(type(err), err))
+        return
+
+    snippet_indexes = { script['name'] : index for index, script
+                        in enumerate(script_snippets) }
+    num_added = num_updated = num_unchanged = 0
+
+    for js_file in sorted(os.listdir(import_directory)):
+        if not js_file.endswith('.js'):
+            continue
+
+        name = file_names.get(js_file, js_file[:-len('.js')])
+        if name_rx and not name_rx.match(name):
+            continue
+
+        script = read_script_from_file(os.path.join(import_directory, js_file),
+                                       name)
+        index = snippet_indexes.get(name)
+
+        if index == None:
+            output_string('Added  : "{0}" ({1:,})'.format(name,
+                          len(script['content'])))
+            snippet_indexes[name] = len(script_snippets)
+            script_snippets.append(script)
+            num_added += 1
+        elif script_snippets[index]['content'] != script['content']:
+            output_string('Updated: "{0}" ({1:,})'.format(name,
+                          len(script['content'])))
+            script_snippets[index] = dict(script_snippets[index],
+                                          content=script['content'])
+            num_updated += 1
+        else:
+            num_unchanged += 1
+
+    if num_added + num_updated > 0:
+        try:
+            start, end = JsonPathScannerClass(file_name).replace_raw(
+                script_snippets_path, get_snippets_value(script_snippets))
+        except Exception as err:
+            output_string("Failed to write \"{0}\"".format(file_name))
+            output_string("[Exception] {0}: {1}".format(type(err), err))
+            return
+
+        output_string("Replaced bytes {0:,}-{1:,} of \"{2}\"".format(start,
+                      end, file_name))
+
+    output_string("Imported: {0} added, {1} updated, {2} unchanged".format(
+        num_added, num_updated, num_unchanged))
+
+
+'''
+create_output_directory
+
+If output directory doesn't exist, create it.  Returns the full path of it.
+'''
+def create_output_directory():
+    global options
+
+    full_directory_path = os.path.abspath(options.output_directory)
+
+    if not os.path.isdir(full_directory_path):
+        output_string("Creating Path: \"{0}\"".format(full_directory_path))
+        os.makedirs(full_directory_path, exist_ok=True)
+
+    return full_directory_path
+
+'''
+get_content_hash
+
+Hash of a snippet's contents, as recorded in the export manifest.
+'''
+def get_content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+'''
+read_manifest
+
+Read the export manifest in the given directory, which looks like:
+
+    {
+        "version": 1,
+        "snippets": {
+            "Scratch": { "file": "Scratch.js", "hash": "9f86d08...",
+                         "size": 1234 },
+            ...
+        }
+    }
+
+A missing or unreadable manifest just means everything gets written.
+'''
+def read_manifest(manifest_file):
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            contents = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if contents.get('version') != manifest_version:
+        return {}
+
+    return contents.get('snippets', {})
+
+def write_manifest(manifest_file, snippets):
+    temp_file = "{0}.tmp".format(manifest_file)
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({ 'version'  : manifest_version,
+                    'snippets' : snippets }, f, indent=4, sort_keys=True)
+    os.replace(temp_file, manifest_file)
+
+'''
+get_export_file_names
+
+Choose the file each of the scripts is exported to, as a dict of name ->
+file name.  A script keeps the file the manifest has for it, unless an
+earlier script already has that file (ex. "a/b" and "a_b", from before file
+names were made unique).  Otherwise it gets a unique name (see
+get_unique_file_name()) that no other script, and no other snippet in the
+manifest, has.  File names are compared ignoring case, for Windows/macOS.
+'''
+def get_export_file_names(scripts, manifest):
+    file_names = {}
+    used_names = set()
+
+    for script in scripts:
+        entry = manifest.get(script['name'])
+        if entry and entry['file'].lower() not in used_names:
+            file_names[script['name']] = entry['file']
+            used_names.add(entry['file'].lower())
+
+    selected_names = set(script['name'] for script in scripts)
+    used_names.update(entry['file'].lower() for name, entry
+                      in manifest.items() if name not in selected_names)
+
+    for script in scripts:
+        if script['name'] not in file_names:
+            file_names[script['name']] = get_unique_file_name(
+                get_safe_file_name(script['name']), '.js', used_names)
+
+    return file_names
+
+'''
+file_matches_grep
+
+Whether any line of the (exported snippet) file matches grep_rx, the same
+test process_file() does on snippet contents.  False if it can't be read.
+'''
+def file_matches_grep(file_name, grep_rx):
+    try:
+        content = read_script_from_file(file_name, '')['content']
+    except (OSError, ValueError):
+        return False
+
+    return any(grep_rx.search(line) for line in content.splitlines())
+
+'''
+export_scripts
+
+Save the given scripts (the ones selected by process_file()) to the output
+directory, only writing the ones that changed since the last export.
+
+The manifest in the output directory (see read_manifest()) has the content
+hash and size of each snippet as last written.  A snippet is skipped if its
+hash is unchanged and its file is still there with the same size.
+
+Each snippet keeps the file the manifest says it was written to.  New ones
+get <safe name>.js (see get_safe_file_name()), with " (2)", " (3)"... added
+if another snippet already has that file, as in write_archive(), and the
+file chosen is recorded in the manifest, so it stays the same next time.
+
+Snippets in the manifest that are no longer in the Preferences file
+(all_names, the names of every snippet in it) are reported as renamed (same
+contents now under another name) or deleted, if they'd have been selected:
+they match -n (name_rx), and -g (grep_rx) matches their exported file.
+With --prune, their files are removed too, otherwise they stay in the
+manifest and keep being reported.  Snippets that are still in the file, but
+weren't selected this time, are left alone.
+
+Changed snippets are written on a small pool of threads (--write-threads).
+'''
+def export_scripts(scripts, name_rx, grep_rx=None, all_names=None):
+    global options
+
+    full_directory_path = create_output_directory()
+    manifest_file = os.path.join(full_directory_path, manifest_name)
+    manifest = read_manifest(manifest_file)
+    new_manifest = dict(manifest)
+
+    to_write = []
+    selected_hashes = {} # content hash -> name, of every script selected
+    num_unchanged = 0
+
+    for script in scripts:
+        if (len(script['content']) == 0):
+            output_string('No contents for script \"{0}\"'.format(
+                script['name']))
+    scripts = [ script for script in scripts if len(script['content']) > 0 ]
+    file_names = get_export_file_names(scripts, manifest)
+
+    for script in scripts:
+        content_hash = get_content_hash(script['content'])
+        selected_hashes.setdefault(content_hash, script['name'])
+
+        entry = manifest.get(script['name'])
+        if (entry and entry['hash'] == content_hash and
+            entry['file'] == file_names[script['name']]):
+            try:
+                if os.path.getsize(os.path.join(full_directory_path,
+                                                entry['file'])) == entry['size']:
+                    num_unchanged += 1
+                    continue
+            except OSError:
+                pass # File is gone, so write it again.
+
+        to_write.append((script, content_hash))
+
+    # Anything that was exported before, but isn't now.
+    selected_names = set(script['name'] for script in scripts)
+    selected_files = set(file_name.lower() for file_name in
+                         file_names.values())
+    num_renamed = num_deleted = 0
+
+    for name in sorted(manifest.keys()):
+        if name in selected_names or (name_rx and not name_rx.match(name)):
+            continue
+
+        # Still there, just not selected (ex. didn't match --grep).
+        if all_names != None and name in all_names:
+            continue
+
+        if grep_rx and not file_matches_grep(os.path.join(
+                full_directory_path, manifest[name]['file']), grep_rx):
+            continue
+
+        renamed_to = selected_hashes.get(manifest[name]['hash'])
+        if renamed_to:
+            output_string('Renamed: "{0}" -> "{1}"'.format(name, renamed_to))
+            num_renamed += 1
+        else:
+            output_string('Deleted: "{0}"'.format(name))
+            num_deleted += 1
+
+        if (options.prune_files):
+            # Unless a snippet being exported has the file now.
+            if manifest[name]['file'].lower() not in selected_files:
+                try:
+                    os.remove(os.path.join(full_directory_path,
+                                           manifest[name]['file']))
+                    output_string('Removed "{0}"'.format(
+                        manifest[name]['file']))
+                except FileNotFoundError:
+                    pass
+            del new_manifest[name]
+
+    with ThreadPoolExecutor(max_workers=options.write_threads) as executor:
+        sizes = executor.map(lambda item: write_script_to_file(item[0],
+                             full_directory_path,
+                             file_names[item[0]['name']]), to_write)
+
+        for (script, content_hash), size in zip(to_write, sizes):
+            if size != None:
+                new_manifest[script['name']] = {
+                    'file' : file_names[script['name']],
+                    'hash' : content_hash,
+                    'size' : size }
+
+    if new_manifest != manifest:
+        write_manifest(manifest_file, new_manifest)
+
+    output_string("Exported: {0} written, {1} unchanged, {2} renamed, "
+                  "{3} deleted{4}".format(len(to_write), num_unchanged,
+                  num_renamed, num_deleted,
+                  " (pruned)" if options.prune_files and
+                  num_renamed + num_deleted > 0 else ""))
+
 
 '''
 process_file
 
 This is the main routine that processes the given file.
+
+If script_snippets is given (ex. already read by watch_file()), the file isn't
+read again.
 '''
-def process_file(file_name):
+def process_file(file_name, script_snippets=None):
     global options
 
-    file_contents_dict = read_input_file_into_dict(file_name)
+    # Compile any patterns once, up front, rather than per snippet.
+    name_rx = compile_pattern(options.script_name_pattern)
+    grep_rx = compile_pattern(options.grep_pattern)
+    if name_rx == False or grep_rx == False:
+        return
 
-    if (file_contents_dict == None):
+    try:
+        if grep_rx:
+            # Only the snippets the index says might match need searching.
+            index = get_snippet_index(file_name)
+            script_snippets = index.snippets
+            candidates = index.get_candidates(
+                get_pattern_literals(options.grep_pattern))
+        else:
+            if script_snippets == None:
+                script_snippets = read_script_snippets(file_name)
+            candidates = range(len(script_snippets))
+    except OSError as err:
         output_string("Failed to read file: \"{0}\"".format(file_name))
         output_string("**** Check path and filename are as expected")
+        output_string("[OSError] {0}: {1}".format( type(err), err) )
         return
-
-    try:
-        script_snippets = json.loads(file_contents_dict['devtools']
-                                     ['preferences']['script-snippets'])
     except KeyError as err:
         output_string("KeyError {0}: {1}".format( type(err), err) )
         output_string( ("**** Is the file missing devtools.preferences."
@@ -182,39 +857,578 @@ def process_file(file_name):
         return
 
     num_scripts_found = 0
-    for script in script_snippets:
-            select_script = True
+    scripts_to_save = []
+    for script_index in candidates:
+            script = script_snippets[script_index]
 
             # if a name/pattern was provided, check for match
-            if (len(options.script_name_pattern) > 0):
+            if name_rx and not name_rx.match(script['name']):
+                continue
+
+            matching_lines = []
+            if grep_rx:
+                matching_lines = [ (line_number, line) for line_number, line
+                                   in enumerate(script['content'].splitlines(),
+                                                1)
+                                   if grep_rx.search(line) ]
+                if len(matching_lines) == 0:
+                    continue
+
+            num_scripts_found += 1
+            if (options.list_snippets or grep_rx):
+                output_string( 'Name: {0} ({1:,})'.format(script['name'],
+                    len(script['content'])))
+
+            for line_number, line in matching_lines:
+                output_string( '    {0:>5}: {1}'.format(line_number,
+                                                        line.strip()))
+
+            if (options.show_contents):
+                output_string( '{0}\n'.format(script['content']))
+                output_string('='*80)
+
+            if (options.save_contents or len(options.archive_file) > 0 or
+                len(options.snapshot_store) > 0):
+                scripts_to_save.append(script)
+
+    output_string("Showing: {0} of {1}".format(num_scripts_found,
+        len(script_snippets)))
+
+    if (options.save_contents):
+        export_scripts(scripts_to_save, name_rx, grep_rx,
+                       set(script['name'] for script in script_snippets))
+
+    if (len(options.archive_file) > 0):
+        write_archive(scripts_to_save, options.archive_file)
+
+    if (len(options.snapshot_store) > 0):
+        record_snapshot(scripts_to_save, file_name)
+
+
+'''
+compile_pattern
+
+Compile the given regex pattern, outputting what's wrong with it if it's
+invalid.
+
+Returns the compiled regex, None if the pattern is empty, or False if it
+could not be compiled.
+'''
+def compile_pattern(pattern):
+    if (len(pattern) == 0):
+        return None
+
+    try:
+        return re.compile(pattern)
+    except Exception as err:
+        output_string("Failed to compile regex: {0}".format(pattern))
+        output_string("[Exception] {0}: {1}".format( type(err), err))
+        output_string("**** Check regex pattern")
+        return False
+
+'''
+get_pattern_literals
+
+Return the plain text parts of a regex pattern that any match must contain,
+ex. "fetch\(.*api/v2" gives ["fetch(", "api/v2"].  These are looked up in the
+snippet index to narrow down which snippets need searching.
+
+The pattern is parsed with the re module's own parser, so escapes (ex. "\x41"
+is "A") mean what they do in the regex.  Only characters every match must
+have are kept: anything in an optional or repeated-0-times part (ex. "(xyz)?",
+"(?:abc)*"), a "|" alternative, a character class or a lookaround just splits
+the literals.  A pattern with "|" at the top gives no literals at all, which
+means every snippet gets searched.
+'''
+def get_pattern_literals(pattern):
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return []
+
+    literals = []
+
+    # Add the literals of items to literals, current being the literal the
+    # items follow on from.  Returns the literal the last items end with.
+    def add_literals(items, current):
+        for op, value in items:
+            if op == sre_parse.LITERAL:
+                current += chr(value)
+            elif op == sre_parse.SUBPATTERN:
+                current = add_literals(value[-1], current)
+            elif (op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and
+                  value[0] >= 1):
+                # At least once, but what's before and after it isn't
+                # necessarily next to it.
+                literals.append(current)
+                literals.append(add_literals(value[2], ''))
+                current = ''
+            else:
+                literals.append(current)
+                current = ''
+        return current
+
+    literals.append(add_literals(parsed, ''))
+    return [ literal for literal in literals if len(literal) >= 3 ]
+
+'''
+get_snippet_index
+
+Return the SnippetIndexClass for the given Preferences file, loaded from the
+index directory if it's still current, otherwise rebuilt from the Preferences
+file (and saved for next time).
+'''
+def get_snippet_index(file_name):
+    global options
+
+    index = SnippetIndexClass(options.index_directory, file_name)
+    if not index.load():
+        index.build(read_script_snippets(file_name))
+        index.save()
+        output_string("Indexed {0} snippets from \"{1}\"".format(
+            len(index.snippets), file_name))
+
+    return index
+
+
+'''
+query_file
+
+--query: show every value in the Preferences file that matches one of the
+query paths (see PreferencesModelClass.py), as <key path> = <JSON value>.
+'''
+def query_file(file_name):
+    global options
+
+    model = PreferencesModelClass(file_name, options.cache_directory)
+
+    try:
+        from_cache = model.load()
+    except Exception as err:
+        output_string("Failed to read \"{0}\"".format(file_name))
+        output_string("[Exception] {0}: {1}".format(type(err), err))
+        return
+
+    output_string("Loaded \"{0}\"{1}".format(file_name,
+                  " (cached)" if from_cache else ""))
+
+    num_matches = 0
+    for query_path in options.query_paths:
+        for keys, value in model.query(query_path):
+            output_string("{0} = {1}".format(
+                PreferencesModelClass.format_path(keys),
+                json.dumps(value, ensure_ascii=False)))
+            num_matches += 1
+
+    output_string("{0} matches".format(num_matches))
+
+
+'''
+get_safe_file_name
+
+Turn a snippet name into something that can be used as a file name on any OS:
+path separators, characters Windows doesn't allow ( <>:"/\|?* ) and control
+characters become "_", trailing dots/spaces are dropped, and reserved
+Windows device names (CON, NUL, COM1...) get a "_" prefix.
+'''
+def get_safe_file_name(name):
+    safe_name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', name).rstrip('. ')
+
+    if len(safe_name) == 0:
+        safe_name = '_'
+
+    if re.match(r'^(CON|PRN|AUX|NUL|COM\d|LPT\d)(\..*)?$', safe_name,
+                re.IGNORECASE):
+        safe_name = '_' + safe_name
+
+    return safe_name
+
+'''
+get_unique_file_name
+
+<base_name><extension>, or if that's in used_names (lower case names),
+"<base_name> (2)<extension>", "<base_name> (3)<extension>"...  The name is
+added to used_names.
+'''
+def get_unique_file_name(base_name, extension, used_names):
+    file_name = "{0}{1}".format(base_name, extension)
+    copy_number = 2
+    while file_name.lower() in used_names:
+        file_name = "{0} ({1}){2}".format(base_name, copy_number, extension)
+        copy_number += 1
+    used_names.add(file_name.lower())
+    return file_name
+
+'''
+get_archive_mode
+
+The tarfile stream mode for the archive file name, "zip" for a zip file, or
+None if the extension isn't one that's supported.
+'''
+def get_archive_mode(archive_file):
+    lower_name = archive_file.lower()
+
+    for extensions, mode in archive_modes:
+        if lower_name.endswith(extensions):
+            return mode
+
+    return None
+
+'''
+write_archive
+
+Write the given scripts into a single zip or tar archive (depending on the
+extension of archive_file), instead of one file each in the output directory.
+
+Each snippet is an entry named <safe name>.js (see get_safe_file_name(), with
+" (2)", " (3)"... added if two names end up the same), and there's an
+index.json entry listing each snippet's name, entry name, size (bytes, UTF-8)
+and sha256.
+
+The archive is written front to back in one pass (tar files in stream mode),
+which is much cheaper than thousands of separate file creates, especially on
+network drives.
+'''
+def write_archive(scripts, archive_file):
+    mode = get_archive_mode(archive_file)
+
+    directory = os.path.dirname(os.path.abspath(archive_file))
+    if not os.path.isdir(directory):
+        output_string("Creating Path: \"{0}\"".format(directory))
+        os.makedirs(directory, exist_ok=True)
+
+    index = []
+    used_names = set()
+
+    def get_entries():
+        for script in scripts:
+            if (len(script['content']) == 0):
+                output_string('No contents for script \"{0}\"'.format(
+                    script['name']))
+                continue
+
+            entry_name = get_unique_file_name(
+                get_safe_file_name(script['name']), '.js', used_names)
+
+            data = script['content'].encode('utf-8')
+            index.append({ 'name'   : script['name'],
+                           'file'   : entry_name,
+                           'size'   : len(data),
+                           'sha256' : hashlib.sha256(data).hexdigest() })
+            yield entry_name, data
+
+    if mode == 'zip':
+        with zipfile.ZipFile(archive_file, 'w',
+                             compression=zipfile.ZIP_DEFLATED) as archive:
+            for entry_name, data in get_entries():
+                archive.writestr(entry_name, data)
+
+            archive.writestr('index.json', json.dumps(index, indent=4))
+    else:
+        modified_time = time.time()
+
+        def add_entry(archive, entry_name, data):
+            info = tarfile.TarInfo(entry_name)
+            info.size  = len(data)
+            info.mtime = modified_time
+            archive.addfile(info, io.BytesIO(data))
+
+        with tarfile.open(archive_file, mode) as archive:
+            for entry_name, data in get_entries():
+                add_entry(archive, entry_name, data)
+
+            add_entry(archive, 'index.json',
+                      json.dumps(index, indent=4).encode('utf-8'))
+
+    output_string("Wrote {0} snippets ({1:,} bytes) to {2}".format(len(index),
+        sum(entry['size'] for entry in index), archive_file))
+
+
+'''
+record_snapshot
+
+Add a snapshot of the given scripts to the --snapshot store (see
+SnapshotStoreClass.py).  The profile is options.profile_name with
+--all-profiles, otherwise the name of the directory the Preferences file is
+in (ex. "Default").
+'''
+def record_snapshot(scripts, file_name):
+    global options
+
+    profile = getattr(options, 'profile_name', None)
+    if profile == None:
+        profile = os.path.basename(os.path.dirname(os.path.abspath(file_name)))
+
+    store = SnapshotStoreClass(options.snapshot_store)
+    snapshot, num_new, recorded = store.add_snapshot(profile, file_name,
+                                                     scripts)
+
+    if recorded:
+        output_string("Snapshot {0}: {1} snippets, {2} new contents "
+                      "stored".format(snapshot['id'], len(snapshot['snippets']),
+                                      num_new))
+    else:
+        output_string("Snapshot unchanged since {0} ({1})".format(
+            snapshot['id'], profile))
+
+'''
+output_snapshot_log
+
+--snapshot-log: list the snapshots in the store, oldest first.
+'''
+def output_snapshot_log(store_directory):
+    store = SnapshotStoreClass(store_directory)
+    log = store.read_log()
+
+    for entry in log:
+        output_string("{0}  {1}  {2:>5} snippets  {3}".format(entry['id'],
+            entry['timestamp'], entry['count'], entry['profile']))
+
+    output_string("{0} snapshots in \"{1}\"".format(len(log), store_directory))
+
+'''
+output_snapshot_diff
+
+--snapshot-diff: show which snippets were added, removed or modified between
+two snapshots (ids can be abbreviated), and a unified diff of each modified
+one.  Only the contents of modified snippets are read from the store.
+'''
+def output_snapshot_diff(store_directory, snapshot_id_a, snapshot_id_b):
+    store = SnapshotStoreClass(store_directory)
+
+    try:
+        snapshot_a = store.read_snapshot(snapshot_id_a)
+        snapshot_b = store.read_snapshot(snapshot_id_b)
+    except (KeyError, OSError, ValueError) as err:
+        output_string("Unable to read snapshot: {0}".format(err))
+        return
+
+    added, removed, modified = store.diff(snapshot_a, snapshot_b)
+
+    output_string("{0} ({1}) -> {2} ({3})".format(snapshot_a['id'],
+        snapshot_a['profile'], snapshot_b['id'], snapshot_b['profile']))
+
+    for name in added:
+        output_string("Added   : {0}".format(name))
+
+    for name in removed:
+        output_string("Removed : {0}".format(name))
+
+    for name in modified:
+        output_string("Modified: {0}".format(name))
+
+        diff = difflib.unified_diff(
+            store.read_object(snapshot_a['snippets'][name]).splitlines(),
+            store.read_object(snapshot_b['snippets'][name]).splitlines(),
+            '{0}/{1}'.format(snapshot_a['id'], name),
+            '{0}/{1}'.format(snapshot_b['id'], name), lineterm='')
+        for line in diff:
+            print(line)
+
+    output_string("{0} added, {1} removed, {2} modified".format(len(added),
+        len(removed), len(modified)))
+
+
+'''
+get_file_state
+
+The (mtime, size) of a file, used to notice changes in --watch mode.  None if
+the file can't be stat'ed (ex. in the middle of Chrome replacing it).
+'''
+def get_file_state(file_name):
+    try:
+        stat = os.stat(file_name)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+'''
+watch_file
+
+--watch mode: keep the snippets saved in options.output_directory in sync
+with the given Preferences file, until Ctrl+C.
+
+The file is only stat'ed every --poll-interval seconds, so this costs next to
+nothing while idle.  When the mtime/size changes, it has to stay the same for
+--debounce seconds before anything is read, since Chrome tends to rewrite the
+file several times in a row.
+
+Chrome rewrites Preferences for all sorts of reasons besides snippets, so
+only the script-snippets value is read (JsonPathScannerClass), and if its
+bytes are the same as last time, nothing else is done.  Otherwise the usual
+incremental export (export_scripts()) writes just the snippets that changed.
+'''
+def watch_file(file_name):
+    global options
+
+    output_string("Watching \"{0}\" (poll every {1}s, debounce {2}s), Ctrl+C "
+                  "to stop".format(file_name, options.poll_interval,
+                                   options.debounce))
+    last_state = None
+    last_hash  = None
+
+    try:
+        while True:
+            state = get_file_state(file_name)
+
+            if state != None and state != last_state:
+                # Wait for Chrome to finish writing it.
+                time.sleep(options.debounce)
+                if get_file_state(file_name) != state:
+                    continue
+
+                last_state = state
+
                 try:
-                    rx = re.compile('{0}'.format(options.script_name_pattern))
+                    snippets_json = JsonPathScannerClass(file_name).read_raw(
+                        script_snippets_path)
                 except Exception as err:
-                    output_string("Failed to compile regex: {0}".format(
-                        options.script_name_pattern))
-                    output_string("[Exception] {0}: {1}".format( type(err),
-                        err))
-                    output_string("**** Check regex pattern")
-                    return
+                    output_string("Failed to read snippets from \"{0}\"".format(
+                        file_name))
+                    output_string("[Exception] {0}: {1}".format(type(err), err))
+                    snippets_json = None
 
-                if not re.match(rx, script['name']):
-                    select_script = False
+                snippets_hash = (hashlib.sha256(snippets_json).digest()
+                                 if snippets_json != None else None)
 
-            if select_script:
-                num_scripts_found += 1
-                if (options.list_snippets):
-                    output_string( 'Name: {0} ({1:,})'.format(script['name'],
-                        len(script['content'])))
+                if snippets_json != None and snippets_hash != last_hash:
+                    last_hash = snippets_hash
+                    process_file(file_name,
+                                 json.loads(json.loads(snippets_json)))
 
-                if (options.show_contents):
-                    output_string( '{0}\n'.format(script['content']))
-                    output_string('='*80)
+            time.sleep(options.poll_interval)
+    except KeyboardInterrupt:
+        output_string("Stopped watching \"{0}\"".format(file_name))
 
-                if (options.save_contents):
-                    write_script_to_file(script)
 
-    output_string("Showing: {0} of {1}".format(num_scripts_found,
-        len(script_snippets)))
+'''
+get_user_data_roots
+
+Return the browser user data directories that exist for the current user, as
+(browser name, directory) tuples.  Any directories given with --user-data-dir
+are included as well, named after the directory itself.
+
+Base directories are:
+    Windows: %LOCALAPPDATA%
+    macOS  : ~/Library/Application Support
+    Linux  : $XDG_CONFIG_HOME (~/.config)
+'''
+def get_user_data_roots():
+    global options
+
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA',
+                              os.path.expanduser('~/AppData/Local'))
+        candidates = user_data_dirs['win32']
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+        candidates = user_data_dirs['darwin']
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME', os.path.expanduser('~/.config'))
+        candidates = user_data_dirs['linux']
+
+    roots = [ (name, os.path.join(base, directory))
+              for name, directory in candidates ]
+
+    for directory in options.user_data_dirs:
+        roots.append((os.path.basename(os.path.normpath(directory)), directory))
+
+    return [ (name, directory) for name, directory in roots
+             if os.path.isdir(directory) ]
+
+'''
+find_all_profiles
+
+Find the Preferences file of every profile under the given user data
+directories.  Each profile is a subdirectory ("Default", "Profile 1",
+"Guest Profile", ...) with a Preferences file in it.
+
+Returns a list of (namespace, preferences file) tuples, where namespace is
+"<browser name>/<profile directory>", used for the output subdirectory.
+'''
+def find_all_profiles(roots):
+    profiles = []
+
+    for name, root in roots:
+        try:
+            entries = sorted(os.scandir(root), key=lambda entry: entry.name)
+        except OSError as err:
+            output_string("Unable to scan \"{0}\": {1}".format(root, err))
+            continue
+
+        for entry in entries:
+            preferences_file = os.path.join(entry.path, 'Preferences')
+            if entry.is_dir() and os.path.isfile(preferences_file):
+                profiles.append((os.path.join(name, entry.name),
+                                 preferences_file))
+
+    return profiles
+
+'''
+process_profile
+
+Worker for --all-profiles, run in a separate process: processes one profile's
+Preferences file, with snippets saved to
+"<options.output_directory>/<namespace>".
+
+Everything output is captured and returned as a string, so the parent process
+can show each profile's output in one piece (and in order) rather than
+interleaved with the others.
+'''
+def process_profile(profile_options, namespace, file_name):
+    global options
+
+    options = argparse.Namespace(**vars(profile_options))
+    options.profile_name = namespace.replace(os.sep, '/')
+    options.output_directory = os.path.join(profile_options.output_directory,
+                                            namespace)
+    if (len(profile_options.archive_file) > 0):
+        options.archive_file = os.path.join(
+            os.path.dirname(profile_options.archive_file), namespace,
+            os.path.basename(profile_options.archive_file))
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        output_string("[{0}] {1}".format(namespace, file_name))
+        if (len(options.query_paths) > 0):
+            query_file(file_name)
+        else:
+            process_file(file_name)
+
+    return output.getvalue()
+
+'''
+process_all_profiles
+
+Find every Chrome/Edge/Chromium profile of the current user, and process them
+all in parallel on a pool of processes (--jobs).
+'''
+def process_all_profiles():
+    global options
+
+    profiles = find_all_profiles(get_user_data_roots())
+    output_string("Found {0} profiles".format(len(profiles)))
+
+    if len(profiles) == 0:
+        return
+
+    # process_profile() replaces the global options with per profile ones.
+    base_options = options
+
+    # Not worth starting processes for a single profile.
+    if len(profiles) == 1 or base_options.jobs == 1:
+        for namespace, file_name in profiles:
+            print(process_profile(base_options, namespace, file_name), end='')
+        options = base_options
+        return
+
+    with ProcessPoolExecutor(max_workers=base_options.jobs) as executor:
+        results = [ executor.submit(process_profile, base_options, namespace,
+                                    file_name)
+                    for namespace, file_name in profiles ]
+
+        for result in results:
+            print(result.result(), end='')
 
 
 '''
@@ -226,12 +1440,26 @@ def output_options():
     global options
     output_string('[=========== Chrome Preferences Tool  ===========]')
     output_string('Preferences File     : {0}'.format(options.input_file))
+    output_string('All Profiles         : {0}'.format(options.all_profiles))
+    output_string('User Data Dirs       : {0}'.format(options.user_data_dirs))
+    output_string('Jobs                 : {0}'.format(options.jobs))
     output_string('Output Directory     : {0}'.format(options.output_directory))
     output_string('Script Name Pattern  : {0}'.
         format(options.script_name_pattern))
+    output_string('Grep Pattern         : {0}'.format(options.grep_pattern))
+    output_string('Index Directory      : {0}'.format(options.index_directory))
+    output_string('Query Paths          : {0}'.format(options.query_paths))
+    output_string('Cache Directory      : {0}'.format(options.cache_directory))
     output_string('List Files           : {0}'.format(options.list_snippets))
     output_string('Show Script Contents : {0}'.format(options.show_contents))
     output_string('Save Script Contents : {0}'.format(options.save_contents))
+    output_string('Archive File         : {0}'.format(options.archive_file))
+    output_string('Snapshot Store       : {0}'.format(options.snapshot_store))
+    output_string('Import Directory     : {0}'.format(
+        options.import_directory))
+    output_string('Prune Files          : {0}'.format(options.prune_files))
+    output_string('Write Threads        : {0}'.format(options.write_threads))
+    output_string('Watch                : {0}'.format(options.watch))
 
 
 '''
@@ -242,7 +1470,10 @@ Example:
     [2024-09-06 01:21:31] <string passed in>
 '''
 def output_string(str):
-    print("{0} {1}".format("[{:%Y-%m-%d %H:%M:%S}]".format(datetime.now()),str))
+    # Newline included in the one write, so lines output from the export
+    # threads don't get interleaved.
+    print("{0} {1}\n".format("[{:%Y-%m-%d %H:%M:%S}]".format(datetime.now()),
+                             str), end='')
 
 
 def parse_args():
@@ -250,12 +1481,41 @@ def parse_args():
         description='Chrome Preference Tool')
 
     parser.add_argument('-i', '--input-file',
-        required = True,
+        required = False,
         dest     = 'input_file',
         default  = '',
         help     = ('Name of file to process')
     )
 
+    parser.add_argument('-a', '--all-profiles',
+        required = False,
+        dest     = 'all_profiles',
+        action   = "store_true",
+        default  = False,
+        help     = ('Instead of -i, process the Preferences file of every '
+                    'Chrome/Edge/Chromium profile found for the current user. '
+                    'Snippets are saved to <OUTPUT_DIRECTORY>/<Browser>/'
+                    '<Profile>')
+    )
+
+    parser.add_argument('--user-data-dir',
+        required = False,
+        dest     = 'user_data_dirs',
+        nargs    = '+',
+        default  = [],
+        help     = ('Additional user data directories (ones holding '
+                    '"Default", "Profile 1", ...) for --all-profiles to search')
+    )
+
+    parser.add_argument('-j', '--jobs',
+        required = False,
+        dest     = 'jobs',
+        type     = int,
+        default  = os.cpu_count(),
+        help     = ('Number of profiles processed in parallel with '
+                    '--all-profiles.  Default is the number of CPUs.')
+    )
+
     parser.add_argument('-o', '--output-directory',
         required = False,
         dest     = 'output_directory',
@@ -272,6 +1532,43 @@ def parse_args():
                     'Ex: snippet_(1|3), finds \"snippet_1\" and \"snippet_3\"')
     )
 
+    parser.add_argument('-g', '--grep',
+        required = False,
+        dest     = 'grep_pattern',
+        default  = '',
+        help     = ('Only show snippets whose contents match this regex, along '
+                    'with the matching lines.  Ex: "fetch\\(.*api/v2"')
+    )
+
+    parser.add_argument('--index-directory',
+        required = False,
+        dest     = 'index_directory',
+        default  = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'snippetindex'),
+        help     = ('Directory of the snippet index files used by --grep. '
+                    'Default is "snippetindex" next to this script.')
+    )
+
+    parser.add_argument('-q', '--query',
+        required = False,
+        dest     = 'query_paths',
+        nargs    = '+',
+        default  = [],
+        metavar  = 'PATH',
+        help     = ('Instead of snippets, show the Preferences values at these '
+                    'dotted key paths (glob wildcards allowed in each part). '
+                    'Ex: "extensions.settings.*.manifest.name"')
+    )
+
+    parser.add_argument('--cache-directory',
+        required = False,
+        dest     = 'cache_directory',
+        default  = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'prefscache'),
+        help     = ('Directory of the parsed Preferences cache files used by '
+                    '--query. Default is "prefscache" next to this script.')
+    )
+
     parser.add_argument('-l','--list',
         required = False,
         dest     = 'list_snippets',
@@ -297,8 +1594,119 @@ def parse_args():
                     'File will be named <NAME>.js')
     )
 
+    parser.add_argument('--archive',
+        required = False,
+        dest     = 'archive_file',
+        default  = '',
+        help     = ('Save the snippets found into this one archive file '
+                    '(.zip, .tar, .tar.gz/.tgz, .tar.bz2, .tar.xz), with an '
+                    'index.json of names, sizes and hashes')
+    )
+
+    parser.add_argument('--snapshot',
+        required = False,
+        dest     = 'snapshot_store',
+        default  = '',
+        metavar  = 'STORE',
+        help     = ('Record a snapshot of the snippets found in this snapshot '
+                    'store directory (created if needed)')
+    )
+
+    parser.add_argument('--snapshot-log',
+        required = False,
+        dest     = 'snapshot_log_store',
+        default  = '',
+        metavar  = 'STORE',
+        help     = ('List the snapshots in this snapshot store')
+    )
+
+    parser.add_argument('--snapshot-diff',
+        required = False,
+        dest     = 'snapshot_diff',
+        nargs    = 3,
+        default  = [],
+        metavar  = ('STORE', 'SNAPSHOT_A', 'SNAPSHOT_B'),
+        help     = ('Show the differences between two snapshots in this '
+                    'snapshot store (ids can be abbreviated)')
+    )
+
+    parser.add_argument('--import',
+        required = False,
+        dest     = 'import_directory',
+        default  = '',
+        metavar  = 'IMPORT_DIRECTORY',
+        help     = ('Import the .js files in this directory (ex. saved with '
+                    '-s, then edited) back into the -i file\'s snippets. The '
+                    'browser must be closed.')
+    )
+
+    parser.add_argument('--prune',
+        required = False,
+        dest     = 'prune_files',
+        action   = "store_true",
+        default  = False,
+        help     = ('With -s, remove the files of snippets that were renamed '
+                    'or deleted since the last export')
+    )
+
+    parser.add_argument('--write-threads',
+        required = False,
+        dest     = 'write_threads',
+        type     = int,
+        default  = 4,
+        help     = ('Number of threads used to write changed snippets with -s')
+    )
+
+    parser.add_argument('-w', '--watch',
+        required = False,
+        dest     = 'watch',
+        action   = "store_true",
+        default  = False,
+        help     = ('Keep watching the -i file, and save (-s is implied) any '
+                    'snippets that change, until Ctrl+C')
+    )
+
+    parser.add_argument('--poll-interval',
+        required = False,
+        dest     = 'poll_interval',
+        type     = float,
+        default  = 0.5,
+        help     = ('Seconds between checks of the file with --watch')
+    )
+
+    parser.add_argument('--debounce',
+        required = False,
+        dest     = 'debounce',
+        type     = float,
+        default  = 0.25,
+        help     = ('Seconds the file has to stay unchanged, after a change, '
+                    'before it is read with --watch')
+    )
+
     options = parser.parse_args()
 
+    if (options.watch):
+        if (len(options.input_file) == 0):
+            parser.error('-w/--watch requires -i/--input-file')
+        options.save_contents = True
+
+    if (len(options.import_directory) > 0):
+        if (len(options.input_file) == 0):
+            parser.error('--import requires -i/--input-file')
+        if not os.path.isdir(options.import_directory):
+            parser.error('--import directory "{0}" does not exist'.format(
+                options.import_directory))
+
+    if (len(options.archive_file) > 0 and
+        get_archive_mode(options.archive_file) == None):
+        parser.error('--archive file must be .zip, .tar, .tar.gz, .tgz, '
+                     '.tar.bz2 or .tar.xz')
+
+    if (len(options.input_file) == 0 and not options.all_profiles and
+        len(options.snapshot_log_store) == 0 and
+        len(options.snapshot_diff) == 0):
+        parser.error('one of -i/--input-file or -a/--all-profiles is required')
+
     if (len(options.output_directory) == 0):
         options.output_directory = os.path.dirname(os.path.abspath(__file__))
 
@@ -309,7 +1717,20 @@ def main(options):
 
     output_options()
 
-    process_file( options.input_file)
+    if (len(options.snapshot_log_store) > 0):
+        output_snapshot_log(options.snapshot_log_store)
+    elif (len(options.snapshot_diff) > 0):
+        output_snapshot_diff(*options.snapshot_diff)
+    elif (options.all_profiles):
+        process_all_profiles()
+    elif (options.watch):
+        watch_file(options.input_file)
+    elif (len(options.query_paths) > 0):
+        query_file(options.input_file)
+    elif (len(options.import_directory) > 0):
+        import_scripts(options.input_file)
+    else:
+        process_file( options.input_file)
 
 
 if __name__ == "__main__":
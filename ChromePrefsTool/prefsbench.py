@@ -0,0 +1,504 @@
+'''
+Benchmark for chromeprefs.py
+
+Times the main parts of chromeprefs.py against synthetic Preferences files,
+since real ones can't be shared, and writes the results as JSON so runs of
+different versions can be compared (-c/--compare).
+
+The synthetic Preferences files are laid out like real ones:
+o devtools.preferences holds JSON encoded strings, one of which is
+  script-snippets, a JSON encoded list of { "name", "content" } dicts (so the
+  snippets are JSON inside a JSON string inside the JSON)
+o Everything else is padding, to reach --total-size, in the shape of the
+  usual big subtrees: extensions.settings.<extension id>, profile.
+  content_settings.exceptions and a few more devtools.preferences strings
+Snippet contents are JavaScript-ish lines with quotes, backslashes and
+non-ASCII characters, so the escaping costs are realistic.
+
+A case is a number of snippets and a snippet size (bytes), one for every
+combination of -n/--snippet-counts and --snippet-sizes (cases with more than
+--max-snippet-bytes of snippets in total are skipped).  For each case, it
+times (best and median of --repeat runs, in ms):
+o read_input_file_into_dict : json.load() of the whole file
+o read_script_snippets      : just the snippets, via JsonPathScannerClass
+o process_file              : read and filter, nothing shown or saved
+o process_file_name_regex   : the same, with a -n regex that matches about
+                              1 in 10 snippets
+o process_file_console      : -l -c, output sent to os.devnull, so it's the
+                              cost of formatting and writing the output
+o write_script_to_file      : every snippet written to an empty directory
+o export_unchanged          : -s into a directory already up to date, which
+                              is the common case with the export manifest
+
+Each case also checks that --grep's snippet index prefilter finds the same
+snippets as searching all of them, for the grep_check_patterns (ex. optional
+groups and escapes), and reports any pattern it doesn't.
+
+usage: prefsbench.py [-h] [-n SNIPPET_COUNTS [SNIPPET_COUNTS ...]]
+                     [--snippet-sizes SNIPPET_SIZES [SNIPPET_SIZES ...]]
+                     [--total-size TOTAL_SIZE]
+                     [--max-snippet-bytes MAX_SNIPPET_BYTES] [-r REPEAT]
+                     [-o OUTPUT_FILE] [-c COMPARE_FILE]
+                     [-g GENERATE_FILE] [--seed SEED]
+
+Example:
+    python prefsbench.py -o before.json
+    <change chromeprefs.py>
+    python prefsbench.py -o after.json -c before.json
+
+    python prefsbench.py -g ./Preferences -n 5000 --snippet-sizes 2000
+                         --total-size 20
+
+    The last one just writes a synthetic Preferences file (5000 snippets of
+    about 2000 bytes, 20MB in all), to try chromeprefs.py against.
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+# The code being benchmarked
+import chromeprefs
+
+# The --grep index, for check_grep_prefilter()
+from SnippetIndexClass import SnippetIndexClass
+
+# Global options object, produced by argparse.ArgumentParser.parse_args()
+options = None
+
+# Lines snippet contents are made of.  Quotes, backslashes and non-ASCII
+# characters all need escaping, twice, in the Preferences file.
+snippet_lines = [
+    '// Snippet {0}: fetch the "current" items',
+    'const url = `${{location.origin}}/api/v2/items?page={0}`;',
+    'fetch(url).then(r => r.json()).then(d => console.table(d.items));',
+    "document.querySelectorAll('a[href^=\"http\"]').forEach(a => a.click());",
+    'const re = /\\d+\\.\\d+\\\\/g; // matches "1.5\\"',
+    'console.log("Größe: {0} — ok ✓");',
+    '    if (x > {0}) {{ localStorage.setItem("k{0}", JSON.stringify(x)); }}',
+]
+
+# --grep patterns the snippet index prefilter is checked with.  Optional and
+# repeated groups, alternatives and escapes all have text a match doesn't
+# necessarily contain.
+grep_check_patterns = [
+    r'fetch\(url',
+    r'(xyz)?fetch',
+    r'(?:abc)*fetch',
+    r'\x66etch\(url',
+    r'api/v\d',
+    r'Gr(ö|o)ße',
+    r'(?i)CONSOLE\.TABLE',
+    r'"k\d+7"',
+    r'current|items',
+    r'(?:Snippet )+\d',
+    r'querySelectorAll\(\'a\[href\^',
+]
+
+'''
+get_snippet_content
+
+Deterministic snippet contents of about the given size (bytes, UTF-8).
+'''
+def get_snippet_content(rng, number, size):
+    lines = []
+    length = 0
+    while length < size:
+        line = rng.choice(snippet_lines).format(number)
+        lines.append(line)
+        length += len(line.encode('utf-8')) + 1
+
+    return '\n'.join(lines)[:max(size, 1)]
+
+'''
+get_padding
+
+Preferences content other than snippets, of about the given size (bytes, as
+JSON), in the shape of the big subtrees in real Preferences files.
+'''
+def get_padding(rng, size):
+    extensions = {}
+    exceptions = {}
+    devtools   = {}
+    length     = 0
+    number     = 0
+
+    while length < size:
+        extension_id = ''.join(rng.choice('abcdefghijklmnop')
+                               for i in range(32))
+        extension = {
+            'active_permissions' : { 'api' : ['storage', 'tabs'],
+                                     'explicit_host' : ['<all_urls>'] },
+            'creation_flags'     : 9,
+            'from_webstore'      : True,
+            'install_time'       : str(13300000000000000 + number),
+            'location'           : 1,
+            'manifest'           : { 'name' : 'Extension {0}'.format(number),
+                                     'version' : '1.{0}'.format(number),
+                                     'manifest_version' : 3 },
+            'path'               : '{0}\\1.{1}_0'.format(extension_id, number),
+            'state'              : 1,
+        }
+        extensions[extension_id] = extension
+
+        site = 'https://www.site{0}.example:443,*'.format(number)
+        exceptions[site] = { 'last_modified' : str(13300000000000000 + number),
+                             'setting' : number % 3 }
+
+        # devtools.preferences values are JSON encoded strings too.
+        devtools['panel-{0}'.format(number)] = json.dumps(
+            { 'vertical' : { 'size' : number % 500, 'showMode' : 'Both' } })
+
+        length += (len(json.dumps(extension)) + len(site) + 80 +
+                   len(devtools['panel-{0}'.format(number)]))
+        number += 1
+
+    return extensions, exceptions, devtools
+
+'''
+create_preferences_file
+
+Write a synthetic Preferences file with num_snippets snippets of about
+snippet_size bytes each, padded to about total_size bytes.  Returns the
+actual size of the file.
+'''
+def create_preferences_file(file_name, num_snippets, snippet_size, total_size,
+                            seed):
+    rng = random.Random(seed)
+
+    snippets = [ { 'name'    : 'Snippet {0:06}'.format(number),
+                   'content' : get_snippet_content(rng, number,
+                                                   snippet_size) }
+                 for number in range(num_snippets) ]
+    snippets_json = json.dumps(snippets)
+
+    extensions, exceptions, devtools = get_padding(rng,
+        total_size - len(json.dumps(snippets_json)))
+
+    devtools['script-snippets']  = snippets_json
+    devtools['inspectorVersion'] = '"37"'
+    devtools['console-history']  = json.dumps(
+        [ 'document.title', 'location.href', '$0.innerText' ])
+
+    preferences = {
+        'browser'    : { 'has_seen_welcome_page' : True,
+                         'window_placement' : { 'bottom' : 1040, 'left' : 10,
+                                                'maximized' : True,
+                                                'right' : 1900, 'top' : 10 } },
+        'devtools'   : { 'last_open_timestamp' : '13300000000000000',
+                         'preferences' : devtools },
+        'extensions' : { 'settings' : extensions },
+        'profile'    : { 'content_settings' : {
+                             'exceptions' : { 'cookies' : exceptions } },
+                         'name' : 'Person 1' },
+    }
+
+    # Chrome writes Preferences without any whitespace.
+    with open(file_name, 'w', encoding='utf-8') as f:
+        json.dump(preferences, f, separators=(',', ':'))
+
+    return os.path.getsize(file_name)
+
+'''
+set_chromeprefs_options
+
+Set chromeprefs.options the same way its command line would, so every
+option not given has its usual default.
+'''
+def set_chromeprefs_options(args):
+    saved_argv = sys.argv
+    sys.argv = ['chromeprefs.py'] + args
+    try:
+        chromeprefs.options = chromeprefs.parse_args()
+    finally:
+        sys.argv = saved_argv
+
+'''
+time_function
+
+Run the function --repeat times (setup before each, not timed), with any
+output thrown away.  Returns { 'best_ms', 'median_ms' }.
+'''
+def time_function(function, setup=None):
+    timings = []
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            for i in range(options.repeat):
+                if setup:
+                    setup()
+                start = time.perf_counter()
+                function()
+                timings.append((time.perf_counter() - start) * 1000)
+
+    return { 'best_ms'   : round(min(timings), 3),
+             'median_ms' : round(statistics.median(timings), 3) }
+
+'''
+check_grep_prefilter
+
+Check that the snippets the index says might match each of the
+grep_check_patterns include every snippet that does (the way process_file()
+searches them, line by line).  Returns the patterns it doesn't for.
+'''
+def check_grep_prefilter(directory, preferences_file):
+    snippets = chromeprefs.read_script_snippets(preferences_file)
+    index = SnippetIndexClass(directory, preferences_file)
+    index.build(snippets)
+
+    mismatches = []
+    for pattern in grep_check_patterns:
+        rx = re.compile(pattern)
+        matching = { i for i, snippet in enumerate(snippets)
+                     if any(rx.search(line)
+                            for line in snippet['content'].splitlines()) }
+        candidates = set(index.get_candidates(
+            chromeprefs.get_pattern_literals(pattern)))
+        if not matching <= candidates:
+            mismatches.append(pattern)
+
+    return mismatches
+
+def run_case(directory, num_snippets, snippet_size):
+    preferences_file = os.path.join(directory, 'Preferences')
+    file_size = create_preferences_file(preferences_file, num_snippets,
+                                        snippet_size, options.total_size,
+                                        options.seed)
+    export_directory = os.path.join(directory, 'export')
+    timings = {}
+
+    timings['read_input_file_into_dict'] = time_function(
+        lambda: chromeprefs.read_input_file_into_dict(preferences_file))
+
+    timings['read_script_snippets'] = time_function(
+        lambda: chromeprefs.read_script_snippets(preferences_file))
+
+    set_chromeprefs_options(['-i', preferences_file])
+    timings['process_file'] = time_function(
+        lambda: chromeprefs.process_file(preferences_file))
+
+    set_chromeprefs_options(['-i', preferences_file, '-n', r'Snippet \d+7$'])
+    timings['process_file_name_regex'] = time_function(
+        lambda: chromeprefs.process_file(preferences_file))
+
+    set_chromeprefs_options(['-i', preferences_file, '-l', '-c'])
+    timings['process_file_console'] = time_function(
+        lambda: chromeprefs.process_file(preferences_file))
+
+    scripts = chromeprefs.read_script_snippets(preferences_file)
+
+    def empty_export_directory():
+        os.makedirs(export_directory, exist_ok=True)
+        for file_name in os.listdir(export_directory):
+            os.remove(os.path.join(export_directory, file_name))
+
+    set_chromeprefs_options(['-i', preferences_file, '-o', export_directory])
+    timings['write_script_to_file'] = time_function(
+        lambda: [ chromeprefs.write_script_to_file(script, export_directory)
+                  for script in scripts ], empty_export_directory)
+
+    set_chromeprefs_options(['-i', preferences_file, '-o', export_directory,
+                             '-s'])
+    empty_export_directory()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            chromeprefs.process_file(preferences_file)
+    timings['export_unchanged'] = time_function(
+        lambda: chromeprefs.process_file(preferences_file))
+
+    empty_export_directory()
+
+    return { 'num_snippets'              : num_snippets,
+             'snippet_size'              : snippet_size,
+             'file_size'                 : file_size,
+             'timings'                   : timings,
+             'grep_prefilter_mismatches' : check_grep_prefilter(
+                                               directory, preferences_file) }
+
+def run_benchmarks(directory):
+    results = []
+
+    for num_snippets in options.snippet_counts:
+        for snippet_size in options.snippet_sizes:
+            if num_snippets * snippet_size > options.max_snippet_bytes:
+                output_string('Skipping {0:,} snippets of {1:,} bytes (over '
+                              '--max-snippet-bytes)'.format(num_snippets,
+                                                            snippet_size))
+                continue
+
+            result = run_case(directory, num_snippets, snippet_size)
+            results.append(result)
+
+            output_string('{0:,} snippets of {1:,} bytes ({2:,} byte file):'.
+                          format(num_snippets, snippet_size,
+                                 result['file_size']))
+            for name, timing in result['timings'].items():
+                output_string('    {0:<26} best: {1:10.2f}ms  median: '
+                              '{2:10.2f}ms'.format(name, timing['best_ms'],
+                                                   timing['median_ms']))
+            for pattern in result['grep_prefilter_mismatches']:
+                output_string('    **** --grep index misses snippets that '
+                              'match: {0}'.format(pattern))
+    return results
+
+'''
+compare_results
+
+Output how each timing changed since a previous run's results file, for the
+cases and timings both runs have.
+'''
+def compare_results(results, compare_file):
+    with open(compare_file, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+
+    previous_cases = { (case['num_snippets'], case['snippet_size']) : case
+                       for case in previous['results'] }
+
+    output_string('Compared to {0} ({1}):'.format(compare_file,
+                                                  previous['timestamp']))
+    for case in results:
+        previous_case = previous_cases.get((case['num_snippets'],
+                                            case['snippet_size']))
+        if previous_case == None:
+            continue
+
+        output_string('{0:,} snippets of {1:,} bytes:'.format(
+            case['num_snippets'], case['snippet_size']))
+        for name, timing in case['timings'].items():
+            if name not in previous_case['timings']:
+                continue
+            before = previous_case['timings'][name]['best_ms']
+            after  = timing['best_ms']
+            output_string('    {0:<26} {1:10.2f}ms -> {2:10.2f}ms  ({3:+.1f}%)'
+                          .format(name, before, after,
+                                  (after - before) / before * 100
+                                  if before > 0 else 0))
+
+def output_string(str):
+    print("{0} {1}".format("[{:%Y-%m-%d %H:%M:%S}]".format(datetime.now()),str))
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Chrome Preferences Tool Benchmark')
+
+    parser.add_argument('-n','--snippet-counts',
+        required = False,
+        dest     = 'snippet_counts',
+        type     = int,
+        nargs    = '+',
+        default  = [10, 1000, 100000],
+        help     = 'Numbers of snippets in the synthetic Preferences files.'
+    )
+
+    parser.add_argument('--snippet-sizes',
+        required = False,
+        dest     = 'snippet_sizes',
+        type     = int,
+        nargs    = '+',
+        default  = [10, 1000, 100000],
+        help     = 'Sizes (bytes) of the snippets.'
+    )
+
+    parser.add_argument('--total-size',
+        required = False,
+        dest     = 'total_size',
+        type     = float,
+        default  = 5,
+        help     = ('Size (MB) the Preferences files are padded to, if the '
+                    'snippets are smaller than that.')
+    )
+
+    parser.add_argument('--max-snippet-bytes',
+        required = False,
+        dest     = 'max_snippet_bytes',
+        type     = float,
+        default  = 50,
+        help     = ('Skip cases with more than this many MB of snippets in '
+                    'total.')
+    )
+
+    parser.add_argument('-r','--repeat',
+        required = False,
+        dest     = 'repeat',
+        type     = int,
+        default  = 5,
+        help     = 'Number of timed runs of each part (best and median are '
+                   'reported).'
+    )
+
+    parser.add_argument('-o','--output-file',
+        required = False,
+        dest     = 'output_filename',
+        default  = '',
+        help     = 'Name of JSON file to write the results to.'
+    )
+
+    parser.add_argument('-c','--compare',
+        required = False,
+        dest     = 'compare_filename',
+        default  = '',
+        help     = 'JSON results file of a previous run to compare against.'
+    )
+
+    parser.add_argument('-g','--generate',
+        required = False,
+        dest     = 'generate_filename',
+        default  = '',
+        help     = ('Just write a synthetic Preferences file (first snippet '
+                    'count and size) with this name, and exit.')
+    )
+
+    parser.add_argument('--seed',
+        required = False,
+        dest     = 'seed',
+        type     = int,
+        default  = 1,
+        help     = 'Random seed for the synthetic contents.'
+    )
+
+    options = parser.parse_args()
+
+    options.total_size        = int(options.total_size * 1024 * 1024)
+    options.max_snippet_bytes = int(options.max_snippet_bytes * 1024 * 1024)
+
+    return options
+
+def main(options):
+    if (len(options.generate_filename) > 0):
+        file_size = create_preferences_file(options.generate_filename,
+                                            options.snippet_counts[0],
+                                            options.snippet_sizes[0],
+                                            options.total_size, options.seed)
+        output_string('Wrote {0:,} bytes to {1}'.format(file_size,
+                                                       options.generate_filename))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmarks(directory)
+
+    if (len(options.compare_filename) > 0):
+        compare_results(results, options.compare_filename)
+
+    if (len(options.output_filename) > 0):
+        with open(options.output_filename, 'w', encoding='utf-8') as f:
+            json.dump({ 'timestamp'  : '{:%Y-%m-%d %H:%M:%S}'.format(
+                                           datetime.now()),
+                        'python'     : sys.version,
+                        'platform'   : platform.platform(),
+                        'total_size' : options.total_size,
+                        'repeat'     : options.repeat,
+                        'results'    : results }, f, indent=4)
+
+if __name__ == "__main__":
+    options = parse_args()
+    main(options)
@@ -0,0 +1,207 @@
+'''
+HashFilterClass
+
+A blocked Bloom filter of pwned SHA-1 hashes, in one file that's mmap'd to
+check against, for screening out hashes that certainly aren't pwned before
+looking them up exactly (in a ShardStoreClass store, or with a request).
+
+Most hashes checked in an audit aren't pwned, and each of those still costs
+a store lookup or a range request to find that out.  A hash the filter
+doesn't contain definitely isn't in the hashes it was built from; one it
+does contain is pwned, or (at the false positive rate it was built for) a
+false positive, so only those need the exact check.
+
+Each hash only touches one 512 bit (64 byte, so one cache line) block, so a
+check reads a single block of the file.  SHA-1 is already uniformly
+distributed, so the block and the bits in it come straight from the first
+128 bits of the hash, without hashing again (so there are at most 8 bits
+per key).  Since keys don't spread evenly
+over the blocks, the filter is made bigger than an ordinary Bloom filter for
+the same false positive rate (see get_size()).
+
+File layout (all integers little endian):
+
+    magic            8 bytes   b'PWNBLOOM'
+    num_blocks       8 bytes
+    num_keys         8 bytes
+    num_hashes       4 bytes   (bits set per key)
+    (padding up to 64 bytes)
+    coverage         16^5 bits, bit n set if any hash in range n was added
+    blocks           num_blocks x 64 bytes (cache line aligned)
+
+Like a ShardStoreClass store, the filter can be built from just some of the
+ranges, so hashes in a range it has nothing from are never screened out.
+
+Example:
+    HashFilterClass.build('pwned.filter', hashes, num_keys, 0.001)
+
+    hash_filter = HashFilterClass('pwned.filter')
+    if hash_filter.contains('119E9F64E12B97293A8334CCD162C1245786336D'):
+        ...
+    hash_filter.close()
+'''
+
+import math
+import mmap
+import os
+import struct
+
+
+class HashFilterClass:
+
+    _magic       = b'PWNBLOOM'
+    _header      = struct.Struct('<8sQQI')
+    _header_size = 64
+    _block_size  = 64
+    _block_bits  = _block_size * 8
+    _num_shards  = 16 ** 5
+
+    _blocks_start = _header_size + _num_shards // 8
+
+    # 9 bits of the hash for each bit set, from the 76 not used for the range
+    # prefix or to pick the block.  Lower false positive rates than this
+    # allows for just make the filter bigger.
+    _max_hashes  = 76 // 9
+
+    # Constructor
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'rb')
+        self.map  = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.num_blocks, self.num_keys, self.num_hashes = \
+            HashFilterClass._header.unpack_from(self.map)
+        if magic != HashFilterClass._magic:
+            self.close()
+            raise ValueError('"{0}" is not a hash filter'.format(file_name))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    '''
+    The false positive rate of num_blocks blocks holding num_keys keys,
+    num_hashes bits each: the rate for a block with j keys in it, weighted
+    by the (Poisson) chance of a block getting j keys.
+    '''
+    @staticmethod
+    def get_fp_rate(num_keys, num_blocks, num_hashes):
+        keys_per_block = num_keys / num_blocks
+        bit_unset = 1 - 1 / HashFilterClass._block_bits
+
+        fp_rate = 0.0
+        chance  = math.exp(-keys_per_block) # of a block having 0 keys
+        for j in range(int(keys_per_block + 10 * math.sqrt(keys_per_block) +
+                           10)):
+            fp_rate += chance * (1 - bit_unset ** (j * num_hashes)) ** \
+                num_hashes
+            chance *= keys_per_block / (j + 1)
+        return fp_rate
+
+    '''
+    Number of blocks and bits set per key for num_keys at fp_rate.  Starts
+    from the size of an ordinary Bloom filter, and grows it until the uneven
+    number of keys per block is made up for.
+    '''
+    @staticmethod
+    def get_size(num_keys, fp_rate):
+        num_keys   = max(num_keys, 1)
+        num_hashes = min(max(1, round(-math.log2(fp_rate))),
+                         HashFilterClass._max_hashes)
+        bits = -num_keys * math.log(fp_rate) / math.log(2) ** 2
+        num_blocks = max(1, math.ceil(bits / HashFilterClass._block_bits))
+
+        while HashFilterClass.get_fp_rate(num_keys, num_blocks,
+                                          num_hashes) > fp_rate:
+            num_blocks = math.ceil(num_blocks * 1.02)
+        return num_blocks, num_hashes
+
+    '''
+    The block of the key (the first 128 bits of the hash, as an int) and a
+    mask of its bits in that block.  The 32 bits after the range prefix pick
+    the block (not the prefix itself, or a filter of only some ranges would
+    only use some of the blocks), and each of the bits is the next 9 of the
+    rest.
+    '''
+    @staticmethod
+    def get_block_and_mask(key, num_blocks, num_hashes):
+        block = (((key >> 76) & 0xFFFFFFFF) * num_blocks) >> 32
+
+        mask = 0
+        for i in range(num_hashes):
+            mask |= 1 << (key & 511)
+            key >>= 9
+        return block, mask
+
+    @staticmethod
+    def get_key(sha1_hash):
+        return int(sha1_hash[:32], 16)
+
+    '''
+    Yield the keys of the hashes in ranges, (shard, [(suffix, count)...]) as
+    ShardStoreClass.read_range_files() and read_corpus_file() produce.
+    '''
+    @staticmethod
+    def get_range_keys(ranges):
+        for shard, entries in ranges:
+            prefix = shard << 108
+            for suffix, count in entries:
+                yield prefix | int(suffix[:27], 16)
+
+    '''
+    False if the (40 hex chars) SHA-1 hash is definitely not in the filter.
+    Always True for a hash in a range the filter has nothing from.
+    '''
+    def contains(self, sha1_hash):
+        key = HashFilterClass.get_key(sha1_hash)
+        shard = key >> 108
+        if not (self.map[HashFilterClass._header_size + shard // 8] >>
+                (shard % 8)) & 1:
+            return True
+
+        block, mask = HashFilterClass.get_block_and_mask(key, self.num_blocks,
+                                                         self.num_hashes)
+        position = HashFilterClass._blocks_start + \
+            block * HashFilterClass._block_size
+        bits = int.from_bytes(
+            self.map[position:position + HashFilterClass._block_size],
+            'little')
+        return bits & mask == mask
+
+    '''
+    Write a filter of the keys (ints of the first 128 bits of each hash, see
+    get_key()), sized for num_keys of them at fp_rate.  Returns the size in
+    bytes.
+    '''
+    @staticmethod
+    def build(file_name, keys, num_keys, fp_rate):
+        num_blocks, num_hashes = HashFilterClass.get_size(num_keys, fp_rate)
+        block_size = HashFilterClass._block_size
+        blocks   = bytearray(num_blocks * block_size)
+        coverage = bytearray(HashFilterClass._num_shards // 8)
+
+        get_block_and_mask = HashFilterClass.get_block_and_mask
+        num_added = 0
+        for key in keys:
+            block, mask = get_block_and_mask(key, num_blocks, num_hashes)
+            position = block * block_size
+            bits = int.from_bytes(blocks[position:position + block_size],
+                                  'little') | mask
+            blocks[position:position + block_size] = bits.to_bytes(
+                block_size, 'little')
+            num_added += 1
+
+            shard = key >> 108
+            coverage[shard // 8] |= 1 << (shard % 8)
+
+        header = HashFilterClass._header.pack(HashFilterClass._magic,
+                                              num_blocks, num_added, num_hashes)
+
+        temp_file_name = '{0}.{1}.tmp'.format(file_name, os.getpid())
+        with open(temp_file_name, 'wb') as f:
+            f.write(header.ljust(HashFilterClass._header_size, b'\0'))
+            f.write(coverage)
+            f.write(blocks)
+        os.replace(temp_file_name, file_name)
+
+        return HashFilterClass._blocks_start + len(blocks)
@@ -0,0 +1,52 @@
+'''
+PasswordDetailsClass
+
+Python counterpart of the PasswordDetails class in HaveIBeenPwned.ps1: one
+password (or just its hash) to check, with the Group/Title/Username it came
+from, if it was read from a password file.
+'''
+
+import hashlib
+
+# Used when a value is empty, same as $global:defaultStringValue
+default_string_value = '<BLANK>'
+
+
+class PasswordDetailsClass:
+
+    # Constructor
+    def __init__(self, group_name='', title='', user_name='', password='',
+                 sha1_hash=''):
+        self.group_name     = group_name
+        self.title          = title
+        self.user_name      = user_name
+        self.password       = password
+        self.hash_hit_count = 0
+
+        if len(sha1_hash) == 0 and len(password) > 0:
+            sha1_hash = PasswordDetailsClass.get_hash_of_password(password)
+
+        self.sha1_hash = sha1_hash.upper()
+
+    '''
+    SHA-1 of the password (UTF-8), as upper case hex, same as
+    Get-Hash-Of-Password in HaveIBeenPwned.ps1.
+    '''
+    @staticmethod
+    def get_hash_of_password(password):
+        return hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
+
+    # The 5 characters sent to the range API
+    def get_prefix(self):
+        return self.sha1_hash[:5]
+
+    # The rest of the hash, looked for in the range response
+    def get_suffix(self):
+        return self.sha1_hash[5:]
+
+    def __str__(self):
+        return ', '.join(value if len(value) > 0 else default_string_value
+                         for value in [self.group_name, self.title,
+                                       self.user_name, self.password,
+                                       self.sha1_hash]) + \
+               ', {0}'.format(self.hash_hit_count)
@@ -0,0 +1,148 @@
+'''
+PasswordFileReaderClass
+
+Streams the records of a password file (same format as -PasswordFile in
+HaveIBeenPwned.ps1: TSV, or CSV if the name ends in .csv, with a Group,
+Title, Username, Password header), hashing the passwords on a pool of
+processes.
+
+Read-Password-File in HaveIBeenPwned.ps1 reads the whole file with
+Import-Csv, then grows an array one element at a time (which copies it every
+time), and hashes each password as its record is made.  This instead:
+o Reads rows lazily, batch_size at a time
+o Sends just the passwords of each batch to a process pool to be hashed, and
+  keeps only Group/Title/Username itself.  The plain text passwords are gone
+  as soon as the batch is hashed (records come back without them).
+o Has at most max_pending batches in flight, so memory stays bounded however
+  big the file is
+o Yields each batch of records as soon as it's hashed (not necessarily in
+  file order)
+
+Small files (a single batch) are hashed in this process, since starting the
+pool would take longer than the hashing.
+
+Example:
+    reader = PasswordFileReaderClass('passwords.tsv')
+    for records in reader.read_batches():
+        ...
+'''
+
+import csv
+import hashlib
+import itertools
+import os
+
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                wait)
+
+# One password (or hash) to check
+from PasswordDetailsClass import PasswordDetailsClass
+
+
+class PasswordFileReaderClass:
+
+    # Constructor
+    def __init__(self, file_name, jobs=None, batch_size=10000,
+                 max_pending=None):
+        self.file_name   = file_name
+        self.delimiter   = ',' if file_name.lower().endswith('.csv') else '\t'
+        self.jobs        = jobs or os.cpu_count() or 1
+        self.batch_size  = batch_size
+        self.max_pending = max_pending or self.jobs * 2
+
+        # Counters
+        self.num_records = 0
+        self.num_skipped = 0
+
+    '''
+    Hash a list of passwords.  Run in the pool's processes, so it only gets
+    (and returns) plain lists.
+    '''
+    @staticmethod
+    def hash_passwords(passwords):
+        sha1 = hashlib.sha1
+        return [ sha1(password.encode('utf-8')).hexdigest().upper()
+                 for password in passwords ]
+
+    '''
+    Yield (details, passwords) for each batch of rows, where details is a
+    list of (group, title, user name) and passwords is the list of matching
+    passwords.  Rows without a password are skipped.
+    '''
+    def read_rows(self):
+        with open(self.file_name, 'r', encoding='utf-8-sig', newline='') as f:
+            details   = []
+            passwords = []
+
+            for row in csv.DictReader(f, delimiter=self.delimiter):
+                password = row.get('Password') or ''
+                if len(password) == 0:
+                    self.num_skipped += 1
+                    continue
+
+                details.append((row.get('Group') or '', row.get('Title') or '',
+                                row.get('Username') or ''))
+                passwords.append(password)
+
+                if len(passwords) >= self.batch_size:
+                    yield details, passwords
+                    details, passwords = [], []
+
+            if len(passwords) > 0:
+                yield details, passwords
+
+    def get_records(self, details, hashes):
+        self.num_records += len(hashes)
+        return [ PasswordDetailsClass(group_name, title, user_name,
+                                      sha1_hash=sha1_hash)
+                 for (group_name, title, user_name), sha1_hash
+                 in zip(details, hashes) ]
+
+    '''
+    Yield lists of PasswordDetailsClass (without their passwords), a batch at
+    a time, as each batch is hashed.
+    '''
+    def read_batches(self):
+        rows = self.read_rows()
+
+        first = next(rows, None)
+        if first == None:
+            return
+
+        second = next(rows, None)
+        if second == None or self.jobs == 1:
+            # Not worth starting processes.
+            for details, passwords in itertools.chain(
+                    [first], [second] if second else [], rows):
+                yield self.get_records(details,
+                    PasswordFileReaderClass.hash_passwords(passwords))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            pending = {}
+
+            def submit(batch):
+                details, passwords = batch
+                future = executor.submit(
+                    PasswordFileReaderClass.hash_passwords, passwords)
+                pending[future] = details
+
+            submit(first)
+            submit(second)
+            first = second = None
+
+            for batch in rows:
+                submit(batch)
+                batch = None # Don't hold on to the passwords
+
+                while len(pending) >= self.max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self.get_records(pending.pop(future),
+                                               future.result())
+
+            while len(pending) > 0:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self.get_records(pending.pop(future),
+                                           future.result())
@@ -0,0 +1,202 @@
+'''
+RangeCacheClass
+
+On disk cache of range API responses, in front of a RangeClientClass, so
+checking the same (or overlapping) password files again doesn't download
+every range again.
+
+For each prefix it keeps the body, plus the ETag and Last-Modified the
+server sent with it:
+o Within `ttl` seconds of being fetched (or revalidated), a range is served
+  from disk, without a request
+o After that it's revalidated: requested with If-None-Match/If-Modified-Since,
+  and if the server answers 304 Not Modified, the cached body is used and
+  its time reset, so only ranges that have changed are downloaded again
+o The cache is kept under `max_size` bytes by evicting the least recently
+  used ranges
+
+The bodies are <directory>/<prefix>.range, and what's known about them is
+in <directory>/index.json (least recently used first), written by close().
+Files the index doesn't know about (ex. after a crash) are removed when the
+cache is opened.
+
+Example:
+    client = RangeClientClass('https://api.pwnedpasswords.com/range/')
+    cache  = RangeCacheClass(client, './RangeCache', ttl=86400)
+    text   = await cache.get_range('119E9')
+    cache.close()
+    await client.close()
+'''
+
+import json
+import os
+import time
+
+from collections import OrderedDict
+
+
+class RangeCacheClass:
+
+    _index_version = 1
+
+    # Constructor
+    def __init__(self, client, directory, ttl=86400, max_size=1000000000):
+        self.client    = client
+        self.directory = directory
+        self.ttl       = ttl
+        self.max_size  = max_size
+        self.size      = 0
+
+        # prefix -> { 'etag', 'last_modified', 'fetched', 'size' }, least
+        # recently used first
+        self.entries = OrderedDict()
+
+        # Counters
+        self.num_hits          = 0 # Served from disk, no request
+        self.num_revalidations = 0 # 304, served from disk
+        self.num_misses        = 0 # Full download
+
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    def get_file_name(self, prefix):
+        return os.path.join(self.directory, '{0}.range'.format(prefix))
+
+    def get_index_file_name(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def load_index(self):
+        try:
+            with open(self.get_index_file_name(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == RangeCacheClass._index_version:
+                for prefix, entry in index['entries']:
+                    self.entries[prefix] = entry
+                    self.size += entry['size']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries.clear()
+            self.size = 0
+
+        # Bodies without an entry would never be used (or evicted).
+        for file_name in os.listdir(self.directory):
+            prefix, extension = os.path.splitext(file_name)
+            if ((extension == '.range' and prefix not in self.entries) or
+                (extension == '.tmp' and '.range.' in file_name)):
+                os.remove(os.path.join(self.directory, file_name))
+
+        # In case max_size is smaller than last time
+        self.evict()
+
+    '''
+    Write the index, so the next run can use the cache.
+    '''
+    def close(self):
+        file_name = self.get_index_file_name()
+        temp_file_name = '{0}.{1}.tmp'.format(file_name, os.getpid())
+        with open(temp_file_name, 'w', encoding='utf-8') as f:
+            json.dump({ 'version' : RangeCacheClass._index_version,
+                        'entries' : list(self.entries.items()) }, f)
+        os.replace(temp_file_name, file_name)
+
+    def remove(self, prefix):
+        entry = self.entries.pop(prefix)
+        self.size -= entry['size']
+        try:
+            os.remove(self.get_file_name(prefix))
+        except FileNotFoundError:
+            pass
+
+    def store(self, prefix, headers, body):
+        if prefix in self.entries:
+            self.remove(prefix)
+
+        # Written to a temp file first, so an interrupted write never leaves
+        # a truncated body under the real name.
+        file_name = self.get_file_name(prefix)
+        temp_file_name = '{0}.{1}.tmp'.format(file_name, os.getpid())
+        with open(temp_file_name, 'wb') as f:
+            f.write(body)
+        os.replace(temp_file_name, file_name)
+
+        self.entries[prefix] = { 'etag'          : headers.get('etag'),
+                                 'last_modified' : headers.get('last-modified'),
+                                 'fetched'       : time.time(),
+                                 'size'          : len(body) }
+        self.size += len(body)
+        self.evict()
+
+    '''
+    Remove the least recently used ranges until the cache is within max_size
+    (but always keep the most recent one).
+    '''
+    def evict(self):
+        while self.size > self.max_size and len(self.entries) > 1:
+            self.remove(next(iter(self.entries)))
+
+    '''
+    The cached body for the prefix, or None (and the entry is removed) if the
+    file is missing or isn't the size that was stored, so it gets re-fetched.
+    '''
+    def read_body(self, prefix):
+        try:
+            with open(self.get_file_name(prefix), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            body = None
+
+        if body == None or len(body) != self.entries[prefix]['size']:
+            self.remove(prefix)
+            return None
+
+        return body
+
+    '''
+    The body of the range response for the prefix, as text, from the cache if
+    it's there and still fresh (or the server says it hasn't changed).
+    Raises OSError if it has to be requested and the server doesn't return
+    it.
+    '''
+    async def get_range(self, prefix):
+        entry = self.entries.get(prefix)
+        body  = None
+        if entry != None:
+            self.entries.move_to_end(prefix)
+            if time.time() - entry['fetched'] < self.ttl:
+                body = self.read_body(prefix)
+                if body != None:
+                    self.num_hits += 1
+                    return body.decode('utf-8')
+                entry = None
+
+        extra_headers = {}
+        if entry != None:
+            if entry['etag'] != None:
+                extra_headers['If-None-Match'] = entry['etag']
+            if entry['last_modified'] != None:
+                extra_headers['If-Modified-Since'] = entry['last_modified']
+
+        status, headers, body = await self.client.fetch_range(prefix,
+                                                              extra_headers)
+
+        if status == 304:
+            cached_body = (self.read_body(prefix) if prefix in self.entries
+                           else None)
+            if cached_body != None:
+                self.num_revalidations += 1
+                entry = self.entries[prefix]
+                entry['fetched'] = time.time()
+                entry['etag'] = headers.get('etag', entry['etag'])
+                entry['last_modified'] = headers.get('last-modified',
+                                                     entry['last_modified'])
+                return cached_body.decode('utf-8')
+
+            # The range was evicted, or its body went missing, while the
+            # request was in flight, so ask for all of it.
+            status, headers, body = await self.client.fetch_range(prefix)
+
+        if status != 200:
+            raise OSError('HTTP {0} for range {1}'.format(status, prefix))
+
+        self.num_misses += 1
+        self.store(prefix, headers, body)
+        return body.decode('utf-8')
@@ -0,0 +1,199 @@
+'''
+RangeClientClass
+
+asyncio client for the Pwned Passwords range API:
+
+    GET https://api.pwnedpasswords.com/range/<first 5 chars of SHA-1>
+
+returns lines of "<other 35 chars of SHA-1>:<count>".
+
+Check-Website-For-Hash in HaveIBeenPwned.ps1 does one Invoke-WebRequest per
+password, one after the other, each on its own connection.  This instead:
+o Keeps a pool of keep-alive HTTP/1.1 connections, so the TCP and TLS set up
+  is only paid once per connection, not once per request
+o Runs up to `concurrency` requests at once (one per pooled connection)
+o Retries failed requests (connection errors, timeouts, 429 and 5xx), after
+  an exponential backoff (with jitter, and any Retry-After the server sends)
+
+Only what the range API needs of HTTP/1.1 is implemented (GET, Content-Length
+or chunked bodies, no compression), so nothing outside the standard library
+is needed.  The base URL can be http:// too, ex. for rangeserver.py.
+
+Example:
+    client = RangeClientClass('https://api.pwnedpasswords.com/range/')
+    text = await client.get_range('119E9')
+    await client.close()
+'''
+
+import asyncio
+import random
+import ssl
+import urllib.parse
+
+
+class RangeClientClass:
+
+    # Statuses that are worth trying again.
+    _retry_statuses = { 429, 500, 502, 503, 504 }
+
+    # Constructor
+    def __init__(self, base_url, concurrency=4, retries=3, backoff=1.0,
+                 timeout=30.0, user_agent='HaveIBeenPwned.py'):
+        url = urllib.parse.urlsplit(base_url)
+        self.host        = url.hostname
+        self.use_ssl     = url.scheme == 'https'
+        self.port        = url.port or (443 if self.use_ssl else 80)
+        self.base_path   = url.path if url.path.endswith('/') else url.path + '/'
+        self.retries     = retries
+        self.backoff     = backoff
+        self.timeout     = timeout
+        self.user_agent  = user_agent
+        self.semaphore   = asyncio.Semaphore(concurrency)
+        self.ssl_context = ssl.create_default_context() if self.use_ssl else None
+        self.idle        = [] # Pooled connections, as (reader, writer)
+
+        # Counters
+        self.num_requests    = 0
+        self.num_connections = 0
+        self.num_retries     = 0
+
+    async def open_connection(self):
+        self.num_connections += 1
+        return await asyncio.open_connection(self.host, self.port,
+                                             ssl=self.ssl_context)
+
+    @staticmethod
+    async def read_body(reader, headers):
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers, if any, up to the blank line
+                    while (await reader.readline()) not in (b'\r\n', b'\n',
+                                                            b''):
+                        pass
+                    return b''.join(chunks), True
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+
+        if 'content-length' in headers:
+            return (await reader.readexactly(int(headers['content-length'])),
+                    True)
+
+        # No length, so the body is the rest of the connection.
+        return await reader.read(), False
+
+    '''
+    Send one GET on the given connection.  Returns (status, headers, body,
+    True if the connection can be used again).  Header names are lower case.
+    '''
+    async def send_request(self, connection, path, extra_headers):
+        reader, writer = connection
+
+        lines = [ 'GET {0} HTTP/1.1'.format(path),
+                  'Host: {0}'.format(self.host),
+                  'User-Agent: {0}'.format(self.user_agent),
+                  'Connection: keep-alive' ]
+        lines += [ '{0}: {1}'.format(name, value)
+                   for name, value in extra_headers.items() ]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if len(status_line) == 0:
+            raise ConnectionError('Connection closed by server')
+
+        version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        status = int(status)
+        if status in (204, 304) or 100 <= status < 200:
+            body, reusable = b'', True
+        else:
+            body, reusable = await RangeClientClass.read_body(reader, headers)
+
+        reusable = (reusable and version == 'HTTP/1.1' and
+                    headers.get('connection', '').lower() != 'close')
+
+        return status, headers, body, reusable
+
+    '''
+    GET the range for the prefix, on a pooled connection, with retries.
+
+    Returns (status, headers, body) of the final response, which is any
+    status other than the ones that are retried (or the last of those, once
+    the retries run out).  Raises the last error if every attempt failed to
+    get a response at all.
+    '''
+    async def fetch_range(self, prefix, extra_headers=None):
+        path = self.base_path + prefix
+        extra_headers = extra_headers or {}
+
+        async with self.semaphore:
+            attempt = 0
+            while True:
+                retry_after = 0
+                reused = len(self.idle) > 0
+                connection = self.idle.pop() if reused else None
+                try:
+                    if connection == None:
+                        connection = await asyncio.wait_for(
+                            self.open_connection(), self.timeout)
+                    self.num_requests += 1
+                    status, headers, body, reusable = await asyncio.wait_for(
+                        self.send_request(connection, path, extra_headers),
+                        self.timeout)
+                except (OSError, EOFError, ValueError,
+                        asyncio.TimeoutError, asyncio.IncompleteReadError) \
+                        as err:
+                    if connection != None:
+                        connection[1].close()
+                    # A pooled connection the server has since closed isn't a
+                    # real failure, just use a new one.
+                    if reused and not isinstance(err, asyncio.TimeoutError):
+                        continue
+                    if attempt >= self.retries:
+                        raise
+                else:
+                    if reusable:
+                        self.idle.append(connection)
+                    else:
+                        connection[1].close()
+
+                    if (status not in RangeClientClass._retry_statuses or
+                        attempt >= self.retries):
+                        return status, headers, body
+
+                    try:
+                        retry_after = float(headers.get('retry-after', 0))
+                    except ValueError:
+                        pass
+
+                attempt += 1
+                self.num_retries += 1
+                await asyncio.sleep(max(retry_after, self.backoff *
+                                        2 ** (attempt - 1) *
+                                        random.uniform(0.5, 1.5)))
+
+    '''
+    The body of the range response for the prefix, as text.  Raises
+    OSError if the server doesn't return it.
+    '''
+    async def get_range(self, prefix):
+        status, headers, body = await self.fetch_range(prefix)
+        if status != 200:
+            raise OSError('HTTP {0} for range {1}'.format(status, prefix))
+        return body.decode('utf-8')
+
+    async def close(self):
+        for reader, writer in self.idle:
+            writer.close()
+        self.idle = []
@@ -0,0 +1,242 @@
+'''
+ShardStoreClass
+
+Offline pwned password lookups, from one compact binary file compiled from
+range responses: ones saved with -SaveContents / -s (<prefix>.txt files), a
+full local mirror of all 16^5 ranges, or the downloadable list of every hash
+("<40 hex chars>:<count>" lines, ordered by hash).
+
+Store layout (all integers little endian):
+
+    magic            8 bytes   b'PWNSHRD1'
+    num_records      8 bytes
+    coverage         16^5 bits, bit n set if range n is in the store (so a
+                     hash whose range wasn't compiled in is "unknown", not
+                     "not pwned")
+    offsets          (16^5 + 1) x 8 bytes, index of the first record of each
+                     range; range n is records offsets[n] to offsets[n + 1]
+    records          num_records x 19 bytes, sorted within each range:
+                       15 bytes: the first 30 hex chars of the hash suffix
+                        4 bytes: count
+
+The suffix is 35 hex chars (17.5 bytes); keeping 15 bytes of it makes every
+record the same size, and two suffixes in a range of a couple of thousand
+only share 120 bits by chance about 1 in 10^32 times.
+
+Lookups mmap the file and binary search the records of the hash's range in
+place, so nothing is parsed or loaded, and the OS caches the parts that get
+used.
+
+Example:
+    ShardStoreClass.build('pwned.store',
+                          ShardStoreClass.read_range_files('./HashFiles'))
+
+    store = ShardStoreClass('pwned.store')
+    count = store.lookup('119E9F64E12B97293A8334CCD162C1245786336D')
+    store.close()
+'''
+
+import mmap
+import os
+import struct
+
+
+class ShardStoreClass:
+
+    _magic       = b'PWNSHRD1'
+    _num_shards  = 16 ** 5
+    _key_size    = 15
+    _record      = struct.Struct('<15sI')
+    _header      = struct.Struct('<8sQ')
+    _offset      = struct.Struct('<Q')
+    _offset_pair = struct.Struct('<2Q')
+
+    _coverage_start = _header.size
+    _offsets_start  = _coverage_start + _num_shards // 8
+    _records_start  = _offsets_start + (_num_shards + 1) * _offset.size
+
+    # Constructor
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'rb')
+        self.map  = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.num_records = ShardStoreClass._header.unpack_from(self.map)
+        if magic != ShardStoreClass._magic:
+            self.close()
+            raise ValueError('"{0}" is not a shard store'.format(file_name))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    @staticmethod
+    def get_key(suffix):
+        return bytes.fromhex(suffix[:ShardStoreClass._key_size * 2])
+
+    def has_range(self, shard):
+        return (self.map[ShardStoreClass._coverage_start + shard // 8] >>
+                (shard % 8)) & 1 == 1
+
+    '''
+    The count for the full (40 hex chars) SHA-1 hash: 0 if it isn't in its
+    range, or None if its range isn't in the store.
+    '''
+    def lookup(self, sha1_hash):
+        shard = int(sha1_hash[:5], 16)
+        if not self.has_range(shard):
+            return None
+
+        low, high = ShardStoreClass._offset_pair.unpack_from(self.map,
+            ShardStoreClass._offsets_start + shard * 8)
+        key = ShardStoreClass.get_key(sha1_hash[5:])
+
+        record_map  = self.map
+        record_size = ShardStoreClass._record.size
+        key_size    = ShardStoreClass._key_size
+        start       = ShardStoreClass._records_start
+
+        while low < high:
+            middle = (low + high) // 2
+            position = start + middle * record_size
+            record_key = record_map[position:position + key_size]
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return ShardStoreClass._record.unpack_from(record_map,
+                                                           position)[1]
+        return 0
+
+    '''
+    Yield the first 128 bits of every hash in the store, as ints (see
+    HashFilterClass.get_key()), in order.
+    '''
+    def get_keys(self):
+        record_size = ShardStoreClass._record.size
+        start       = ShardStoreClass._records_start
+        offsets     = struct.unpack_from(
+            '<{0}Q'.format(ShardStoreClass._num_shards + 1), self.map,
+            ShardStoreClass._offsets_start)
+
+        for shard in range(ShardStoreClass._num_shards):
+            low, high = offsets[shard], offsets[shard + 1]
+            if low == high:
+                continue
+            prefix = shard << 108
+            for key, count in ShardStoreClass._record.iter_unpack(
+                    self.map[start + low * record_size:
+                             start + high * record_size]):
+                yield prefix | (int.from_bytes(key, 'big') >> 12)
+
+    '''
+    Parse the lines of a range ("<suffix>:<count>") into a list of
+    (suffix, count), leaving out padding lines (count 0).
+    '''
+    @staticmethod
+    def parse_lines(lines):
+        entries = []
+        for line in lines:
+            suffix, _, count = line.strip().partition(':')
+            if len(count) > 0 and count != '0':
+                entries.append((suffix, int(count)))
+        return entries
+
+    '''
+    Yield (shard, entries) for each <prefix>.txt range file in the directory,
+    in shard order.  Other files are ignored.
+    '''
+    @staticmethod
+    def read_range_files(directory):
+        shards = {}
+        for file_name in os.listdir(directory):
+            prefix, extension = os.path.splitext(file_name)
+            if extension.lower() != '.txt' or len(prefix) != 5:
+                continue
+            try:
+                shards[int(prefix, 16)] = file_name
+            except ValueError:
+                continue
+
+        for shard in sorted(shards):
+            # -SaveContents writes UTF-8 with a BOM
+            with open(os.path.join(directory, shards[shard]), 'r',
+                      encoding='utf-8-sig') as f:
+                yield shard, ShardStoreClass.parse_lines(f)
+
+    '''
+    Yield (shard, entries) from a file of every hash ("<40 hex chars>:<count>"
+    lines, ordered by hash, as downloaded from haveibeenpwned.com).
+    '''
+    @staticmethod
+    def read_corpus_file(file_name):
+        with open(file_name, 'r', encoding='utf-8-sig') as f:
+            shard   = -1
+            entries = []
+            for line in f:
+                line_shard = int(line[:5], 16)
+                if line_shard != shard:
+                    if line_shard < shard:
+                        raise ValueError('"{0}" is not ordered by hash'.format(
+                            file_name))
+                    if shard >= 0:
+                        yield shard, entries
+                    shard, entries = line_shard, []
+                entries += ShardStoreClass.parse_lines([line[5:]])
+
+            if shard >= 0:
+                yield shard, entries
+
+    '''
+    Write a store of the given ranges, (shard, [(suffix, count)...]) in
+    shard order, as read_range_files() and read_corpus_file() produce.  Only
+    one range is in memory at a time.  Returns (number of ranges, number of
+    records).
+    '''
+    @staticmethod
+    def build(file_name, ranges):
+        coverage = bytearray(ShardStoreClass._num_shards // 8)
+        offsets  = [0] * (ShardStoreClass._num_shards + 1)
+        record   = ShardStoreClass._record
+        num_records = num_ranges = 0
+        last_shard  = -1
+
+        temp_file_name = '{0}.{1}.tmp'.format(file_name, os.getpid())
+        with open(temp_file_name, 'wb') as f:
+            f.seek(ShardStoreClass._records_start)
+
+            for shard, entries in ranges:
+                if shard <= last_shard:
+                    raise ValueError('Ranges are not in order')
+
+                # Ranges not in the store are empty.
+                for empty_shard in range(last_shard + 1, shard + 1):
+                    offsets[empty_shard] = num_records
+                last_shard = shard
+
+                coverage[shard // 8] |= 1 << (shard % 8)
+                num_ranges += 1
+
+                keys = {}
+                for suffix, count in entries:
+                    key = ShardStoreClass.get_key(suffix.upper())
+                    keys[key] = max(count, keys.get(key, 0))
+
+                f.write(b''.join(record.pack(key, min(count, 0xFFFFFFFF))
+                                 for key, count in sorted(keys.items())))
+                num_records += len(keys)
+
+            for empty_shard in range(last_shard + 1,
+                                     ShardStoreClass._num_shards + 1):
+                offsets[empty_shard] = num_records
+
+            f.seek(0)
+            f.write(ShardStoreClass._header.pack(ShardStoreClass._magic,
+                                                 num_records))
+            f.write(coverage)
+            f.write(struct.pack('<{0}Q'.format(len(offsets)), *offsets))
+
+        os.replace(temp_file_name, file_name)
+
+        return num_ranges, num_records
@@ -0,0 +1,783 @@
+'''
+--------------------------------------------------------------------------------
+MIT License
+
+Copyright (c) 2023 Jim Moore
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+--------------------------------------------------------------------------------
+
+HaveIBeenPwned (Python)
+
+Python counterpart of HaveIBeenPwned.ps1, for checking whole password files
+(-f/--password-file) quickly.  See Readme.md for how the range API works.
+
+HaveIBeenPwned.ps1 checks one record at a time: a request per password, even
+when several passwords have the same 5 character hash prefix, and then a
+linear scan of the response, splitting every line, for each one.  This
+instead:
+o Groups the hashes by prefix, so each range is only fetched once, however
+  many passwords share it
+o Fetches the ranges concurrently with asyncio, over a small pool of
+  keep-alive connections (-c/--concurrency), retrying failed requests with
+  exponential backoff (see RangeClientClass.py)
+o Parses each response once, into a { suffix : count } table used for every
+  hash with that prefix
+o Streams the password file, hashing batches of passwords on a pool of
+  processes (-j/--jobs, see PasswordFileReaderClass.py), checking records as
+  their batch is hashed, and dropping the plain text passwords once they're
+  hashed.  So files of millions of records use all the cores and a bounded
+  amount of memory.
+
+--cache-directory keeps the range responses (see RangeCacheClass.py), and
+uses them on later runs: as they are for --cache-ttl seconds, and after that
+once the server says (with a 304 to a conditional request) they haven't
+changed.
+
+Ranges saved with -s can be compiled into a store (--build-store, see
+ShardStoreClass.py), which --store then checks against offline, without
+sending any requests.  A filter of the pwned hashes (--build-filter, see
+HashFilterClass.py) lets --filter skip most of the hashes that aren't
+pwned, and only look up the rest.
+
+--api-url can point at rangeserver.py, a local stand-in for the range API,
+to try it without sending anything to the real site.
+
+usage: haveibeenpwned.py [-h] (-p PASSWORD | --sha1 SHA1 | -f PASSWORD_FILE)
+                         [-j JOBS] [--batch-size BATCH_SIZE]
+                         [-s] [-r CONTENT_ROOT] [--pretend]
+                         [-l {Minimum,Normal,Verbose}] [--api-url API_URL]
+                         [-c CONCURRENCY] [--retries RETRIES]
+                         [--backoff BACKOFF] [--timeout TIMEOUT]
+                         [--cache-directory CACHE_DIRECTORY]
+                         [--cache-ttl CACHE_TTL] [--cache-size CACHE_SIZE]
+                         [--store STORE] [--build-store BUILD_STORE]
+                         [--corpus CORPUS] [--filter FILTER]
+                         [--build-filter BUILD_FILTER] [--fp-rate FP_RATE]
+
+    -p PASSWORD, --password PASSWORD
+                        Password to check
+
+    --sha1 SHA1         SHA-1 of the password to check
+
+    -f PASSWORD_FILE, --password-file PASSWORD_FILE
+                        File of passwords to check, TSV (or CSV, if it ends
+                        in .csv) with a Group, Title, Username, Password
+                        header
+
+    -j JOBS, --jobs JOBS
+                        Number of processes hashing the password file.
+                        Default is the number of CPUs.
+
+    --batch-size BATCH_SIZE
+                        Number of passwords hashed at a time by each process
+
+    -s, --save-contents Save each range response to <CONTENT_ROOT>/<prefix>.txt
+
+    -r CONTENT_ROOT, --content-root CONTENT_ROOT
+                        Directory the range responses are saved to with -s.
+                        Default is the current directory.
+
+    --pretend           Do everything except send requests
+
+    -l {Minimum,Normal,Verbose}, --log-level {Minimum,Normal,Verbose}
+                        Level of logging to use
+
+    --api-url API_URL   Base URL of the range API
+
+    -c CONCURRENCY, --concurrency CONCURRENCY
+                        Number of requests (and pooled connections) at once
+
+    --retries RETRIES   Number of times a failed request is retried
+
+    --backoff BACKOFF   Seconds to wait before the first retry (doubled for
+                        each one after that)
+
+    --timeout TIMEOUT   Seconds to wait for a connection or response
+
+    --cache-directory CACHE_DIRECTORY
+                        Directory to cache range responses in, and use them
+                        from on later runs
+
+    --cache-ttl CACHE_TTL
+                        Seconds a cached range is used for before it is
+                        revalidated with the server
+
+    --cache-size CACHE_SIZE
+                        Most MB of range responses to cache (least recently
+                        used ones are removed)
+
+    --store STORE       Check against this store (built with --build-store)
+                        instead of the range API, without sending any requests
+
+    --build-store BUILD_STORE
+                        Compile the range files saved in CONTENT_ROOT (or
+                        --corpus) into this store, and exit
+
+    --corpus CORPUS     With --build-store, file of every hash
+                        ("<SHA-1>:<count>" lines, ordered by hash) to compile
+                        instead of CONTENT_ROOT
+
+    --filter FILTER     Skip the hashes this filter (built with --build-filter)
+                        shows are not pwned, and only check the rest
+
+    --build-filter BUILD_FILTER
+                        Build a filter of the hashes in --store (or the range
+                        files saved in CONTENT_ROOT, or --corpus), and exit
+
+    --fp-rate FP_RATE   False positive rate of the filter built with
+                        --build-filter
+
+Example:
+    python haveibeenpwned.py -f passwordlist.tsv -s -r ./HashFiles
+
+    Checks every password in passwordlist.tsv, fetching each distinct range
+    once, 4 at a time, and saves the responses to ./HashFiles.
+
+    python haveibeenpwned.py -p "pa$$word" -l Verbose
+
+    python haveibeenpwned.py -f passwordlist.tsv --cache-directory ./RangeCache
+
+    python haveibeenpwned.py --build-store pwned.store -r ./HashFiles
+    python haveibeenpwned.py -f passwordlist.tsv --store pwned.store
+
+    python haveibeenpwned.py --build-filter pwned.filter --store pwned.store
+    python haveibeenpwned.py -f passwordlist.tsv --filter pwned.filter
+                             --store pwned.store
+'''
+
+import argparse
+import asyncio
+import os
+import sys
+
+from datetime import datetime
+
+# One password (or hash) to check
+from PasswordDetailsClass import PasswordDetailsClass
+
+# Streams a password file, hashing on a pool of processes
+from PasswordFileReaderClass import PasswordFileReaderClass
+
+# Pooled, concurrent range API client
+from RangeClientClass import RangeClientClass
+
+# On disk cache of range responses, with revalidation
+from RangeCacheClass import RangeCacheClass
+
+# mmap'd store of ranges, for offline lookups
+from ShardStoreClass import ShardStoreClass
+
+# Bloom filter for screening out hashes that aren't pwned
+from HashFilterClass import HashFilterClass
+
+# Global options object, produced by argparse.ArgumentParser.parse_args()
+options = None
+
+# Same levels as $global:validLoggingLevels in HaveIBeenPwned.ps1
+logging_levels = { 'Minimum' : 0, 'Normal' : 1, 'Verbose' : 3 }
+
+# prefix -> records waiting on the request for that range
+pending_records = {}
+
+# Most prefixes waiting (per pooled connection) before reading more records
+max_tasks_per_connection = 256
+
+# HashFilterClass of --filter, if given
+hash_filter = None
+
+check_stats = { 'checked' : 0, 'failed' : 0, 'screened' : 0, 'pwned' : [] }
+
+'''
+parse_range
+
+Parse a range response ("<suffix>:<count>" lines) into { suffix : count }.
+Suffixes are upper case, like the hashes in PasswordDetailsClass.
+'''
+def parse_range(text):
+    table = {}
+    for line in text.splitlines():
+        suffix, _, count = line.partition(':')
+        if len(count) > 0:
+            table[suffix.upper()] = int(count)
+    return table
+
+'''
+write_content_to_file
+
+Save a range response to <content_root>/<prefix>.txt, same as
+Write-Content-To-File in HaveIBeenPwned.ps1.
+'''
+def write_content_to_file(content, prefix):
+    os.makedirs(options.content_root, exist_ok=True)
+
+    file_name = os.path.join(options.content_root, '{0}.txt'.format(prefix))
+    with open(file_name, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+    output_string('Wrote {0} bytes to {1}'.format(len(content), file_name),
+                  logging_levels['Verbose'])
+
+'''
+add_result
+
+Count a record whose hash_hit_count has been set, and output it if
+show_records.
+'''
+def add_result(record, show_records):
+    check_stats['checked'] += 1
+    if record.hash_hit_count > 0:
+        check_stats['pwned'].append(record)
+
+    if show_records:
+        output_string('{0} {1}'.format('PWNED' if record.hash_hit_count > 0
+                                       else 'ok   ', record))
+
+'''
+screen_record
+
+With --filter, check the record against the filter first.  Returns False if
+the filter shows it isn't pwned (and counts it), or True if it still needs
+to be checked exactly.
+'''
+def screen_record(record, show_records):
+    if hash_filter == None or hash_filter.contains(record.sha1_hash):
+        return True
+
+    record.hash_hit_count = 0
+    check_stats['screened'] += 1
+    add_result(record, show_records)
+    return False
+
+'''
+check_prefix
+
+Fetch the range for one prefix (from the client, a RangeClientClass, or a
+RangeCacheClass in front of it), and set the hash_hit_count of every record
+waiting on it in pending_records (including any added while the request was
+in flight).
+'''
+async def check_prefix(client, prefix, task_slots):
+    try:
+        if options.pretend:
+            output_string('Just pretending, or we would have requested range '
+                          '{0}'.format(prefix), logging_levels['Verbose'])
+            content = ''
+        else:
+            content = await client.get_range(prefix)
+    except Exception as err:
+        records = pending_records.pop(prefix)
+        output_string('**** Failed to check range {0} ({1} records): {2}'
+                      .format(prefix, len(records), err),
+                      logging_levels['Minimum'])
+        check_stats['failed'] += len(records)
+        return
+    finally:
+        task_slots.release()
+
+    if options.save_contents and not options.pretend:
+        write_content_to_file(content, prefix)
+
+    # Formatting a line per record adds up over millions of them, so don't
+    # if it isn't going to be shown.
+    show_records = (logging_levels[options.log_level] >=
+                    logging_levels['Normal'])
+
+    table = parse_range(content)
+    for record in pending_records.pop(prefix):
+        record.hash_hit_count = table.get(record.get_suffix(), 0)
+        add_result(record, show_records)
+
+'''
+check_records
+
+Check the records, as batches of them come in (see PasswordFileReaderClass),
+with one request per prefix, concurrently.
+
+Records whose prefix already has a request in flight just wait for that one
+(pending_records).  At most max_tasks_per_connection * --concurrency
+prefixes are waiting at once, and no more batches are read until some are
+done, so the whole file is never in memory.
+'''
+async def check_records(batches):
+    client = RangeClientClass(options.api_url, options.concurrency,
+                              options.retries, options.backoff,
+                              options.timeout)
+    if (len(options.cache_directory) > 0):
+        cache = RangeCacheClass(client, options.cache_directory,
+                                options.cache_ttl,
+                                options.cache_size * 1000000)
+    else:
+        cache = None
+    loop       = asyncio.get_running_loop()
+    tasks      = set()
+    task_slots = asyncio.Semaphore(max_tasks_per_connection *
+                                   options.concurrency)
+    show_records = (logging_levels[options.log_level] >=
+                    logging_levels['Normal'])
+
+    try:
+        while True:
+            # Reading and hashing happen on another thread (and processes),
+            # so requests keep going meanwhile.
+            records = await loop.run_in_executor(None, next, batches, None)
+            if records == None:
+                break
+
+            for record in records:
+                if not screen_record(record, show_records):
+                    continue
+
+                prefix = record.get_prefix()
+                if prefix in pending_records:
+                    pending_records[prefix].append(record)
+                else:
+                    await task_slots.acquire()
+                    pending_records[prefix] = [record]
+                    task = asyncio.ensure_future(check_prefix(
+                        cache or client, prefix, task_slots))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+        if len(tasks) > 0:
+            await asyncio.wait(tasks)
+    finally:
+        if cache != None:
+            cache.close()
+        await client.close()
+
+    output_string('{0} requests on {1} connections, {2} retries'.format(
+        client.num_requests, client.num_connections, client.num_retries))
+    if cache != None:
+        output_string('Cache: {0} hits, {1} revalidated, {2} downloaded, '
+                      '{3} ranges ({4} bytes) in {5}'.format(
+                          cache.num_hits, cache.num_revalidations,
+                          cache.num_misses, len(cache.entries), cache.size,
+                          options.cache_directory))
+
+'''
+check_records_in_store
+
+Check the records against a store built with --build-store, without any
+requests.  Records whose range isn't in the store can't be checked.
+'''
+def check_records_in_store(batches):
+    store = ShardStoreClass(options.store)
+    show_records = (logging_levels[options.log_level] >=
+                    logging_levels['Normal'])
+
+    try:
+        for records in batches:
+            for record in records:
+                if not screen_record(record, show_records):
+                    continue
+
+                count = store.lookup(record.sha1_hash)
+                if count == None:
+                    output_string('**** Range {0} is not in {1}: {2}'.format(
+                        record.get_prefix(), options.store, record),
+                        logging_levels['Verbose'])
+                    check_stats['failed'] += 1
+                    continue
+
+                record.hash_hit_count = count
+                add_result(record, show_records)
+    finally:
+        store.close()
+
+'''
+get_ranges
+
+The (shard, entries) of each range to build a store or filter from: the
+--corpus list of every hash, if given, or else the range files saved in
+--content-root.
+'''
+def get_ranges():
+    if (len(options.corpus) > 0):
+        return ShardStoreClass.read_corpus_file(options.corpus)
+    return ShardStoreClass.read_range_files(options.content_root)
+
+'''
+build_store
+
+Compile the saved range files in --content-root (or the --corpus list of
+every hash) into the --build-store file.
+'''
+def build_store():
+    num_ranges, num_records = ShardStoreClass.build(options.build_store,
+                                                    get_ranges())
+
+    output_string('Wrote {0} ranges ({1} hashes) from {2} to {3} ({4} bytes)'
+                  .format(num_ranges, num_records,
+                          options.corpus or options.content_root,
+                          options.build_store,
+                          os.path.getsize(options.build_store)),
+                  logging_levels['Minimum'])
+
+'''
+build_filter
+
+Build the --build-filter file from the hashes in --store, if given, or else
+the saved range files in --content-root (or the --corpus list of every
+hash), for a false positive rate of --fp-rate.
+'''
+def build_filter():
+    if (len(options.store) > 0):
+        store = ShardStoreClass(options.store)
+        source = options.store
+        num_keys = store.num_records
+        keys = store.get_keys()
+    else:
+        store = None
+        source = options.corpus or options.content_root
+        # The ranges are read twice, first just to count the hashes, since
+        # the filter is sized for them.
+        num_keys = sum(len(entries) for shard, entries in get_ranges())
+        keys = HashFilterClass.get_range_keys(get_ranges())
+
+    try:
+        size = HashFilterClass.build(options.build_filter, keys, num_keys,
+                                     options.fp_rate)
+    finally:
+        if store != None:
+            store.close()
+
+    output_string('Wrote {0} hashes from {1} to {2} ({3} bytes)'.format(
+        num_keys, source, options.build_filter, size),
+        logging_levels['Minimum'])
+
+'''
+output_results
+
+Show the list of records found in the range responses, like the end of
+HaveIBeenPwned.ps1.
+'''
+def output_results():
+    output_string('{0} records checked, {1} pwned, {2} could not be checked'
+                  .format(check_stats['checked'], len(check_stats['pwned']),
+                          check_stats['failed']), logging_levels['Minimum'])
+    if hash_filter != None:
+        output_string('{0} records screened out by {1}'.format(
+            check_stats['screened'], options.filter),
+            logging_levels['Minimum'])
+
+    pwned = check_stats['pwned']
+    if len(pwned) == 0:
+        return
+
+    output_string('-' * 80, logging_levels['Minimum'])
+    output_string('\tList of passwords found on HaveIBeenPwned.com [{0}]'
+                  .format(len(pwned)), logging_levels['Minimum'])
+    output_string('-' * 80, logging_levels['Minimum'])
+    for record in pwned:
+        output_string(str(record), logging_levels['Minimum'])
+
+'''
+output_options
+
+Output the params and their values.
+'''
+def output_options():
+    global options
+    output_string('Params:')
+    output_string('Password     : {0}'.format(options.password or '<blank>'))
+    output_string('SHA1         : {0}'.format(options.sha1 or '<blank>'))
+    output_string('PasswordFile : {0}'.format(options.password_file or
+                                              '<blank>'))
+    output_string('Pretend      : {0}'.format(options.pretend))
+    output_string('LogLevel     : {0}'.format(options.log_level))
+    output_string('SaveContents : {0}'.format(options.save_contents))
+    output_string('ContentRoot  : {0}'.format(options.content_root))
+    output_string('API URL      : {0}'.format(options.api_url))
+    output_string('Jobs         : {0}'.format(options.jobs))
+    output_string('Concurrency  : {0}'.format(options.concurrency))
+    output_string('Retries      : {0}'.format(options.retries))
+    output_string('Store        : {0}'.format(options.store or '<blank>'))
+    output_string('Filter       : {0}'.format(options.filter or '<blank>'))
+    output_string('Cache        : {0}'.format(options.cache_directory or
+                                              '<blank>'))
+
+'''
+output_string
+
+Output wrapper that prepends a time string, and only outputs if the level is
+within -l/--log-level.
+'''
+def output_string(str, level=logging_levels['Normal']):
+    if level <= logging_levels[options.log_level]:
+        print("{0} {1}".format("[{:%Y-%m-%d %H:%M:%S}]".format(
+            datetime.now()), str))
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Check passwords against HaveIBeenPwned')
+
+    input_group = parser.add_mutually_exclusive_group()
+
+    input_group.add_argument('-p','--password',
+        dest     = 'password',
+        default  = '',
+        help     = 'Password to check'
+    )
+
+    input_group.add_argument('--sha1',
+        dest     = 'sha1',
+        default  = '',
+        help     = 'SHA-1 of the password to check'
+    )
+
+    input_group.add_argument('-f','--password-file',
+        dest     = 'password_file',
+        default  = '',
+        help     = ('File of passwords to check, TSV (or CSV, if it ends in '
+                    '.csv) with a Group, Title, Username, Password header')
+    )
+
+    parser.add_argument('-j','--jobs',
+        required = False,
+        dest     = 'jobs',
+        type     = int,
+        default  = os.cpu_count(),
+        help     = ('Number of processes hashing the password file. Default '
+                    'is the number of CPUs.')
+    )
+
+    parser.add_argument('--batch-size',
+        required = False,
+        dest     = 'batch_size',
+        type     = int,
+        default  = 10000,
+        help     = 'Number of passwords hashed at a time by each process'
+    )
+
+    parser.add_argument('-s','--save-contents',
+        required = False,
+        dest     = 'save_contents',
+        default  = False,
+        action   = 'store_true',
+        help     = 'Save each range response to <CONTENT_ROOT>/<prefix>.txt'
+    )
+
+    parser.add_argument('-r','--content-root',
+        required = False,
+        dest     = 'content_root',
+        default  = os.getcwd(),
+        help     = ('Directory the range responses are saved to with -s. '
+                    'Default is the current directory.')
+    )
+
+    parser.add_argument('--pretend',
+        required = False,
+        dest     = 'pretend',
+        default  = False,
+        action   = 'store_true',
+        help     = 'Do everything except send requests'
+    )
+
+    parser.add_argument('-l','--log-level',
+        required = False,
+        dest     = 'log_level',
+        default  = 'Normal',
+        choices  = list(logging_levels.keys()),
+        help     = 'Level of logging to use'
+    )
+
+    parser.add_argument('--api-url',
+        required = False,
+        dest     = 'api_url',
+        default  = 'https://api.pwnedpasswords.com/range/',
+        help     = 'Base URL of the range API'
+    )
+
+    parser.add_argument('-c','--concurrency',
+        required = False,
+        dest     = 'concurrency',
+        type     = int,
+        default  = 4,
+        help     = 'Number of requests (and pooled connections) at once'
+    )
+
+    parser.add_argument('--retries',
+        required = False,
+        dest     = 'retries',
+        type     = int,
+        default  = 3,
+        help     = 'Number of times a failed request is retried'
+    )
+
+    parser.add_argument('--backoff',
+        required = False,
+        dest     = 'backoff',
+        type     = float,
+        default  = 1.0,
+        help     = ('Seconds to wait before the first retry (doubled for each '
+                    'one after that)')
+    )
+
+    parser.add_argument('--timeout',
+        required = False,
+        dest     = 'timeout',
+        type     = float,
+        default  = 30.0,
+        help     = 'Seconds to wait for a connection or response'
+    )
+
+    parser.add_argument('--cache-directory',
+        required = False,
+        dest     = 'cache_directory',
+        default  = '',
+        help     = ('Directory to cache range responses in, and use them from '
+                    'on later runs')
+    )
+
+    parser.add_argument('--cache-ttl',
+        required = False,
+        dest     = 'cache_ttl',
+        type     = float,
+        default  = 86400,
+        help     = ('Seconds a cached range is used for before it is '
+                    'revalidated with the server')
+    )
+
+    parser.add_argument('--cache-size',
+        required = False,
+        dest     = 'cache_size',
+        type     = int,
+        default  = 1000,
+        help     = ('Most MB of range responses to cache (least recently used '
+                    'ones are removed)')
+    )
+
+    parser.add_argument('--store',
+        required = False,
+        dest     = 'store',
+        default  = '',
+        help     = ('Check against this store (built with --build-store) '
+                    'instead of the range API, without sending any requests')
+    )
+
+    parser.add_argument('--build-store',
+        required = False,
+        dest     = 'build_store',
+        default  = '',
+        help     = ('Compile the range files saved in CONTENT_ROOT (or '
+                    '--corpus) into this store, and exit')
+    )
+
+    parser.add_argument('--corpus',
+        required = False,
+        dest     = 'corpus',
+        default  = '',
+        help     = ('With --build-store, file of every hash ("<SHA-1>:<count>" '
+                    'lines, ordered by hash) to compile instead of CONTENT_ROOT')
+    )
+
+    parser.add_argument('--filter',
+        required = False,
+        dest     = 'filter',
+        default  = '',
+        help     = ('Skip the hashes this filter (built with --build-filter) '
+                    'shows are not pwned, and only check the rest')
+    )
+
+    parser.add_argument('--build-filter',
+        required = False,
+        dest     = 'build_filter',
+        default  = '',
+        help     = ('Build a filter of the hashes in --store (or the range '
+                    'files saved in CONTENT_ROOT, or --corpus), and exit')
+    )
+
+    parser.add_argument('--fp-rate',
+        required = False,
+        dest     = 'fp_rate',
+        type     = float,
+        default  = 0.001,
+        help     = ('False positive rate of the filter built with '
+                    '--build-filter')
+    )
+
+    options = parser.parse_args()
+
+    if not 0 < options.fp_rate < 1:
+        parser.error('--fp-rate must be between 0 and 1')
+
+    if (len(options.build_store) == 0 and len(options.build_filter) == 0 and len(options.password) == 0 and
+        len(options.sha1) == 0 and len(options.password_file) == 0):
+        parser.error('one of the arguments -p/--password --sha1 '
+                     '-f/--password-file is required')
+
+    if (len(options.sha1) > 0 and
+        (len(options.sha1) != 40 or
+         any(c not in '0123456789abcdefABCDEF' for c in options.sha1))):
+        parser.error('--sha1 must be 40 hex characters')
+
+    return options
+
+def main(options):
+    global hash_filter
+
+    output_options()
+
+    if (len(options.build_store) > 0 or len(options.build_filter) > 0):
+        if (len(options.build_store) > 0):
+            build_store()
+        if (len(options.build_filter) > 0):
+            build_filter()
+        return True
+
+    if (len(options.filter) > 0):
+        hash_filter = HashFilterClass(options.filter)
+
+    if (len(options.password_file) > 0):
+        reader = PasswordFileReaderClass(options.password_file, options.jobs,
+                                         options.batch_size)
+        batches = reader.read_batches()
+    else:
+        reader = None
+        batches = iter([[ PasswordDetailsClass(password=options.password,
+                                               sha1_hash=options.sha1) ]])
+
+    if (len(options.store) > 0):
+        check_records_in_store(batches)
+    else:
+        asyncio.run(check_records(batches))
+
+    if reader != None:
+        output_string('Read {0} records from {1} ({2} without a password '
+                      'skipped)'.format(reader.num_records,
+                                        options.password_file,
+                                        reader.num_skipped))
+    output_results()
+
+    return check_stats['failed'] == 0
+
+
+if __name__ == "__main__":
+    options = parse_args()
+
+    start_time = datetime.now()
+    succeeded = main(options)
+    elapsed_time = datetime.now() - start_time
+
+    output_string("Elapsed time: {0}".format(elapsed_time),
+                  logging_levels['Minimum'])
+
+    if not succeeded:
+        sys.exit(1)
@@ -0,0 +1,284 @@
+'''
+Local stand-in for the Pwned Passwords range API
+
+Serves GET /range/<5 hex chars> the same way api.pwnedpasswords.com does
+(lines of "<35 hex chars>:<count>", CRLF separated), so haveibeenpwned.py can
+be tried and timed without sending anything to the real site.
+
+Responses come from, in order:
+o <CONTENT_ROOT>/<prefix>.txt, if -r/--content-root is given and the file is
+  there (ex. saved by HaveIBeenPwned.ps1 -SaveContents, or haveibeenpwned.py
+  -s)
+o Otherwise, --lines made up suffixes (the same ones every time for a given
+  prefix), plus the suffix of any password in -p/--pwned-file, so those are
+  reported as pwned.
+
+Responses have an ETag and Last-Modified (the file's, or when the server
+started for made up ranges), and conditional requests (If-None-Match,
+If-Modified-Since) for a range that hasn't changed get 304 Not Modified, as
+haveibeenpwned.py --cache-directory expects.
+
+Connections are HTTP/1.1 keep-alive, and --delay and --fail-rate can be used
+to make it slow or unreliable, to see the retries and concurrency at work.
+Counts of connections, requests, failures and 304s are output on Ctrl+C.
+
+usage: rangeserver.py [-h] [--port PORT] [-r CONTENT_ROOT] [-p PWNED_FILE]
+                      [--lines LINES] [--delay DELAY] [--fail-rate FAIL_RATE]
+
+Example:
+    python rangeserver.py --port 8080 -p pwned.txt --delay 0.05
+    python haveibeenpwned.py -f passwords.tsv
+                             --api-url http://localhost:8080/range/
+'''
+
+import argparse
+import asyncio
+import email.utils
+import hashlib
+import os
+import random
+import time
+
+from datetime import datetime
+
+# Global options object, produced by argparse.ArgumentParser.parse_args()
+options = None
+
+# prefix -> { suffix : count } of the -p/--pwned-file passwords
+pwned_hashes = {}
+
+# Last-Modified of the made up ranges
+start_time = time.time()
+
+stats = { 'connections' : 0, 'requests' : 0, 'failures' : 0,
+          'not_modified' : 0 }
+
+'''
+get_range_body
+
+The response body for the prefix (upper case hex), and when it last changed
+(as a time.time() value).
+'''
+def get_range_body(prefix):
+    if (len(options.content_root) > 0):
+        for name in (prefix, prefix.lower()):
+            file_name = os.path.join(options.content_root,
+                                     '{0}.txt'.format(name))
+            if os.path.isfile(file_name):
+                with open(file_name, 'r', encoding='utf-8-sig') as f:
+                    return ('\r\n'.join(f.read().split()),
+                            os.path.getmtime(file_name))
+
+    rng = random.Random(prefix)
+    lines = { '{0:035X}'.format(rng.getrandbits(140)) : rng.randint(1, 50)
+              for i in range(options.lines) }
+    lines.update(pwned_hashes.get(prefix, {}))
+
+    return ('\r\n'.join('{0}:{1}'.format(suffix, count)
+                        for suffix, count in sorted(lines.items())),
+            start_time)
+
+'''
+get_range_response
+
+The response for the range, with an ETag and Last-Modified, or 304 Not
+Modified if the request's If-None-Match (or else If-Modified-Since) shows
+the client already has it.
+'''
+def get_range_response(prefix, headers):
+    text, modified_time = get_range_body(prefix)
+    body = text.encode('utf-8')
+
+    extra_headers = {
+        'ETag'          : '"{0}"'.format(hashlib.sha1(body).hexdigest()[:16]),
+        'Last-Modified' : email.utils.formatdate(modified_time, usegmt=True) }
+
+    if 'if-none-match' in headers:
+        not_modified = extra_headers['ETag'] in [ etag.strip() for etag in
+            headers['if-none-match'].split(',') ]
+    elif 'if-modified-since' in headers:
+        try:
+            not_modified = int(modified_time) <= email.utils \
+                .parsedate_to_datetime(headers['if-modified-since']) \
+                .timestamp()
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+
+    if not_modified:
+        stats['not_modified'] += 1
+        return get_response(304, 'Not Modified', extra_headers=extra_headers,
+                            content_length=False)
+
+    return get_response(200, 'OK', body, extra_headers)
+
+def get_response(status, reason, body=b'', extra_headers=None,
+                 content_length=True):
+    headers = [ 'HTTP/1.1 {0} {1}'.format(status, reason),
+                'Content-Type: text/plain' ]
+    if content_length:
+        headers.append('Content-Length: {0}'.format(len(body)))
+    headers += [ '{0}: {1}'.format(name, value)
+                 for name, value in (extra_headers or {}).items() ]
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body
+
+'''
+handle_connection
+
+Serve requests on one keep-alive connection until the client closes it.
+'''
+async def handle_connection(reader, writer):
+    stats['connections'] += 1
+
+    try:
+        while True:
+            request_line = await reader.readline()
+            if len(request_line) == 0:
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            stats['requests'] += 1
+            method, path = request_line.decode('latin-1').split(' ')[:2]
+            prefix = path.rstrip('/').rpartition('/')[2].upper()
+
+            if options.delay > 0:
+                await asyncio.sleep(options.delay)
+
+            if random.random() < options.fail_rate:
+                stats['failures'] += 1
+                response = get_response(503, 'Service Unavailable',
+                                        extra_headers={ 'Retry-After' : 0 })
+            elif (method != 'GET' or not path.startswith('/range/') or
+                  len(prefix) != 5 or
+                  any(c not in '0123456789ABCDEF' for c in prefix)):
+                response = get_response(400, 'Bad Request',
+                    b'The hash prefix was not in a valid format')
+            else:
+                response = get_range_response(prefix, headers)
+
+            writer.write(response)
+            await writer.drain()
+
+            if headers.get('connection', '').lower() == 'close':
+                break
+    except (OSError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+'''
+read_pwned_file
+
+Read the -p/--pwned-file, one password per line (or "<password>:<count>"),
+into pwned_hashes.
+'''
+def read_pwned_file(file_name):
+    with open(file_name, 'r', encoding='utf-8') as f:
+        for line in f:
+            password, _, count = line.rstrip('\r\n').rpartition(':')
+            if not count.isdigit():
+                password, count = line.rstrip('\r\n'), '1000'
+            if len(password) == 0:
+                continue
+
+            sha1_hash = hashlib.sha1(password.encode('utf-8')).hexdigest() \
+                .upper()
+            pwned_hashes.setdefault(sha1_hash[:5], {})[sha1_hash[5:]] = \
+                int(count)
+
+async def serve():
+    server = await asyncio.start_server(handle_connection, options.host,
+                                        options.port)
+    output_string('Serving http://{0}:{1}/range/<prefix> (Ctrl+C to stop)'
+                  .format(options.host, options.port))
+    async with server:
+        await server.serve_forever()
+
+def output_string(str):
+    print("{0} {1}".format("[{:%Y-%m-%d %H:%M:%S}]".format(datetime.now()),str))
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the Pwned Passwords range API')
+
+    parser.add_argument('--host',
+        required = False,
+        dest     = 'host',
+        default  = '127.0.0.1',
+        help     = 'Address to listen on.'
+    )
+
+    parser.add_argument('--port',
+        required = False,
+        dest     = 'port',
+        type     = int,
+        default  = 8080,
+        help     = 'Port to listen on.'
+    )
+
+    parser.add_argument('-r','--content-root',
+        required = False,
+        dest     = 'content_root',
+        default  = '',
+        help     = 'Directory of saved <prefix>.txt range responses to serve.'
+    )
+
+    parser.add_argument('-p','--pwned-file',
+        required = False,
+        dest     = 'pwned_file',
+        default  = '',
+        help     = ('File of passwords (one per line, optionally '
+                    '"<password>:<count>") to report as pwned.')
+    )
+
+    parser.add_argument('--lines',
+        required = False,
+        dest     = 'lines',
+        type     = int,
+        default  = 800,
+        help     = ('Number of made up lines per range (the real ones have '
+                    'several hundred to a couple of thousand).')
+    )
+
+    parser.add_argument('--delay',
+        required = False,
+        dest     = 'delay',
+        type     = float,
+        default  = 0,
+        help     = 'Seconds to wait before each response.'
+    )
+
+    parser.add_argument('--fail-rate',
+        required = False,
+        dest     = 'fail_rate',
+        type     = float,
+        default  = 0,
+        help     = 'Fraction (0-1) of requests answered with 503.'
+    )
+
+    options = parser.parse_args()
+
+    return options
+
+if __name__ == "__main__":
+    options = parse_args()
+
+    if (len(options.pwned_file) > 0):
+        read_pwned_file(options.pwned_file)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+    output_string('{0} connections, {1} requests, {2} failures, {3} not '
+                  'modified'.format(stats['connections'], stats['requests'],
+                                    stats['failures'], stats['not_modified']))
@@ -0,0 +1,651 @@
+'''
+Amortization engine
+
+The calculations of MortgagePayments.html, in Python, for whole batches of
+loan scenarios at once: MortgageDetail (payment for a loan amount, rate and
+term), futureValueAfterNumPeriods (balance left at an ARM rate change) and
+the PaymentDetail loop of GeneratePaymentSchedule, with the same rounding, so
+the results match the page to the cent.
+
+The page builds one PaymentDetail object per month, one loan at a time.
+Here a batch of S scenarios (loan amounts x interest rates x terms, sharing
+a start date and any ARM adjustment dates) is computed as NumPy arrays of
+S x (longest term) months:
+o Each month's beginning balance comes from the same closed form the page
+  uses (LoanAmount * (1 + r)^(m-1), less the future value of the payments
+  made so far), so every month of every scenario is computed at once rather
+  than one after the other
+o The page's Number.prototype.round (round half to even, done on x * 10^n)
+  is done on whole arrays by js_round()
+o The cumulative columns are running sums (np.cumsum adds in the same order
+  the page does), and the final payment adjustment is applied to the last
+  month of each scenario
+o Dates only depend on the month, not the loan, so they're computed once per
+  batch
+o Math.pow is V8's own (js_pow()), since the page shows Compound Interest
+  and Payment Multiplier with every digit
+
+Output matches the page's text (toFixed(2), Number toString, the en-US
+toLocaleDateString() M/D/YYYY dates); see mortgagepayments.py.
+
+Needs numpy.
+'''
+
+import datetime
+import re
+
+import numpy as np
+
+# Column headers, same as HEADER_* in MortgagePayments.html
+header_mortgage_details_entry      = ['Date', 'LoanAmount', 'InterestRate',
+                                      'TermsInMonths']
+
+header_mortgage_details_calculated = ['Date', 'LoanAmount', 'InterestRate',
+                                      'TermsInMonths', 'MonthlyRate',
+                                      'CompoundInterest', 'PaymentMultiplier',
+                                      'MonthlyPayment']
+
+header_payment_schedule            = ['Term', 'StatementDate', 'PaymentDate',
+                                      'InterestRate', 'Beginning Balance',
+                                      'Payment', 'Principal', 'Interest',
+                                      'CumulativePrincipal',
+                                      'CumulativeInterest', 'CumulativePaid',
+                                      'EndingBalance']
+
+# The page's Output Delimiter choices
+delimiters = { 'CSV' : ',', 'TAB' : '\t' }
+
+'''
+js_round
+
+Number.prototype.round from the page, on an array (or a number): scale by
+10^places, Math.round() (halves go up), then if it was exactly a half, back
+to the even neighbour.
+'''
+def js_round(x, places):
+    scale    = 10.0 ** places
+    value    = np.multiply(x, scale, dtype=np.float64)
+    rounded  = np.floor(value)
+    fraction = value - rounded
+    rounded  = np.asarray(rounded + (fraction >= 0.5))
+
+    # Exact halves are rare, so only look at those for odd ones.
+    ties = np.flatnonzero(fraction == 0.5)
+    if len(ties) > 0:
+        rounded = rounded.copy()
+        tied = rounded.flat[ties]
+        rounded.flat[ties] = np.where(np.fmod(tied, 2.0) != 0, tied - 1, tied)
+
+    result = rounded / scale
+    return result if result.ndim > 0 else result[()]
+
+# Constants of fdlibm's e_pow.c, which V8's Math.pow is a port of
+_pow_bp   = np.array([1.0, 1.5])
+_pow_dp_h = np.array([0.0, 5.84962487220764160156e-01])
+_pow_dp_l = np.array([0.0, 1.35003920212974897128e-08])
+_pow_L1   =  5.99999999999994648725e-01
+_pow_L2   =  4.28571428578550184252e-01
+_pow_L3   =  3.33333329818377432918e-01
+_pow_L4   =  2.72728123808534006489e-01
+_pow_L5   =  2.30660745775561754067e-01
+_pow_L6   =  2.06975017800338417784e-01
+_pow_P1   =  1.66666666666666019037e-01
+_pow_P2   = -2.77777777770155933842e-03
+_pow_P3   =  6.61375632143793436117e-05
+_pow_P4   = -1.65339022054652515390e-06
+_pow_P5   =  4.13813679705723846039e-08
+_pow_lg2   =  6.93147180559945286227e-01
+_pow_lg2_h =  6.93147182464599609375e-01
+_pow_lg2_l = -1.90465429995776804525e-09
+_pow_cp    =  9.61796693925975554329e-01
+_pow_cp_h  =  9.61796700954437255859e-01
+_pow_cp_l  = -7.02846165095275826516e-09
+
+_low_word_mask = np.int64(0xFFFFFFFF)
+
+def _high_word(x):
+    return x.view(np.int64) >> 32
+
+def _low_word(x):
+    return x.view(np.int64) & _low_word_mask
+
+def _from_words(high, low=0):
+    return ((high << 32) | low).view(np.float64)
+
+def _clear_low_word(x):
+    return (x.view(np.int64) & ~_low_word_mask).view(np.float64)
+
+'''
+js_pow
+
+Math.pow(), on arrays, to the bit.  Compound interest is shown with all its
+digits, and V8's pow (a port of fdlibm's) differs from the C library's (and
+NumPy's) in the last bit about 1 time in 10, so this is that port, done on
+whole arrays with the same steps.  Only x > 0 and |y| < 2^31 with normal
+results (all the calculations need) take that path; anything else is
+np.power().
+'''
+def js_pow(x, y):
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64),
+                               np.asarray(y, dtype=np.float64))
+    x = np.ascontiguousarray(x)
+    y = np.ascontiguousarray(y)
+
+    with np.errstate(all='ignore'):
+        # Split x into 2^n * ax, with ax within [sqrt(2)/2, sqrt(2)), and
+        # take log2(ax) as t1 + t2 (extra precise).
+        ix = _high_word(x)
+        n  = (ix >> 20) - 0x3ff
+        j  = ix & 0x000fffff
+        ix = j | 0x3ff00000
+        k  = ((j > 0x3988E) & (j < 0xBB67A)).astype(np.int64)
+        wrap = j >= 0xBB67A
+        n  = n + wrap
+        ix = ix - wrap * 0x00100000
+        ax = _from_words(ix, _low_word(x))
+
+        bp  = _pow_bp[k]
+        u   = ax - bp
+        v   = 1.0 / (ax + bp)
+        ss  = u * v
+        s_h = _clear_low_word(ss)
+        t_h = _from_words(((ix >> 1) | 0x20000000) + 0x00080000 + (k << 18))
+        t_l = ax - (t_h - bp)
+        s_l = v * ((u - s_h * t_h) - s_h * t_l)
+
+        s2 = ss * ss
+        r  = s2 * s2 * (_pow_L1 + s2 * (_pow_L2 + s2 * (_pow_L3 + s2 * (
+            _pow_L4 + s2 * (_pow_L5 + s2 * _pow_L6)))))
+        r  = r + s_l * (s_h + ss)
+        s2  = s_h * s_h
+        t_h = _clear_low_word(3.0 + s2 + r)
+        t_l = r - ((t_h - 3.0) - s2)
+
+        u   = s_h * t_h
+        v   = s_l * t_h + t_l * ss
+        p_h = _clear_low_word(u + v)
+        p_l = v - (p_h - u)
+        z_h = _pow_cp_h * p_h
+        z_l = _pow_cp_l * p_h + p_l * _pow_cp + _pow_dp_l[k]
+
+        t  = n.astype(np.float64)
+        t1 = _clear_low_word(((z_h + z_l) + _pow_dp_h[k]) + t)
+        t2 = z_l - (((t1 - t) - _pow_dp_h[k]) - z_h)
+
+        # y * log2(x) = p_h + p_l
+        y1  = _clear_low_word(y)
+        p_l = (y - y1) * t1 + y * t2
+        p_h = y1 * t1
+        z   = p_l + p_h
+
+        # 2^(p_h + p_l) = 2^n * 2^(rest)
+        j = _high_word(z)
+        i = j & 0x7fffffff
+        k = (i >> 20) - 0x3ff
+        rounds = i > 0x3fe00000
+        m = j + (0x00100000 >> np.clip(k + 1, 0, 31))
+        k = np.clip(((m & 0x7fffffff) >> 20) - 0x3ff, 0, 20)
+        t = _from_words(m & ~(0x000fffff >> k))
+        m = ((m & 0x000fffff) | 0x00100000) >> (20 - k)
+        n   = np.where(rounds, np.where(j < 0, -m, m), 0)
+        p_h = np.where(rounds, p_h - t, p_h)
+
+        t  = _clear_low_word(p_l + p_h)
+        u  = t * _pow_lg2_h
+        v  = (p_l - (t - p_h)) * _pow_lg2 + t * _pow_lg2_l
+        z  = u + v
+        w  = v - (z - u)
+        t  = z * z
+        t1 = z - t * (_pow_P1 + t * (_pow_P2 + t * (_pow_P3 + t * (
+            _pow_P4 + t * _pow_P5))))
+        # V8 divides by all of (t1 - 2) - (w + z * w), where fdlibm only
+        # divides by t1 - 2.
+        r  = (z * t1) / ((t1 - 2.0) - (w + z * w))
+        z  = 1.0 - (r - z)
+        high = _high_word(z) + (n << 20)
+        result = _from_words(high, _low_word(z))
+
+        # Outside of the range above, and the special cases
+        general = ((x > 0) & (x < np.inf) & (_high_word(x) >= 0x00100000) &
+                   (np.abs(y) < 2.0 ** 31) & (i < 0x4090cc00) &
+                   (j < 0x40900000) & ((high >> 20) > 0))
+        result = np.where(general, result, np.power(x, y))
+        result = np.where(y == 0.5, np.sqrt(x), result)
+        result = np.where(y == 2, x * x, result)
+        result = np.where(y == -1, 1.0 / x, result)
+        result = np.where(y == 1, x, result)
+        result = np.where((x == 1) | (y == 0), 1.0, result)
+
+    return result if result.ndim > 0 else result[()]
+
+'''
+js_number_to_string
+
+A number the way JavaScript's String(number) (and `${number}`) shows it:
+shortest digits that round trip (same as Python's repr()), but no ".0" on
+whole numbers, and exponents only below 1e-6 or from 1e21.
+'''
+def js_number_to_string(x):
+    x = float(x)
+    if x != x:
+        return 'NaN'
+    if x == 0:
+        return '0'
+    if x in (float('inf'), float('-inf')):
+        return 'Infinity' if x > 0 else '-Infinity'
+
+    sign = '-' if x < 0 else ''
+    mantissa, _, exponent = repr(abs(x)).partition('e')
+    whole, _, fraction = mantissa.partition('.')
+    if fraction == '0':
+        fraction = ''
+    digits = (whole + fraction).lstrip('0')
+
+    # abs(x) = 0.<digits> * 10^n
+    n = (len(whole) if whole != '0' else
+         -(len(fraction) - len(fraction.lstrip('0')))) + int(exponent or 0)
+    digits = digits.rstrip('0')
+    k = len(digits)
+
+    if k <= n <= 21:
+        return sign + digits + '0' * (n - k)
+    if 0 < n <= 21:
+        return sign + digits[:n] + '.' + digits[n:]
+    if -6 < n <= 0:
+        return sign + '0.' + '0' * -n + digits
+    return '{0}{1}{2}e{3}{4}'.format(sign, digits[0],
+                                     '.' + digits[1:] if k > 1 else '',
+                                     '+' if n > 0 else '-', abs(n - 1))
+
+'''
+js_to_fixed
+
+Number.prototype.toFixed(2): the nearest 2 decimal place value, same as
+Python's formatting, except that exact halves (only possible for multiples
+of 1/8, like 0.125) go up in magnitude, and -0 has no sign.
+'''
+def js_to_fixed(x):
+    x = float(x)
+    if x == 0:
+        return '0.00'
+    if x != x or abs(x) == float('inf'):
+        return js_number_to_string(x)
+
+    text = '{0:.2f}'.format(x)
+    eighths = abs(x) * 8
+    if eighths == int(eighths) and int(eighths) % 2 == 1:
+        cents = (int(eighths) * 100 + 4) // 8
+        text = '{0}{1}.{2:02d}'.format('-' if x < 0 else '', cents // 100,
+                                       cents % 100)
+    return text
+
+'''
+js_to_fixed_list
+
+js_to_fixed() of each value in an array, as a list of strings.  Python does
+the formatting, and only the values it would get wrong (ties, 0, NaN) go
+through js_to_fixed().
+'''
+def js_to_fixed_list(values):
+    values = np.asarray(values, dtype=np.float64).ravel()
+    text = [ '{0:.2f}'.format(value) for value in values.tolist() ]
+
+    eighths = np.abs(values) * 8
+    with np.errstate(invalid='ignore'):
+        special = ((values == 0) | ~np.isfinite(values) |
+                   ((eighths == np.floor(eighths)) &
+                    (np.fmod(eighths, 2.0) == 1)))
+    for index in np.flatnonzero(special):
+        text[index] = js_to_fixed(values[index])
+    return text
+
+'''
+parse_date
+
+Parse an M/D/YYYY (the page's format) or YYYY/M/D date.
+'''
+def parse_date(text):
+    match = re.fullmatch(r'\s*(\d{1,2})/(\d{1,2})/(\d{4})\s*', text)
+    if match:
+        month, day, year = (int(part) for part in match.groups())
+        return datetime.date(year, month, day)
+
+    match = re.fullmatch(r'\s*(\d{4})/(\d{1,2})/(\d{1,2})\s*', text)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+        return datetime.date(year, month, day)
+
+    raise ValueError('Not a M/D/YYYY date: "{0}"'.format(text))
+
+'''
+format_date
+
+Date.toLocaleDateString() for en-US: M/D/YYYY.
+'''
+def format_date(date):
+    return '{0}/{1}/{2}'.format(date.month, date.day, date.year)
+
+'''
+add_months
+
+Date.setMonth(getMonth() + months), as PaymentDetail uses it: days past the
+end of the new month carry over into the next one (ex. Jan 31 + 1 month is
+Mar 3), unlike the page's addMonths().
+'''
+def add_months(date, months):
+    year, month = divmod(date.month - 1 + months, 12)
+    return (datetime.date(date.year + year, month + 1, 1) +
+            datetime.timedelta(days=date.day - 1))
+
+'''
+months_between
+
+calculateMonthsBetweenTwoDates from the page.
+'''
+def months_between(date1, date2):
+    return ((date2.year - date1.year) * 12 - (date1.month - 1) +
+            (date2.month - 1))
+
+'''
+parse_mortgage_details_entry
+
+Parse the lines of a Mortgage Details Entry (as on the page: an optional
+header, then Date, LoanAmount, InterestRate, TermsInMonths per line, -1 for
+the ones to calculate) into calculate_mortgage_details() arguments:
+(date, loan amount, interest rate, terms, adjustments).
+'''
+def parse_mortgage_details_entry(lines, delimiter):
+    lines = list(lines)
+    if len(lines) > 0 and re.search(
+            r'date|loanAmount|InterestRate|TermsInMonths', lines[0],
+            re.IGNORECASE):
+        lines = lines[1:]
+
+    entries = []
+    for line in lines:
+        fields = line.rstrip('\r\n').split(delimiter)
+        if len(fields) <= 1:
+            continue
+        if len(fields) < 4:
+            raise ValueError('DATA ERROR: expected {0} fields: "{1}"'.format(
+                len(header_mortgage_details_entry), line.rstrip()))
+        entries.append((parse_date(fields[0]), float(fields[1]),
+                        float(fields[2]), int(float(fields[3]))))
+
+    if len(entries) == 0 or entries[0][1] < 0:
+        raise ValueError('DATA ERROR: Need to have a valid loan amount for at '
+                         'least the first entry')
+
+    date, loan_amount, interest_rate, terms = entries[0]
+    adjustments = [ (entry_date, rate, amount if amount >= 0 else None,
+                     entry_terms)
+                    for entry_date, amount, rate, entry_terms in entries[1:] ]
+    return date, loan_amount, interest_rate, terms, adjustments
+
+'''
+get_mortgage_details
+
+The MortgageDetail class, for arrays of loan amounts, interest rates and
+terms (anything that broadcasts together).  Returns a dict of arrays.
+'''
+def get_mortgage_details(date, loan_amounts, interest_rates, terms):
+    loan_amounts, interest_rates, terms = np.broadcast_arrays(
+        np.asarray(loan_amounts, dtype=np.float64),
+        np.asarray(interest_rates, dtype=np.float64),
+        np.asarray(terms, dtype=np.int64))
+
+    # A 0% rate makes the payment NaN, as on the page.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monthly_rate       = js_round(interest_rates / 1200, 9)
+        compound_interest  = js_pow(1 + monthly_rate,
+                                    terms.astype(np.float64))
+        payment_multiplier = ((monthly_rate * compound_interest) /
+                              (compound_interest - 1))
+
+    return { 'date'               : date,
+             'loan_amount'        : loan_amounts,
+             'interest_rate'      : interest_rates,
+             'terms'              : terms,
+             'monthly_rate'       : monthly_rate,
+             'compound_interest'  : compound_interest,
+             'payment_multiplier' : payment_multiplier,
+             'monthly_payment'    : js_round(loan_amounts * payment_multiplier,
+                                             2) }
+
+'''
+future_value_after_num_periods
+
+futureValueAfterNumPeriods from the page: the balance left after
+num_periods payments of the details (from get_mortgage_details()).  Note
+that it uses the unrounded monthly rate.
+'''
+def future_value_after_num_periods(details, num_periods):
+    monthly_rate = details['interest_rate'] / 1200.0
+    growth = js_pow(1.0 + monthly_rate, float(num_periods))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return js_round((details['loan_amount'] * growth) -
+                        ((details['monthly_payment'] / monthly_rate) *
+                         (growth - 1)), 2)
+
+'''
+calculate_mortgage_details
+
+GenerateMortgageDetailsCalculated from the page, for a batch: the details
+of the loan (loan_amounts, interest_rates and terms broadcast together, one
+element per scenario), then one more for each of the adjustments.
+
+adjustments is a list of (date, interest rates, loan amounts, terms), ex.
+ARM rate changes.  As on the page, a loan amount < 0 (or None) means it and
+the terms are calculated from the previous details: what's left of the loan
+after the months between the two dates, and the rest of the term.
+
+Each details dict also gets 'start', the index of the first payment it
+applies to (None if the schedule never gets to it).  That has to be the same
+for every scenario in the batch, or ValueError is raised.
+'''
+def calculate_mortgage_details(date, loan_amounts, interest_rates, terms,
+                               adjustments=()):
+    details_list = [ get_mortgage_details(date, loan_amounts, interest_rates,
+                                          terms) ]
+    details_list[0]['start'] = 0
+
+    for adjustment_date, rates, amounts, adjustment_terms in adjustments:
+        previous = details_list[-1]
+
+        if amounts is None or np.all(np.asarray(amounts) < 0):
+            num_months = months_between(previous['date'], adjustment_date)
+            amounts = future_value_after_num_periods(previous, num_months)
+            adjustment_terms = previous['terms'] - num_months
+
+        details = get_mortgage_details(adjustment_date, amounts, rates,
+                                       adjustment_terms)
+
+        # GeneratePaymentSchedule moves on to the next details once the terms
+        # left match its TermsInMonths, so details with as many (or more)
+        # terms than the previous ones are never used.
+        num_months = np.unique(previous['terms'] - details['terms'])
+        if len(num_months) != 1:
+            raise ValueError('DATA ERROR: the details for {0} must start the '
+                             'same number of payments after the previous ones '
+                             'for every loan'.format(
+                                 format_date(adjustment_date)))
+        if previous['start'] == None or num_months[0] <= 0:
+            details['start'] = None
+        else:
+            details['start'] = previous['start'] + int(num_months[0])
+
+        details_list.append(details)
+
+    return details_list
+
+'''
+generate_payment_schedule
+
+GeneratePaymentSchedule from the page, for a batch of S scenarios from
+calculate_mortgage_details().  Returns a dict of:
+o 'num_payments': the number of payments of each scenario (S)
+o 'term', 'statement_date', 'payment_date': per month (N, the longest term)
+o 'interest_rate', 'beginning_balance', 'payment', 'principal', 'interest',
+  'cumulative_principal', 'cumulative_interest', 'cumulative_paid',
+  'ending_balance': S x N arrays.  Months after a scenario's last payment
+  are 0.
+'''
+def generate_payment_schedule(details_list):
+    num_payments = details_list[0]['terms'].ravel()
+    num_scenarios = len(num_payments)
+    num_months = int(num_payments.max()) if num_scenarios > 0 else 0
+
+    schedule = { name : np.zeros((num_scenarios, num_months))
+                 for name in ('interest_rate', 'beginning_balance', 'payment',
+                              'principal', 'interest', 'ending_balance') }
+    statement_dates = [None] * num_months
+    payment_dates   = [None] * num_months
+
+    details_list = [ details for details in details_list
+                     if details['start'] != None ]
+    for index, details in enumerate(details_list):
+        start = details['start']
+        if start >= num_months:
+            break
+        end = (min(details_list[index + 1]['start'], num_months)
+               if index + 1 < len(details_list) else num_months)
+
+        month_in_term = np.arange(1, end - start + 1)
+
+        monthly_rate    = details['monthly_rate'].reshape(-1, 1)
+        monthly_payment = details['monthly_payment'].reshape(-1, 1)
+        growth = js_pow(1 + monthly_rate,
+                        (month_in_term - 1).astype(np.float64))
+
+        principal_at_previous_month = js_round(
+            details['loan_amount'].reshape(-1, 1) * growth, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            future_value_at_previous_month = js_round(
+                monthly_payment * ((growth - 1) / monthly_rate), 2)
+
+        beginning = js_round(principal_at_previous_month -
+                             future_value_at_previous_month, 2)
+        interest  = js_round(beginning * monthly_rate, 2)
+        principal = js_round(monthly_payment - interest, 2)
+
+        columns = slice(start, end)
+        schedule['interest_rate'][:, columns]     = \
+            details['interest_rate'].reshape(-1, 1)
+        schedule['beginning_balance'][:, columns] = beginning
+        schedule['payment'][:, columns]           = monthly_payment
+        schedule['interest'][:, columns]          = interest
+        schedule['principal'][:, columns]         = principal
+        schedule['ending_balance'][:, columns]    = js_round(beginning -
+                                                             principal, 2)
+
+        for month in month_in_term:
+            statement_date = add_months(details['date'], int(month))
+            statement_dates[start + month - 1] = statement_date
+            payment_dates[start + month - 1] = add_months(statement_date, 1)
+
+    # Clear the months after each scenario's last payment, so they don't
+    # count in the cumulative columns.
+    in_term = np.arange(num_months) < num_payments.reshape(-1, 1)
+    for name in schedule:
+        schedule[name] = np.where(in_term, schedule[name], 0.0)
+
+    schedule['cumulative_principal'] = np.cumsum(
+        js_round(schedule['principal'], 2), axis=1)
+    schedule['cumulative_interest']  = np.cumsum(
+        js_round(schedule['interest'], 2), axis=1)
+    schedule['cumulative_paid']      = np.cumsum(
+        js_round(schedule['payment'], 2), axis=1)
+
+    # The final payment covers whatever is left (or over paid).
+    last = (np.arange(num_scenarios), num_payments - 1)
+    remainder = np.where(schedule['ending_balance'][last] != 0,
+                         schedule['ending_balance'][last], 0.0)
+    for name in ('payment', 'principal', 'cumulative_principal',
+                 'cumulative_paid'):
+        schedule[name][last] += remainder
+    schedule['ending_balance'][last] = 0.0
+
+    schedule['num_payments']   = num_payments
+    schedule['term']           = np.arange(1, num_months + 1)
+    schedule['statement_date'] = statement_dates
+    schedule['payment_date']   = payment_dates
+
+    return schedule
+
+'''
+get_summary
+
+Per scenario totals from a schedule: the first monthly payment, total
+interest and total paid, and the date of the last payment.
+'''
+def get_summary(schedule):
+    last = (np.arange(len(schedule['num_payments'])),
+            schedule['num_payments'] - 1)
+    return { 'monthly_payment' : schedule['payment'][:, 0],
+             'total_interest'  : js_round(schedule['cumulative_interest'][last],
+                                          2),
+             'total_paid'      : js_round(schedule['cumulative_paid'][last],
+                                          2),
+             'payoff_date'     : [ schedule['payment_date'][n - 1]
+                                   for n in schedule['num_payments'] ] }
+
+'''
+format_mortgage_details
+
+Lines of the page's Mortgage Details Calculated textarea for scenario s of
+the details_list (header first).
+'''
+def format_mortgage_details(details_list, s, delimiter):
+    lines = [ delimiter.join(header_mortgage_details_calculated) ]
+    for details in details_list:
+        lines.append(delimiter.join([
+            format_date(details['date']),
+            js_to_fixed(details['loan_amount'].flat[s]),
+            js_number_to_string(details['interest_rate'].flat[s]),
+            str(int(details['terms'].flat[s])),
+            js_number_to_string(details['monthly_rate'].flat[s]),
+            js_number_to_string(details['compound_interest'].flat[s]),
+            js_number_to_string(details['payment_multiplier'].flat[s]),
+            js_to_fixed(details['monthly_payment'].flat[s]) ]))
+    return lines
+
+'''
+format_payment_schedule
+
+Lines of the page's Payment Schedule textarea for scenario s of the
+schedule (no header).  prefix is put in front of each line, ex. a scenario
+number and delimiter.
+'''
+def format_payment_schedule(schedule, s, delimiter, prefix=''):
+    num_payments = int(schedule['num_payments'][s])
+
+    dates = [ (format_date(statement_date), format_date(payment_date))
+              for statement_date, payment_date
+              in zip(schedule['statement_date'][:num_payments],
+                     schedule['payment_date'][:num_payments]) ]
+
+    interest_rates = {}
+    for rate in np.unique(js_round(schedule['interest_rate'][s,
+                                                             :num_payments],
+                                   3)):
+        interest_rates[rate] = js_number_to_string(rate)
+    interest_rate = [ interest_rates[rate] for rate in
+                      js_round(schedule['interest_rate'][s, :num_payments],
+                               3).tolist() ]
+
+    columns = [ js_to_fixed_list(schedule[name][s, :num_payments])
+                for name in ('beginning_balance', 'payment', 'principal',
+                             'interest') ]
+    columns += [ js_to_fixed_list(js_round(schedule[name][s, :num_payments],
+                                           2))
+                 for name in ('cumulative_principal', 'cumulative_interest',
+                              'cumulative_paid', 'ending_balance') ]
+
+    lines = []
+    for month in range(num_payments):
+        lines.append(prefix + delimiter.join(
+            [ str(month + 1), dates[month][0], dates[month][1],
+              interest_rate[month] ] +
+            [ column[month] for column in columns ]))
+    return lines
@@ -0,0 +1,785 @@
+'''
+--------------------------------------------------------------------------------
+MIT License
+
+Copyright (c) 2023 Jim Moore
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+--------------------------------------------------------------------------------
+
+Mortgage Payments (Python)
+
+Batch counterpart of MortgagePayments.html, for running thousands of loan
+scenarios (loan amounts x interest rates x terms) instead of one at a time in
+the browser.  The calculations are the page's own (see amortization.py),
+including its rounding, so every number matches what the page shows for the
+same Mortgage Details Entry, to the cent.
+
+Scenarios come from either:
+o A Mortgage Details Entry file (-e), exactly as typed into the page (ARM
+  rate changes as "-1" lines), for one loan
+o A grid (-l, -r, -t), every combination of the loan amounts, interest rates
+  and terms, starting on --date, with any ARM rate changes (-a) applied to
+  all of them
+
+The schedules of a batch of scenarios (-b/--batch-size) are computed at once
+as NumPy arrays, and written out as:
+o Delimited text (-o schedule.txt), the page's Payment Schedule columns with
+  the page's CSV or TAB delimiter (-d), plus a Scenario column
+o Columnar arrays (-o schedule.npz), one S x N array per column (S
+  scenarios, N months), for analysis with NumPy
+o Parquet (-o schedule.parquet), one row per scenario and month, if pyarrow
+  is installed
+
+A summary (-s), one line per scenario with the monthly payment, total
+interest, total paid and payoff date, and the Mortgage Details Calculated
+of each scenario (--details-output), can be written too.
+
+For one loan, extra payment strategies can be compared too: every
+combination of monthly extra amounts (-x), lump sums (--lump-sums, after one
+of the --lump-sum-months) and recasts (--recast-months) is evaluated (see
+strategies.py), on a pool of processes (-j), and the Pareto front of
+interest saved vs cash outlay written out (--strategies).
+
+Needs numpy.
+
+Usage:
+    python mortgagepayments.py [-h] [-e DETAILS_FILE] [-l LOAN_AMOUNTS]
+                               [-r INTEREST_RATES] [-t TERMS] [--date DATE]
+                               [-a DATE RATE] [-d {CSV,TAB}] [-o OUTPUT_FILE]
+                               [-s SUMMARY_FILE]
+                               [--details-output DETAILS_OUTPUT_FILE]
+                               [-b BATCH_SIZE] [-x EXTRA_MONTHLY]
+                               [--lump-sums LUMP_SUMS]
+                               [--lump-sum-months LUMP_SUM_MONTHS]
+                               [--recast-months RECAST_MONTHS]
+                               [--method {closed-form,schedule}]
+                               [--strategies STRATEGIES_FILE]
+                               [--all-strategies ALL_STRATEGIES_FILE]
+                               [-j JOBS]
+
+Mortgage Payments
+
+options:
+  -h, --help            show this help message and exit
+  -e DETAILS_FILE, --details-file DETAILS_FILE
+                        Mortgage Details Entry file, in the page's format:
+                        Date, LoanAmount, InterestRate, TermsInMonths per line
+                        (with -d delimiters), "-1" for the ones to calculate.
+  -l LOAN_AMOUNTS, --loan-amounts LOAN_AMOUNTS
+                        Comma separated loan amounts, or START:STOP:STEP
+                        ranges (STOP included). Ex: "250000,300000" or
+                        "100000:500000:25000"
+  -r INTEREST_RATES, --interest-rates INTEREST_RATES
+                        Comma separated interest rates (percent), or
+                        START:STOP:STEP ranges. Ex: "5.5:7.5:0.125"
+  -t TERMS, --terms TERMS
+                        Comma separated terms in months, or START:STOP:STEP
+                        ranges. Default is 360.
+  --date DATE           Date of the loans in the grid (M/D/YYYY). Default is
+                        today.
+  -a DATE RATE, --adjustment DATE RATE
+                        ARM interest rate change for the grid: on DATE
+                        (M/D/YYYY) the rate becomes RATE, for whatever is left
+                        of the loan. Can be given more than once.
+  -d {CSV,TAB}, --delimiter {CSV,TAB}
+                        Field delimiter of the text input and output, as on
+                        the page.
+  -o OUTPUT_FILE, --output-file OUTPUT_FILE
+                        Payment schedules output file. .npz or .parquet for
+                        columnar output, anything else for delimited text.
+  -s SUMMARY_FILE, --summary SUMMARY_FILE
+                        Output file for one (delimited) line per scenario:
+                        monthly payment, total interest, total paid, payoff
+                        date.
+  --details-output DETAILS_OUTPUT_FILE
+                        Output file for the Mortgage Details Calculated of
+                        each scenario (delimited).
+  -b BATCH_SIZE, --batch-size BATCH_SIZE
+                        Number of scenarios computed at once (and strategies
+                        per process, with -j).
+  -x EXTRA_MONTHLY, --extra-monthly EXTRA_MONTHLY
+                        Extra payment strategies: comma separated amounts paid
+                        on top of every monthly payment, or START:STOP:STEP
+                        ranges. Ex: "0:1000:50"
+  --lump-sums LUMP_SUMS
+                        Extra payment strategies: comma separated lump sums,
+                        or START:STOP:STEP ranges, each paid after one of the
+                        --lump-sum-months.
+  --lump-sum-months LUMP_SUM_MONTHS
+                        Comma separated months (payment numbers), or
+                        START:STOP:STEP ranges, the --lump-sums can be paid
+                        after. Default is 12.
+  --recast-months RECAST_MONTHS
+                        Extra payment strategies: comma separated months, or
+                        START:STOP:STEP ranges, after which the loan is recast
+                        (the payment recalculated for the balance left).
+  --method {closed-form,schedule}
+                        How strategies are evaluated: closed-form (future
+                        value math, fastest) or schedule (month by month,
+                        interest rounded to cents). Default is closed-form.
+  --strategies STRATEGIES_FILE
+                        Output file for the Pareto front of the strategies:
+                        the ones that save the most interest for their cash
+                        outlay (delimited). Default is the console.
+  --all-strategies ALL_STRATEGIES_FILE
+                        Output file for every strategy evaluated (delimited).
+  -j JOBS, --jobs JOBS  Number of processes evaluating strategies. Default is
+                        the number of CPUs.
+
+Examples:
+    Same as the page's default entry (7/1/2013, 260000 at 3.125% for 360
+    months, then 5.125%, 7.125% and 8.125% from 2023 on):
+
+        python mortgagepayments.py -e Details.txt -o Schedule.txt
+
+    Every loan from 100k to 1M in 10k steps, at 4% to 8% in 1/8ths, for 15
+    and 30 years (2,666 scenarios):
+
+        python mortgagepayments.py -l 100000:1000000:10000 -r 4:8:0.125 \\
+            -t 180,360 --date 1/1/2025 -s Summary.csv -d CSV -o Schedules.npz
+
+    Extra payments on the page's default entry: 0 to 1000 a month in 25s,
+    lump sums up to 50k after any year, and recasts after 5, 10 or 15 years
+    (47,724 strategies):
+
+        python mortgagepayments.py -e Details.txt -x 0:1000:25 \\
+            --lump-sums 0:50000:5000 --lump-sum-months 12:348:12 \\
+            --recast-months 60,120,180 --strategies Front.txt
+
+Columnar output:
+    The .npz file has an S x N array for each of the page's schedule columns
+    (term, interest_rate, beginning_balance, payment, principal, interest,
+    cumulative_principal, cumulative_interest, cumulative_paid,
+    ending_balance), 0 after a scenario's last payment, plus per scenario
+    loan_amount, initial_interest_rate, terms_in_months, num_payments,
+    monthly_payment, and per month (datetime64) statement_date and
+    payment_date:
+
+        data = numpy.load('Schedules.npz')
+        data['cumulative_interest'][:, 59]  # Interest paid in 5 years
+'''
+
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+import itertools
+import os
+import sys
+
+import numpy as np
+
+# Page calculations, on NumPy arrays
+import amortization
+
+# Extra payment strategies
+import strategies
+
+# Global options object, produced by argparse.ArgumentParser.parse_args()
+options = None
+
+# Schedule column names in the .npz/.parquet output, in the page's order
+schedule_columns = ['interest_rate', 'beginning_balance', 'payment',
+                    'principal', 'interest', 'cumulative_principal',
+                    'cumulative_interest', 'cumulative_paid',
+                    'ending_balance']
+
+header_summary = ['Scenario', 'LoanAmount', 'InterestRate', 'TermsInMonths',
+                  'MonthlyPayment', 'TotalInterest', 'TotalPaid',
+                  'PayoffDate']
+
+'''
+parse_values
+
+Parse a comma separated list of numbers and START:STOP:STEP ranges (STOP
+included, if the steps land on it).  Decimal steps are counted in whole
+steps, so 4:8:0.125 doesn't drift.
+'''
+def parse_values(text, value_type=float):
+    values = []
+    for item in text.split(','):
+        item = item.strip()
+        if len(item) == 0:
+            continue
+        parts = item.split(':')
+        if len(parts) == 1:
+            values.append(value_type(parts[0]))
+        elif len(parts) == 3:
+            start, stop, step = (float(part) for part in parts)
+            if step <= 0:
+                raise ValueError('Step must be > 0: "{0}"'.format(item))
+            num_steps = int(round((stop - start) / step, 9)) + 1
+            values += [ value_type(round(start + i * step, 9))
+                        for i in range(max(num_steps, 0)) ]
+        else:
+            raise ValueError('Not a number or START:STOP:STEP: "{0}"'.format(
+                item))
+    return values
+
+'''
+get_scenario_batches
+
+Yield (loan amounts, interest rates, terms) arrays of up to batch_size
+scenarios, every combination of the given values, in order.
+'''
+def get_scenario_batches(loan_amounts, interest_rates, terms, batch_size):
+    combinations = itertools.product(loan_amounts, interest_rates, terms)
+    while True:
+        batch = list(itertools.islice(combinations, batch_size))
+        if len(batch) == 0:
+            return
+        yield tuple(np.array(column) for column in zip(*batch))
+
+'''
+read_details_file
+
+Read a Mortgage Details Entry file (one loan, maybe with ARM changes).
+Returns calculate_mortgage_details() arguments.
+'''
+def read_details_file(file_name):
+    with open(file_name, 'r', encoding='utf-8-sig') as f:
+        return amortization.parse_mortgage_details_entry(
+            f.readlines(), amortization.delimiters[options.delimiter])
+
+'''
+write_schedule_text
+
+Write a batch's payment schedules, as the page's Payment Schedule with a
+Scenario column in front.
+'''
+def write_schedule_text(f, schedule, first_scenario):
+    delimiter = amortization.delimiters[options.delimiter]
+    for s in range(len(schedule['num_payments'])):
+        prefix = '{0}{1}'.format(first_scenario + s + 1, delimiter)
+        f.write('\n'.join(amortization.format_payment_schedule(
+            schedule, s, delimiter, prefix)))
+        f.write('\n')
+
+'''
+write_details_text
+
+Write the Mortgage Details Calculated of each scenario in a batch, with a
+Scenario column in front.
+'''
+def write_details_text(f, details_list, first_scenario):
+    delimiter = amortization.delimiters[options.delimiter]
+    for s in range(len(details_list[0]['terms'])):
+        for line in amortization.format_mortgage_details(details_list, s,
+                                                         delimiter)[1:]:
+            f.write('{0}{1}{2}\n'.format(first_scenario + s + 1, delimiter,
+                                         line))
+
+'''
+write_summary_text
+
+Write a line per scenario of a batch: what it is, and what it costs.
+'''
+def write_summary_text(f, details_list, schedule, first_scenario):
+    delimiter = amortization.delimiters[options.delimiter]
+    details = details_list[0]
+    summary = amortization.get_summary(schedule)
+
+    columns = [ [ str(first_scenario + s + 1)
+                  for s in range(len(details['terms'])) ],
+                amortization.js_to_fixed_list(details['loan_amount']),
+                [ amortization.js_number_to_string(rate)
+                  for rate in details['interest_rate'].tolist() ],
+                [ str(terms) for terms in details['terms'].tolist() ],
+                amortization.js_to_fixed_list(summary['monthly_payment']),
+                amortization.js_to_fixed_list(summary['total_interest']),
+                amortization.js_to_fixed_list(summary['total_paid']),
+                [ amortization.format_date(payoff_date)
+                  for payoff_date in summary['payoff_date'] ] ]
+
+    for fields in zip(*columns):
+        f.write(delimiter.join(fields) + '\n')
+
+'''
+get_columns
+
+A batch's schedules as the .npz columns (S x num_months arrays, padded with
+0 after the longest term in the batch).
+'''
+def get_columns(details_list, schedule, num_months):
+    padding = ((0, 0), (0, num_months - len(schedule['term'])))
+    columns = { name : np.pad(schedule[name], padding)
+                for name in schedule_columns }
+    columns['term'] = np.where(
+        np.arange(num_months) < schedule['num_payments'].reshape(-1, 1),
+        np.arange(1, num_months + 1), 0)
+
+    details = details_list[0]
+    columns['loan_amount']           = details['loan_amount']
+    columns['initial_interest_rate'] = details['interest_rate']
+    columns['terms_in_months']       = details['terms']
+    columns['num_payments']          = schedule['num_payments']
+    columns['monthly_payment']       = details['monthly_payment']
+    return columns
+
+'''
+write_columns
+
+Write the columns of all the batches as .npz (S x N arrays) or .parquet
+(one row per scenario and month, needs pyarrow).  dates is the
+(statement_date, payment_date) of each month.
+'''
+def write_columns(file_name, batches, dates):
+    columns = { name : np.concatenate([ batch[name] for batch in batches ])
+                for name in batches[0] }
+    statement_dates = np.array([ statement_date
+                                 for statement_date, payment_date in dates ],
+                               dtype='datetime64[D]')
+    payment_dates = np.array([ payment_date
+                               for statement_date, payment_date in dates ],
+                             dtype='datetime64[D]')
+
+    if os.path.splitext(file_name)[1].lower() != '.parquet':
+        np.savez(file_name, statement_date=statement_dates,
+                 payment_date=payment_dates, **columns)
+        return
+
+    import pyarrow
+    import pyarrow.parquet
+
+    num_scenarios, num_months = columns['term'].shape
+    in_term = columns['term'] > 0
+    rows = np.nonzero(in_term)
+    table = { 'scenario'       : rows[0] + 1,
+              'term'           : columns['term'][in_term],
+              'statement_date' : statement_dates[rows[1]],
+              'payment_date'   : payment_dates[rows[1]] }
+    for name in schedule_columns:
+        table[name] = columns[name][in_term]
+    pyarrow.parquet.write_table(pyarrow.table(table), file_name)
+
+'''
+get_grid
+
+The grid of scenarios from -l, -r, -t, --date and -a: (date, loan amounts,
+interest rates, terms, adjustments).
+'''
+def get_grid():
+    loan_date = (amortization.parse_date(options.date)
+                 if len(options.date) > 0 else date.today())
+    adjustments = [ (amortization.parse_date(adjustment_date), float(rate),
+                     None, None)
+                    for adjustment_date, rate in options.adjustments ]
+
+    return (loan_date, parse_values(options.loan_amounts),
+            parse_values(options.interest_rates),
+            parse_values(options.terms, int), adjustments)
+
+'''
+is_optimizing
+
+Whether any extra payment strategies were asked for.
+'''
+def is_optimizing():
+    return (len(options.extra_monthly) > 0 or len(options.lump_sums) > 0 or
+            len(options.recast_months) > 0)
+
+'''
+evaluate_strategies
+
+Evaluate the candidates on the base loan, split into -b/--batch-size chunks
+on a pool of -j/--jobs processes (in this process if it's just one).
+'''
+def evaluate_strategies(base, candidates):
+    num_candidates = len(candidates['extra_monthly'])
+    num_chunks = max(1, -(-num_candidates // options.batch_size))
+    chunks = strategies.split_candidates(candidates, num_chunks)
+
+    # Not worth starting processes for a single chunk.
+    if len(chunks) == 1 or options.jobs == 1:
+        return strategies.concatenate_results(
+            [ strategies.evaluate_strategies(base, chunk, options.method)
+              for chunk in chunks ])
+
+    with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+        results = [ executor.submit(strategies.evaluate_strategies, base,
+                                    chunk, options.method)
+                    for chunk in chunks ]
+        return strategies.concatenate_results([ result.result()
+                                                for result in results ])
+
+'''
+optimize_strategies
+
+Evaluate every extra payment strategy (-x, --lump-sums, --lump-sum-months,
+--recast-months) on the one loan in details_list, and write the Pareto front
+of interest saved vs cash outlay (and all of them, with --all-strategies).
+payment_dates is the payment date of each month of the loan's schedule.
+'''
+def optimize_strategies(details_list, payment_dates):
+    delimiter = amortization.delimiters[options.delimiter]
+
+    base = strategies.get_base_loan(details_list)
+    candidates = strategies.get_candidates(
+        parse_values(options.extra_monthly),
+        parse_values(options.lump_sums),
+        parse_values(options.lump_sum_months, int),
+        parse_values(options.recast_months, int))
+    strategies.check_candidates(base, candidates)
+    num_candidates = len(candidates['extra_monthly'])
+    output_string('{0} strategies ({1})'.format(num_candidates,
+                                                options.method))
+
+    results = evaluate_strategies(base, candidates)
+
+    # The first candidate is the loan without extra payments.
+    baseline_interest = results['total_interest'][0]
+    interest_saved = baseline_interest - results['total_interest']
+    front = strategies.get_pareto_front(interest_saved,
+                                        results['cash_outlay'])
+    output_string('Total interest without extra payments: {0}'.format(
+        amortization.js_to_fixed(baseline_interest)))
+    output_string('{0} strategies on the Pareto front'.format(len(front)))
+
+    header = delimiter.join(strategies.header_strategies)
+    lines = strategies.format_strategies(results, front, baseline_interest,
+                                         payment_dates, delimiter)
+    if len(options.strategies_file) > 0:
+        with open(options.strategies_file, 'w', newline='') as f:
+            f.write('\n'.join([header] + lines) + '\n')
+        output_string('Pareto front written to {0}'.format(
+            options.strategies_file))
+    else:
+        print('\n'.join([header] + lines))
+
+    if len(options.all_strategies_file) > 0:
+        with open(options.all_strategies_file, 'w', newline='') as f:
+            f.write(header + '\n')
+            for start in range(0, num_candidates, options.batch_size):
+                indexes = range(start, min(start + options.batch_size,
+                                           num_candidates))
+                f.write('\n'.join(strategies.format_strategies(
+                    results, indexes, baseline_interest, payment_dates,
+                    delimiter)) + '\n')
+        output_string('All strategies written to {0}'.format(
+            options.all_strategies_file))
+
+def output_string(str):
+    print("{0} {1}".format("[{:%Y-%m-%d %H:%M:%S}]".format(datetime.now()),
+                           str))
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Mortgage Payments')
+
+    parser.add_argument('-e','--details-file',
+        required = False,
+        dest     = 'details_file',
+        default  = '',
+        help     = ('Mortgage Details Entry file, in the page\'s format: Date, '
+                    'LoanAmount, InterestRate, TermsInMonths per line (with '
+                    '-d delimiters), "-1" for the ones to calculate.')
+    )
+
+    parser.add_argument('-l','--loan-amounts',
+        required = False,
+        dest     = 'loan_amounts',
+        default  = '',
+        help     = ('Comma separated loan amounts, or START:STOP:STEP ranges '
+                    '(STOP included). Ex: "250000,300000" or '
+                    '"100000:500000:25000"')
+    )
+
+    parser.add_argument('-r','--interest-rates',
+        required = False,
+        dest     = 'interest_rates',
+        default  = '',
+        help     = ('Comma separated interest rates (percent), or '
+                    'START:STOP:STEP ranges. Ex: "5.5:7.5:0.125"')
+    )
+
+    parser.add_argument('-t','--terms',
+        required = False,
+        dest     = 'terms',
+        default  = '360',
+        help     = ('Comma separated terms in months, or START:STOP:STEP '
+                    'ranges. Default is 360.')
+    )
+
+    parser.add_argument('--date',
+        required = False,
+        dest     = 'date',
+        default  = '',
+        help     = ('Date of the loans in the grid (M/D/YYYY). Default is '
+                    'today.')
+    )
+
+    parser.add_argument('-a','--adjustment',
+        required = False,
+        dest     = 'adjustments',
+        nargs    = 2,
+        action   = 'append',
+        default  = [],
+        metavar  = ('DATE', 'RATE'),
+        help     = ('ARM interest rate change for the grid: on DATE (M/D/YYYY) '
+                    'the rate becomes RATE, for whatever is left of the loan. '
+                    'Can be given more than once.')
+    )
+
+    parser.add_argument('-d','--delimiter',
+        required = False,
+        dest     = 'delimiter',
+        choices  = ['CSV', 'TAB'],
+        default  = 'TAB',
+        help     = ('Field delimiter of the text input and output, as on the '
+                    'page.')
+    )
+
+    parser.add_argument('-o','--output-file',
+        required = False,
+        dest     = 'output_file',
+        default  = '',
+        help     = ('Payment schedules output file. .npz or .parquet for '
+                    'columnar output, anything else for delimited text.')
+    )
+
+    parser.add_argument('-s','--summary',
+        required = False,
+        dest     = 'summary_file',
+        default  = '',
+        help     = ('Output file for one (delimited) line per scenario: '
+                    'monthly payment, total interest, total paid, payoff '
+                    'date.')
+    )
+
+    parser.add_argument('--details-output',
+        required = False,
+        dest     = 'details_output_file',
+        default  = '',
+        help     = ('Output file for the Mortgage Details Calculated of each '
+                    'scenario (delimited).')
+    )
+
+    parser.add_argument('-b','--batch-size',
+        required = False,
+        dest     = 'batch_size',
+        type     = int,
+        default  = 1000,
+        help     = ('Number of scenarios computed at once (and strategies per '
+                    'process, with -j).')
+    )
+
+    parser.add_argument('-x','--extra-monthly',
+        required = False,
+        dest     = 'extra_monthly',
+        default  = '',
+        help     = ('Extra payment strategies: comma separated amounts paid on '
+                    'top of every monthly payment, or START:STOP:STEP ranges. '
+                    'Ex: "0:1000:50"')
+    )
+
+    parser.add_argument('--lump-sums',
+        required = False,
+        dest     = 'lump_sums',
+        default  = '',
+        help     = ('Extra payment strategies: comma separated lump sums, or '
+                    'START:STOP:STEP ranges, each paid after one of the '
+                    '--lump-sum-months.')
+    )
+
+    parser.add_argument('--lump-sum-months',
+        required = False,
+        dest     = 'lump_sum_months',
+        default  = '12',
+        help     = ('Comma separated months (payment numbers), or '
+                    'START:STOP:STEP ranges, the --lump-sums can be paid '
+                    'after. Default is 12.')
+    )
+
+    parser.add_argument('--recast-months',
+        required = False,
+        dest     = 'recast_months',
+        default  = '',
+        help     = ('Extra payment strategies: comma separated months, or '
+                    'START:STOP:STEP ranges, after which the loan is recast '
+                    '(the payment recalculated for the balance left).')
+    )
+
+    parser.add_argument('--method',
+        required = False,
+        dest     = 'method',
+        choices  = strategies.methods,
+        default  = 'closed-form',
+        help     = ('How strategies are evaluated: closed-form (future value '
+                    'math, fastest) or schedule (month by month, interest '
+                    'rounded to cents). Default is closed-form.')
+    )
+
+    parser.add_argument('--strategies',
+        required = False,
+        dest     = 'strategies_file',
+        default  = '',
+        help     = ('Output file for the Pareto front of the strategies: '
+                    'the ones that save the most interest for their cash '
+                    'outlay (delimited). Default is the console.')
+    )
+
+    parser.add_argument('--all-strategies',
+        required = False,
+        dest     = 'all_strategies_file',
+        default  = '',
+        help     = ('Output file for every strategy evaluated (delimited).')
+    )
+
+    parser.add_argument('-j','--jobs',
+        required = False,
+        dest     = 'jobs',
+        type     = int,
+        default  = os.cpu_count(),
+        help     = ('Number of processes evaluating strategies. Default is '
+                    'the number of CPUs.')
+    )
+
+    args = parser.parse_args()
+
+    if (len(args.details_file) == 0) == (len(args.loan_amounts) == 0 or
+                                         len(args.interest_rates) == 0):
+        parser.error('Either -e/--details-file, or -l/--loan-amounts and '
+                     '-r/--interest-rates, are required')
+    if len(args.details_file) > 0 and len(args.adjustments) > 0:
+        parser.error('-a/--adjustment is for the grid; put ARM changes in the '
+                     '-e/--details-file')
+    if args.batch_size < 1:
+        parser.error('-b/--batch-size must be at least 1')
+    if args.jobs == None or args.jobs < 1:
+        args.jobs = 1
+
+    return args
+
+def main(options):
+    delimiter = amortization.delimiters[options.delimiter]
+
+    if len(options.details_file) > 0:
+        loan_date, loan_amount, interest_rate, terms, adjustments = \
+            read_details_file(options.details_file)
+        batches = [ (np.array([loan_amount]), np.array([interest_rate]),
+                     np.array([terms])) ]
+        num_scenarios = 1
+        num_months = terms
+    else:
+        loan_date, loan_amounts, interest_rates, terms, adjustments = \
+            get_grid()
+        batches = get_scenario_batches(loan_amounts, interest_rates, terms,
+                                       options.batch_size)
+        num_scenarios = len(loan_amounts) * len(interest_rates) * len(terms)
+        num_months = max(terms) if len(terms) > 0 else 0
+
+    if is_optimizing() and num_scenarios != 1:
+        raise ValueError('Extra payment strategies are for one loan: use -e, '
+                         'or a single -l, -r and -t value ({0} scenarios '
+                         'given)'.format(num_scenarios))
+
+    output_string('{0} scenarios, up to {1} payments each'.format(
+        num_scenarios, num_months))
+
+    extension = os.path.splitext(options.output_file)[1].lower()
+    columnar = extension in ('.npz', '.parquet')
+    if extension == '.parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Writing .parquet needs pyarrow (pip install '
+                             'pyarrow); use .npz instead')
+    files = {}
+    if len(options.output_file) > 0 and not columnar:
+        files['schedule'] = open(options.output_file, 'w', newline='')
+        files['schedule'].write(delimiter.join(
+            ['Scenario'] + amortization.header_payment_schedule) + '\n')
+    if len(options.summary_file) > 0:
+        files['summary'] = open(options.summary_file, 'w', newline='')
+        files['summary'].write(delimiter.join(header_summary) + '\n')
+    if len(options.details_output_file) > 0:
+        files['details'] = open(options.details_output_file, 'w', newline='')
+        files['details'].write(delimiter.join(
+            ['Scenario'] + amortization.header_mortgage_details_calculated) +
+            '\n')
+
+    column_batches = []
+    dates = []
+    first_scenario = 0
+    total_interest = 0.0
+    try:
+        for loan_amounts, interest_rates, terms in batches:
+            details_list = amortization.calculate_mortgage_details(
+                loan_date, loan_amounts, interest_rates, terms, adjustments)
+            schedule = amortization.generate_payment_schedule(details_list)
+
+            if 'schedule' in files:
+                write_schedule_text(files['schedule'], schedule,
+                                    first_scenario)
+            if 'summary' in files:
+                write_summary_text(files['summary'], details_list, schedule,
+                                   first_scenario)
+            if 'details' in files:
+                write_details_text(files['details'], details_list,
+                                   first_scenario)
+            if columnar:
+                column_batches.append(get_columns(details_list, schedule,
+                                                  num_months))
+                if len(schedule['term']) > len(dates):
+                    dates = list(zip(schedule['statement_date'],
+                                     schedule['payment_date']))
+
+            if is_optimizing():
+                optimize_strategies(details_list, schedule['payment_date'])
+
+            total_interest += float(np.sum(
+                amortization.get_summary(schedule)['total_interest']))
+            first_scenario += len(terms)
+    finally:
+        for f in files.values():
+            f.close()
+
+    if columnar and len(column_batches) > 0:
+        write_columns(options.output_file, column_batches, dates)
+
+    for name, file_name in (('Payment schedules', options.output_file),
+                            ('Summary', options.summary_file),
+                            ('Mortgage details',
+                             options.details_output_file)):
+        if len(file_name) > 0:
+            output_string('{0} written to {1}'.format(name, file_name))
+
+    if first_scenario > 0:
+        output_string('Average total interest: {0}'.format(
+            amortization.js_to_fixed(total_interest / first_scenario)))
+
+    return True
+
+
+if __name__ == "__main__":
+    options = parse_args()
+
+    start_time = datetime.now()
+    try:
+        succeeded = main(options)
+    except (OSError, ValueError) as e:
+        output_string('Error: {0}'.format(e))
+        succeeded = False
+    elapsed_time = datetime.now() - start_time
+
+    output_string("Elapsed time: {0}".format(elapsed_time))
+
+    if not succeeded:
+        sys.exit(1)
@@ -0,0 +1,435 @@
+'''
+Extra payment strategies
+
+What paying a loan off early costs, and what it saves, for a grid of
+strategies on one loan (the base loan, from calculate_mortgage_details()):
+o A monthly extra amount, paid with every payment
+o A lump sum, paid after a given month's payment
+o A recast after a given month: the payment is recalculated for what's left
+  of the loan over what's left of the term (the extra amount is still paid
+  on top)
+
+The page has no extra payments; what you'd do by hand there is type a new
+Mortgage Details Entry line for each what-if.  Here every strategy is a
+candidate, and for each one the total interest, payoff month, and cash
+outlay (the extra amounts and lump sums actually paid) are computed, then
+get_pareto_front() keeps the ones where saving more interest costs more
+cash.
+
+Two ways of computing them, both on NumPy arrays of candidates:
+o 'closed-form': between events (lump sum, recast, ARM rate change) the
+  payment and rate don't change, so the balance after n months is the
+  future value B*(1+r)^n - Q*((1+r)^n - 1)/r, and the month it reaches 0 is
+  ceil(log(Q / (Q - B*r)) / log(1+r)).  A few steps per candidate, whatever
+  the term.  The balance isn't rounded to cents on the way, so totals can
+  be a few cents off a statement's.
+o 'schedule': month by month, interest rounded to cents every month, as a
+  lender's statement (or the page) would.  One step per month, for all the
+  candidates at once.  Also used when a rate is 0%, where the closed form
+  divides by 0.
+
+ARM rate changes of the base loan recalculate the payment from the balance
+left, like a recast, since with extra payments that's no longer the page's
+futureValueAfterNumPeriods.
+
+evaluate_strategies() only gets (and returns) plain dicts of arrays, so the
+candidates can be split up and evaluated on a pool of processes.
+
+Needs numpy.
+'''
+
+import itertools
+
+import numpy as np
+
+# Page calculations
+import amortization
+
+# Columns of the strategies output
+header_strategies = ['Strategy', 'ExtraMonthly', 'LumpSum', 'LumpSumMonth',
+                     'RecastMonth', 'RecastPayment', 'TotalInterest',
+                     'InterestSaved', 'CashOutlay', 'TotalPaid',
+                     'PayoffMonths', 'PayoffDate']
+
+methods = ['closed-form', 'schedule']
+
+'''
+get_base_loan
+
+The loan the strategies are for, as a plain dict: scenario s of a
+details_list from calculate_mortgage_details() (the first details, and
+the ARM rate changes the schedule gets to).
+'''
+def get_base_loan(details_list, s=0):
+    details = details_list[0]
+    used = [ d for d in details_list
+             if d['start'] != None and d['start'] < int(details['terms'][s]) ]
+    starts = [ d['start'] for d in used ]
+    rates  = [ float(d['monthly_rate'][s]) for d in used ]
+
+    # The page's payment is NaN at 0%.
+    monthly_payment = float(details['monthly_payment'][s])
+    if not np.isfinite(monthly_payment):
+        monthly_payment = float(get_recast_payment(
+            details['loan_amount'][s], details['monthly_rate'][s],
+            details['terms'][s]))
+
+    return { 'loan_amount'     : float(details['loan_amount'][s]),
+             'terms'           : int(details['terms'][s]),
+             'monthly_payment' : monthly_payment,
+             'starts'          : starts,
+             'monthly_rates'   : rates }
+
+'''
+get_candidates
+
+Every combination of monthly extra amounts, lump sums (amount and month) and
+recast months, as a dict of arrays.  No extra amount, no lump sum and no
+recast (0) are always included, so the first candidate is the loan as it is.
+'''
+def get_candidates(extra_amounts, lump_sums, lump_sum_months, recast_months):
+    lumps = [ (0.0, 0) ]
+    lumps += [ (float(amount), int(month))
+               for amount, month in itertools.product(sorted(set(lump_sums)),
+                                                      sorted(set(
+                                                          lump_sum_months)))
+               if amount > 0 and month > 0 ]
+    recasts = sorted(set(int(month) for month in recast_months) | {0})
+
+    rows = [ (extra, amount, month, recast)
+             for extra in sorted(set(extra_amounts) | {0.0})
+             for amount, month in lumps
+             for recast in recasts ]
+    extra, amount, month, recast = zip(*rows)
+    return { 'extra_monthly'  : np.array(extra, dtype=np.float64),
+             'lump_sum'       : np.array(amount, dtype=np.float64),
+             'lump_sum_month' : np.array(month, dtype=np.int64),
+             'recast_month'   : np.array(recast, dtype=np.int64) }
+
+'''
+check_candidates
+
+Raise ValueError if a lump sum or recast month isn't within the loan (1 to
+terms - 1), or an amount is negative.
+'''
+def check_candidates(base, candidates):
+    last_month = base['terms'] - 1
+    for name in ('lump_sum_month', 'recast_month'):
+        months = candidates[name]
+        months = months[months != 0]
+        if len(months) > 0 and (months.min() < 1 or months.max() > last_month):
+            raise ValueError('{0} must be between 1 and {1} (the loan has {2} '
+                             'payments)'.format(name.replace('_', ' '),
+                                                last_month, base['terms']))
+    for name in ('extra_monthly', 'lump_sum'):
+        if np.any(candidates[name] < 0):
+            raise ValueError('{0} can\'t be negative'.format(
+                name.replace('_', ' ')))
+
+'''
+split_candidates
+
+Split the candidates into num_chunks dicts of arrays (for the pool).
+'''
+def split_candidates(candidates, num_chunks):
+    num_candidates = len(candidates['extra_monthly'])
+    bounds = np.linspace(0, num_candidates, num_chunks + 1).astype(np.int64)
+    return [ { name : values[start:end]
+               for name, values in candidates.items() }
+             for start, end in zip(bounds[:-1], bounds[1:]) if end > start ]
+
+'''
+get_recast_payment
+
+The payment that pays off balance over num_months at monthly_rate, rounded
+to cents (arrays).
+'''
+def get_recast_payment(balance, monthly_rate, num_months):
+    num_months = np.maximum(num_months, 1).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        payment = np.where(
+            monthly_rate == 0, balance / num_months,
+            balance * monthly_rate /
+            (1 - np.power(1 + monthly_rate, -num_months)))
+    return amortization.js_round(np.maximum(payment, 0.0), 2)
+
+'''
+get_monthly_rates
+
+The monthly rate of each month of the base loan (index 0 is month 1).
+'''
+def get_monthly_rates(base):
+    rates = np.empty(base['terms'])
+    for start, rate in zip(base['starts'], base['monthly_rates']):
+        rates[start:] = rate
+    return rates
+
+'''
+evaluate_closed_form
+
+evaluate_strategies() with the future value closed form: each candidate's
+events (its lump sum and recast months, the ARM rate changes, and the end
+of the term) are sorted, and the balance jumps from one to the next.
+'''
+def evaluate_closed_form(base, candidates):
+    terms = base['terms']
+    rates = get_monthly_rates(base)
+    num_candidates = len(candidates['extra_monthly'])
+
+    extra  = candidates['extra_monthly']
+    lump   = candidates['lump_sum']
+    lump_month   = np.where(lump > 0, candidates['lump_sum_month'], 0)
+    recast_month = candidates['recast_month']
+
+    arm_months = np.array([ start for start in base['starts'] if start > 0 ],
+                          dtype=np.int64)
+    events = np.column_stack(
+        [ np.where(lump_month > 0, lump_month, terms),
+          np.where(recast_month > 0, recast_month, terms) ] +
+        [ np.full(num_candidates, month) for month in arm_months ] +
+        [ np.full(num_candidates, terms) ])
+    events.sort(axis=1)
+
+    balance = np.full(num_candidates, base['loan_amount'])
+    payment = np.full(num_candidates, base['monthly_payment'])
+    month   = np.zeros(num_candidates, dtype=np.int64)
+    paid    = np.zeros(num_candidates)
+    outlay  = np.zeros(num_candidates)
+    payoff  = np.zeros(num_candidates, dtype=np.int64)
+    recast_payment = np.zeros(num_candidates)
+    lump_paid = np.zeros(num_candidates, dtype=bool)
+
+    for column in events.T:
+        active = (payoff == 0) & (column > month)
+        if np.any(active):
+            index = np.flatnonzero(active)
+            b  = balance[index]
+            r  = rates[month[index]]
+            g  = 1 + r
+            q  = payment[index] + extra[index]
+            n  = (column[index] - month[index]).astype(np.float64)
+
+            # Months until the balance is paid off at this rate and payment
+            with np.errstate(divide='ignore', invalid='ignore'):
+                months_left = np.where(
+                    q > b * r,
+                    np.ceil(np.log(q / (q - b * r)) / np.log1p(r) - 1e-9),
+                    np.inf)
+            months_left = np.maximum(months_left, 1.0)
+            paid_off = months_left <= n
+
+            # Paid off: all but the last payment in full, then the last one
+            # is what's left.
+            k = np.where(paid_off, months_left, n)
+            growth = np.power(g, k - 1)
+            before_last = b * growth - q * (growth - 1) / r
+            last = before_last * g
+            paid[index] += np.where(paid_off, q * (k - 1) + last, q * n)
+            outlay[index] += np.where(
+                paid_off,
+                extra[index] * (k - 1) +
+                np.clip(last - payment[index], 0.0, extra[index]),
+                extra[index] * n)
+
+            balance[index] = np.where(paid_off, 0.0,
+                                      last - q)
+            payoff[index] = np.where(paid_off,
+                                     month[index] + k.astype(np.int64), 0)
+            month[index] = column[index]
+
+        apply_events(base, rates, column, month, balance, payment, paid,
+                     outlay, payoff, lump, lump_month, lump_paid,
+                     recast_month, recast_payment, arm_months)
+
+    finish(terms, balance, paid, payoff)
+    return get_results(base, candidates, paid, outlay, payoff,
+                       recast_payment)
+
+'''
+evaluate_schedule
+
+evaluate_strategies() month by month, with each month's interest rounded to
+cents, for all the candidates at once.
+'''
+def evaluate_schedule(base, candidates):
+    terms = base['terms']
+    rates = get_monthly_rates(base)
+    num_candidates = len(candidates['extra_monthly'])
+
+    extra  = candidates['extra_monthly']
+    lump   = candidates['lump_sum']
+    lump_month   = np.where(lump > 0, candidates['lump_sum_month'], 0)
+    recast_month = candidates['recast_month']
+    arm_months = np.array([ start for start in base['starts'] if start > 0 ],
+                          dtype=np.int64)
+
+    balance = np.full(num_candidates, base['loan_amount'])
+    payment = np.full(num_candidates, base['monthly_payment'])
+    month   = np.zeros(num_candidates, dtype=np.int64)
+    paid    = np.zeros(num_candidates)
+    outlay  = np.zeros(num_candidates)
+    payoff  = np.zeros(num_candidates, dtype=np.int64)
+    recast_payment = np.zeros(num_candidates)
+    lump_paid = np.zeros(num_candidates, dtype=bool)
+
+    for m in range(1, terms):
+        active = payoff == 0
+        if not np.any(active):
+            break
+        due = amortization.js_round(
+            balance + amortization.js_round(balance * rates[m - 1], 2), 2)
+        this_payment = np.minimum(payment + extra, due)
+        paid    += np.where(active, this_payment, 0.0)
+        outlay  += np.where(active,
+                            np.clip(this_payment - payment, 0.0, extra), 0.0)
+        balance  = np.where(active,
+                            amortization.js_round(due - this_payment, 2),
+                            balance)
+        payoff   = np.where(active & (balance <= 0), m, payoff)
+        month[:] = m
+
+        apply_events(base, rates, np.full(num_candidates, m), month, balance,
+                     payment, paid, outlay, payoff, lump, lump_month,
+                     lump_paid, recast_month, recast_payment, arm_months)
+
+    # The last payment is whatever is left, as on the page.
+    active = payoff == 0
+    due = amortization.js_round(
+        balance + amortization.js_round(balance * rates[terms - 1], 2), 2)
+    paid += np.where(active, due, 0.0)
+    payoff = np.where(active, terms, payoff)
+
+    return get_results(base, candidates, paid, outlay, payoff,
+                       recast_payment)
+
+'''
+apply_events
+
+What happens after the payment of month (per candidate, where month ==
+event_month): the lump sum first (at most the balance), then a recast or
+ARM rate change recalculates the payment for the rest of the term.  Updates
+the arrays in place.
+'''
+def apply_events(base, rates, event_month, month, balance, payment, paid,
+                 outlay, payoff, lump, lump_month, lump_paid, recast_month,
+                 recast_payment, arm_months):
+    terms = base['terms']
+    at_event = (payoff == 0) & (month == event_month)
+
+    pay_lump = at_event & ~lump_paid & (lump_month == month)
+    if np.any(pay_lump):
+        amount = np.minimum(lump, balance)
+        paid[pay_lump]    += amount[pay_lump]
+        outlay[pay_lump]  += amount[pay_lump]
+        balance[pay_lump] -= amount[pay_lump]
+        lump_paid[pay_lump] = True
+        payoff[pay_lump & (balance <= 0.005)] = month[pay_lump &
+                                                      (balance <= 0.005)]
+        at_event &= payoff == 0
+
+    recast = at_event & ((recast_month == month) | np.isin(month,
+                                                           arm_months))
+    if np.any(recast):
+        index = np.flatnonzero(recast)
+        payment[index] = get_recast_payment(
+            balance[index], rates[np.minimum(month[index], terms - 1)],
+            terms - month[index])
+        by_request = recast_month[index] == month[index]
+        recast_payment[index[by_request]] = payment[index[by_request]]
+
+'''
+finish
+
+Closed form: whatever is left at the end of the term is paid with the last
+payment (or, if the payment was rounded up, comes off it), as on the page.
+'''
+def finish(terms, balance, paid, payoff):
+    active = payoff == 0
+    paid[active] += balance[active]
+    payoff[active] = terms
+
+'''
+get_results
+
+The per candidate results as a dict of arrays, totals rounded to cents.
+'''
+def get_results(base, candidates, paid, outlay, payoff, recast_payment):
+    results = dict(candidates)
+    results['total_paid']     = amortization.js_round(paid, 2)
+    results['total_interest'] = amortization.js_round(
+        paid - base['loan_amount'], 2)
+    results['cash_outlay']    = amortization.js_round(outlay, 2)
+    results['payoff_months']  = payoff
+    results['recast_payment'] = recast_payment
+    return results
+
+'''
+evaluate_strategies
+
+Total paid and interest, cash outlay, and payoff month of each of the
+candidates (from get_candidates()) on the base loan (from get_base_loan()),
+with either method.  The closed form falls back to the schedule if a rate
+is 0%.
+'''
+def evaluate_strategies(base, candidates, method='closed-form'):
+    if method == 'closed-form' and min(base['monthly_rates']) > 0:
+        return evaluate_closed_form(base, candidates)
+    return evaluate_schedule(base, candidates)
+
+'''
+concatenate_results
+
+Put the results of split up candidates back together, in order.
+'''
+def concatenate_results(results_list):
+    return { name : np.concatenate([ results[name]
+                                     for results in results_list ])
+             for name in results_list[0] }
+
+'''
+get_pareto_front
+
+Indexes of the candidates on the Pareto front of interest saved vs cash
+outlay: no other candidate saves at least as much for no more cash, and
+more for the same cash.  Sorted by cash outlay.
+'''
+def get_pareto_front(interest_saved, cash_outlay):
+    saved  = np.round(interest_saved, 2)
+    outlay = np.round(cash_outlay, 2)
+    order  = np.lexsort((-saved, outlay))
+
+    best_before = np.maximum.accumulate(
+        np.concatenate(([-np.inf], saved[order][:-1])))
+    return order[saved[order] > best_before]
+
+'''
+format_strategies
+
+Lines (without the header) of the strategies output for the candidates at
+indexes.  payment_dates is the payment date of each month of the base loan.
+'''
+def format_strategies(results, indexes, baseline_interest, payment_dates,
+                      delimiter):
+    lines = []
+    for i in indexes:
+        payoff_months = int(results['payoff_months'][i])
+        lump_sum = float(results['lump_sum'][i])
+        recast_month = int(results['recast_month'][i])
+        fields = [ str(i + 1),
+                   amortization.js_to_fixed(results['extra_monthly'][i]),
+                   amortization.js_to_fixed(lump_sum),
+                   str(int(results['lump_sum_month'][i])) if lump_sum > 0
+                   else '',
+                   str(recast_month) if recast_month > 0 else '',
+                   amortization.js_to_fixed(results['recast_payment'][i])
+                   if recast_month > 0 else '',
+                   amortization.js_to_fixed(results['total_interest'][i]),
+                   amortization.js_to_fixed(baseline_interest -
+                                            results['total_interest'][i]),
+                   amortization.js_to_fixed(results['cash_outlay'][i]),
+                   amortization.js_to_fixed(results['total_paid'][i]),
+                   str(payoff_months),
+                   amortization.format_date(payment_dates[payoff_months -
+                                                          1]) ]
+        lines.append(delimiter.join(fields))
+    return lines
@@ -0,0 +1,173 @@
+'''
+DuplicateFinderClass
+
+Finds duplicate media files in a list of MediaFileClass objects (ex. the same
+rip that ended up in two different folders), while reading as few bytes from
+disk as possible.
+
+Files are narrowed down in stages, and each stage only looks at the files that
+are still possible duplicates after the previous one:
+
+1) Same path: The same file listed more than once in a playlist.  Nothing
+   needs to be read.
+2) Size: Files can only be duplicates if they're the same size, and
+   MediaFileClass already knows file_size, so any file with a unique size is
+   dropped without reading anything.
+3) Partial hash: Within each group of same sized files, hash just the first
+   and last 64KiB of each.  Media files that differ almost always differ in
+   their headers/tags (start) or their index/tags (end).
+4) Full hash: Only files whose partial hashes still collide get hashed in
+   full.  Files small enough that the partial hash already covered the whole
+   file, skip this stage.
+
+Reading/hashing is done on a pool of threads, since most of the time is spent
+waiting on the disk.
+
+NOTE: Only byte-for-byte identical files are found.  A re-encoded copy of the
+      same track (different bit rate/format) has different bytes, and won't
+      be detected.
+'''
+
+import hashlib
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DuplicateFinderClass:
+
+    _partial_size = 64 * 1024   # Bytes hashed from the start and end of file
+    _block_size   = 1024 * 1024 # Read size used for full hashes
+
+    # Constructor
+    def __init__(self, max_workers=8):
+        self.max_workers  = max_workers
+        self.bytes_read   = 0
+        self.num_partial  = 0 # Files that needed a partial hash
+        self.num_full     = 0 # Files that needed a full hash
+
+    '''
+    Hash the first and last _partial_size bytes of the file (or the whole file
+    if it isn't bigger than both of those together).
+    '''
+    def get_partial_hash(self, file_name, file_size):
+        hasher = hashlib.blake2b()
+        bytes_read = 0
+
+        with open(file_name, 'rb') as f:
+            if file_size <= 2 * DuplicateFinderClass._partial_size:
+                data = f.read()
+                hasher.update(data)
+                bytes_read += len(data)
+            else:
+                data = f.read(DuplicateFinderClass._partial_size)
+                hasher.update(data)
+                bytes_read += len(data)
+
+                f.seek(-DuplicateFinderClass._partial_size, os.SEEK_END)
+                data = f.read(DuplicateFinderClass._partial_size)
+                hasher.update(data)
+                bytes_read += len(data)
+
+        return hasher.hexdigest(), bytes_read
+
+    def get_full_hash(self, file_name, file_size):
+        hasher = hashlib.blake2b()
+        bytes_read = 0
+
+        with open(file_name, 'rb') as f:
+            while True:
+                data = f.read(DuplicateFinderClass._block_size)
+                if not data:
+                    break
+                hasher.update(data)
+                bytes_read += len(data)
+
+        return hasher.hexdigest(), bytes_read
+
+    '''
+    Split each group into sub-groups of files with the same hash (from
+    hash_function), dropping any file that ends up on its own.
+    '''
+    def split_groups_by_hash(self, groups, hash_function, executor):
+        files = [file for group in groups for file in group]
+
+        def hash_file(file):
+            try:
+                return hash_function(file.file_name, file.file_size)
+            except OSError:
+                # Can't be read, so can't be compared.  Treated as unique.
+                return None, 0
+
+        # map() hands results back in the same order as files, so they can be
+        # matched back up with their group.
+        results = executor.map(hash_file, files)
+
+        split = {}
+        for group_index, group in enumerate(groups):
+            for file in group:
+                digest, bytes_read = next(results)
+                self.bytes_read += bytes_read
+                if digest != None:
+                    split.setdefault((group_index, digest), []).append(file)
+
+        return [group for group in split.values() if len(group) > 1]
+
+    '''
+    Find duplicates in the given list of MediaFileClass objects.
+
+    Returns a list of groups, each a list of 2 or more MediaFileClass objects
+    with identical contents.  Files within a group are in original playlist
+    order, so group[0] is the one to keep.  Each file is in at most one group:
+    a path listed more than once that also has a copy elsewhere is one group,
+    with every listing of both.
+    '''
+    def find_duplicates(self, media_files):
+        # Stage 1: Same path listed more than once.
+        by_path = {}
+        for file in media_files:
+            if file.file_size < 0:
+                continue
+            key = os.path.normcase(os.path.abspath(file.file_name))
+            by_path.setdefault(key, []).append(file)
+
+        # Only the first listing of each path is compared with other files,
+        # the rest join whatever group it ends up in.
+        unique_files = [group[0] for group in by_path.values()]
+        path_groups  = { id(group[0]) : group for group in by_path.values() }
+
+        # Stage 2: Group by size, ignoring sizes that only appear once.
+        by_size = {}
+        for file in unique_files:
+            by_size.setdefault(file.file_size, []).append(file)
+
+        groups = [group for group in by_size.values() if len(group) > 1]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Stage 3: First/last 64KiB.
+            self.num_partial = sum(len(group) for group in groups)
+            groups = self.split_groups_by_hash(groups, self.get_partial_hash,
+                                               executor)
+
+            # Stage 4: Full hash, but only for files bigger than what the
+            # partial hash already covered.
+            confirmed = [group for group in groups if group[0].file_size <=
+                         2 * DuplicateFinderClass._partial_size]
+            remaining = [group for group in groups if group[0].file_size >
+                         2 * DuplicateFinderClass._partial_size]
+
+            self.num_full = sum(len(group) for group in remaining)
+            confirmed += self.split_groups_by_hash(remaining,
+                                                   self.get_full_hash, executor)
+
+        duplicates = [ [ listing for file in group
+                         for listing in path_groups.pop(id(file)) ]
+                       for group in confirmed ]
+        duplicates += [ group for group in path_groups.values()
+                        if len(group) > 1 ]
+
+        for group in duplicates:
+            group.sort(key=lambda x: x.originalOrder)
+
+        duplicates.sort(key=lambda group: group[0].originalOrder)
+        return duplicates
@@ -0,0 +1,141 @@
+'''
+MediaCacheClass
+
+Simple persistent cache of media file metadata (length, bit rate, rating), so the
+expensive Shell.Application probe in MediaFileClass only has to happen once
+per file.
+
+Entries are keyed by the normalized full path of the media file, and each
+entry remembers the size and modification time the file had when it was
+probed.  If either of those no longer match, the entry is considered stale and
+the file gets probed again.
+
+The cache is stored as a JSON file:
+
+    {
+        "version": 2,
+        "files": {
+            "c:\\music\\files\\file1.wma": {
+                "size": 4181234,
+                "mtime": 1700000000000000000,
+                "length": "00:04:21",
+                "lengthMS": 261000,
+                "bit_rate": "128kbps",
+                "rating": 4
+            },
+            ...
+        }
+    }
+'''
+
+import json
+import os
+
+
+class MediaCacheClass:
+
+    _version = 2 # Bump this if the format of an entry changes.
+
+    # Constructor
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries    = {}
+        self.dirty      = False # True when entries changed since load/save
+        self.hits       = 0
+        self.misses     = 0
+
+    '''
+    Cache keys are the normalized full path, so "C:\\Music\\a.mp3" and
+    "c:/music/a.mp3" end up being the same entry on Windows.
+    '''
+    @staticmethod
+    def get_key(file_name):
+        return os.path.normcase(os.path.abspath(file_name))
+
+    '''
+    Read the cache file (if present).  A missing or unreadable cache file just
+    results in an empty cache, as everything in it can be re-probed.
+    '''
+    def load(self):
+        self.entries = {}
+        self.dirty   = False
+
+        if not os.path.isfile(self.cache_file):
+            return
+
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                contents = json.load(f)
+        except (OSError, ValueError) as err:
+            print("Unable to read media cache \"{0}\": {1}".
+                  format(self.cache_file, err))
+            return
+
+        if (contents.get('version') != MediaCacheClass._version):
+            print("Ignoring media cache \"{0}\" (unsupported version)".
+                  format(self.cache_file))
+            return
+
+        self.entries = contents.get('files', {})
+
+    '''
+    Write the cache file, if anything changed.
+
+    Written to a temp file first and then renamed over the old one, so an
+    interrupted save (Ctrl+C during watch mode) can't leave a truncated cache.
+    '''
+    def save(self):
+        if not self.dirty:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        os.makedirs(directory, exist_ok=True)
+
+        temp_file = "{0}.tmp".format(self.cache_file)
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({ 'version' : MediaCacheClass._version,
+                        'files'   : self.entries }, f)
+        os.replace(temp_file, self.cache_file)
+
+        self.dirty = False
+
+    '''
+    Return the cached entry for the file, if there is one and it is still
+    valid for the given size and mtime (in ns).  Otherwise None.
+    '''
+    def lookup(self, file_name, file_size, file_mtime):
+        entry = self.entries.get(MediaCacheClass.get_key(file_name))
+
+        if (entry and entry['size'] == file_size and
+            entry['mtime'] == file_mtime):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    def store(self, file_name, file_size, file_mtime, length, lengthMS,
+              bit_rate, rating=0):
+        self.entries[MediaCacheClass.get_key(file_name)] = {
+            'size'     : file_size,
+            'mtime'    : file_mtime,
+            'length'   : length,
+            'lengthMS' : lengthMS,
+            'bit_rate' : bit_rate,
+            'rating'   : rating
+        }
+        self.dirty = True
+
+    def remove(self, file_name):
+        if self.entries.pop(MediaCacheClass.get_key(file_name), None):
+            self.dirty = True
+
+    '''
+    True if the file at the given size/mtime is already known, without
+    counting it as a hit or miss.  Used by the watcher to decide what needs
+    probing.
+    '''
+    def is_current(self, file_name, file_size, file_mtime):
+        entry = self.entries.get(MediaCacheClass.get_key(file_name))
+        return bool(entry and entry['size'] == file_size and
+                    entry['mtime'] == file_mtime)
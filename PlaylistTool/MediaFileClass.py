@@ -27,20 +27,14 @@ COLUMNS:
 '''
 
 import os
-import win32com.client
-from bs4.formatter import HTMLFormatter
 import re
 
-'''
-Simple class to retain attribute ordering
+from playlistformats import PlaylistRecord, get_record_path
 
-From:
-https://www.crummy.com/software/BeautifulSoup/bs4/doc/#writing-your-own-formatter
-'''
-class UnsortedAttributes(HTMLFormatter):
-    def attributes(self, tag):
-        for k, v in tag.attrs.items():
-            yield k, v
+# NOTE: win32com.client is imported inside init_shell() rather than here.
+# Importing it is a large part of the start-up time, and isn't needed at all
+# for things like --help or runs where every file is already in the media
+# cache (see startupbench.py).
 
 class MediaFileClass:
 
@@ -48,42 +42,55 @@ class MediaFileClass:
     _columns            = []   # Static param shared across instances
     _length_col_index   = -1   # Index of the "Length" column.
     _bit_rate_col_index = -1   # Index of the "Bit Rate" column.
+    _rating_col_index   = -1   # Index of the "Rating" column.
     _sh                 = None # Shell.Application
     _index              = 0    # Each instance will get assigned _index++
+    _cache              = None # Optional MediaCacheClass of probed details
+    _ms_per_byte        = 0.062495 # Length estimate for files with no Length
+
+    # File extensions treated as media files when walking directories.
+    _media_extensions   = ('.mp3', '.wma', '.wav', '.m4a', '.aac', '.flac',
+                           '.ogg', '.mp4', '.wmv', '.avi', '.mkv', '.mov')
 
     # Constructor
+    # media_entry is a playlistformats.PlaylistRecord (src, cid, tid, duration,
+    # base_dir)
     def __init__(self, media_entry):
         self.file_size     = -1 # -1 == unknown size.
+        self.file_mtime    = 0  # Modification time (ns), used by the cache.
         self.length        = ""
         self.lengthMS      = 0
+        self.length_estimated = False # True if lengthMS came from file_size
         self.bit_rate      = ""
+        self.rating        = 0  # Stars (0-5), 0 == Unrated
+        self.play_count    = 0  # From --play-history, if given
+        self.last_played   = None # datetime, from --play-history, if given
         self.cid           = ""
         self.tid           = ""
-        self.media_elem    = media_entry
-        self.file_name     = self.media_elem['src']
+        self.file_name     = get_record_path(media_entry) # Relative src resolved
+        self.src           = media_entry.src      # As in the playlist
+        self.base_dir      = media_entry.base_dir # Playlist's directory
+        self.cid           = media_entry.cid
+        self.tid           = media_entry.tid
         self.bucket_number = -1 # -1 means not part of a bucket
 
-        if (self.media_elem.has_attr('cid')):
-            self.cid  = media_entry['cid']
-
-        if (self.media_elem.has_attr('tid')):
-            self.tid = media_entry['tid']
-
         # Original position in the playlist.
         self.originalOrder = MediaFileClass._index
         MediaFileClass._index += 1
 
-        MediaFileClass._sh = win32com.client.gencache.EnsureDispatch(
-            'Shell.Application', 0)
-
-        # If list of columns not yet created, do it now...
-        if (len(MediaFileClass._columns)==0):
-            self.get_list_of_metadata_columns()
-
         # verify the file exists, before trying to get any of the other details
         if (os.path.isfile(self.file_name)):
             self.get_file_size()
-            self.get_media_file_extra_details()
+
+            # If the playlist itself has the length (ex. M3U #EXTINF), there's
+            # no need to probe at all.  Otherwise, only go through
+            # Shell.Application if the cache doesn't already know about this
+            # exact version (size + mtime) of the file.
+            if (media_entry.duration != None and media_entry.duration > 0):
+                self.set_length_from_ms(media_entry.duration)
+            elif not self.get_details_from_cache():
+                self.get_media_file_extra_details()
+                self.store_details_in_cache()
         else:
             print("Bad file Found: {0}  Size:{1}".
                   format(self.file_name, self.file_size))
@@ -94,7 +101,8 @@ class MediaFileClass:
     Based on an answer from:
     https://stackoverflow.com/questions/12521525/reading-metadata-with-python
     '''
-    def get_list_of_metadata_columns(self):
+    @staticmethod
+    def get_list_of_metadata_columns():
 
         dir_name  = os.path.dirname(os.path.abspath(__name__))
 
@@ -116,6 +124,8 @@ class MediaFileClass:
                 MediaFileClass._length_col_index = colnum
             elif (colname == "Bit rate"):
                 MediaFileClass._bit_rate_col_index = colnum
+            elif (colname == "Rating"):
+                MediaFileClass._rating_col_index = colnum
 
             colnum += 1
 
@@ -124,6 +134,8 @@ class MediaFileClass:
     previous call to get_list_of_metadata_columns()
     '''
     def get_media_file_extra_details(self):
+        MediaFileClass.init_shell()
+
         dir_name  = os.path.dirname(self.file_name)
         base_name = os.path.basename(self.file_name)
 
@@ -141,6 +153,13 @@ class MediaFileClass:
         # Here we just throw it away
         self.bit_rate = bit_rate_val.strip('\u200e')
 
+        # Rating is a string like "4 Stars", "1 Star" or "Unrated"
+        if (MediaFileClass._rating_col_index >= 0):
+            rating_val = ns.GetDetailsOf(file, MediaFileClass._rating_col_index)
+            rating_match = re.match(r'\s*(\d)', rating_val.strip('\u200e'))
+            if rating_match:
+                self.rating = int(rating_match.group(1))
+
         # If a length was found, convert to milliseconds.
         # If not found, it will remain as 0
         if (len(self.length) > 0):
@@ -181,7 +200,8 @@ class MediaFileClass:
         # column, so I don't really care to solve this problem yet for the
         # more general case.
         if (self.lengthMS <= 0):
-            self.lengthMS = int(0.062495 * self.file_size)
+            self.lengthMS = int(MediaFileClass._ms_per_byte * self.file_size)
+            self.length_estimated = True
 
         # Just an FYI.  I've only found 1 file without this value
         # This routine might be too noisy, if OS version doesn't have a bitrate
@@ -190,21 +210,78 @@ class MediaFileClass:
             print( "!!!!! No Bit Rate for {0}".format(self.file_name))
 
     def get_file_size(self):
-        self.file_size = os.path.getsize(self.file_name)
-
-    # This function returns the media tag:
-    #     <media src="..." cid="..." tid="..."/> 
-    # for this media file, and will be used during main routine file writing.
-    # It uses the UnsortedAttributes() formatter, so that original order
-    # is retained SRC/CID/TID, which makes eye-balling the results easier
-    def to_media_element_string(self):
-        str = (
-            ( self.media_elem.encode(formatter=UnsortedAttributes()) )
-                .decode('UTF-8')
-        )
-        # Need to replace "&"" and then apostrophe("'").
-        # Do in this order, so "&apos" dosen't get nuked by the "&" replacement
-        str = re.sub(r"&", "&amp;", str)
-        str = re.sub(r"'", "&apos;", str)
-        return str
+        stat = os.stat(self.file_name)
+        self.file_size  = stat.st_size
+        self.file_mtime = stat.st_mtime_ns
+
+    '''
+    Shell.Application and the list of columns are only needed when a file
+    actually has to be probed, so they are created on first use rather than
+    for every instance.
+    '''
+    @staticmethod
+    def init_shell():
+        if MediaFileClass._sh == None:
+            import win32com.client
+            MediaFileClass._sh = win32com.client.gencache.EnsureDispatch(
+                'Shell.Application', 0)
 
+        # If list of columns not yet created, do it now...
+        if (len(MediaFileClass._columns)==0):
+            MediaFileClass.get_list_of_metadata_columns()
+
+    '''
+    Fill in length details from MediaFileClass._cache, if it has a valid
+    entry for this file.
+
+    Returns True if the details came from the cache.
+    '''
+    def get_details_from_cache(self):
+        if MediaFileClass._cache == None:
+            return False
+
+        entry = MediaFileClass._cache.lookup(self.file_name, self.file_size,
+                                             self.file_mtime)
+        if entry == None:
+            return False
+
+        self.length   = entry['length']
+        self.lengthMS = entry['lengthMS']
+        self.bit_rate = entry['bit_rate']
+        self.rating   = entry['rating']
+
+        # Estimated lengths are stored with a blank "Length", same as the
+        # probe left them.
+        self.length_estimated = (len(self.length) == 0 and self.lengthMS > 0)
+        return True
+
+    def store_details_in_cache(self):
+        if MediaFileClass._cache == None:
+            return
+
+        MediaFileClass._cache.store(self.file_name, self.file_size,
+                                    self.file_mtime, self.length,
+                                    self.lengthMS, self.bit_rate, self.rating)
+
+    '''
+    Use a length (in ms) that came from the playlist, and fill in the
+    "HH:MM:SS" form to match what Shell.Application would have given.
+    '''
+    def set_length_from_ms(self, length_ms):
+        self.lengthMS = int(length_ms)
+        seconds = self.lengthMS // 1000
+        self.length = "{0:02}:{1:02}:{2:02}".format(seconds // 3600,
+                                                    (seconds // 60) % 60,
+                                                    seconds % 60)
+
+    @staticmethod
+    def is_media_file(file_name):
+        return file_name.lower().endswith(MediaFileClass._media_extensions)
+
+    # Record for this media file, as used by the playlistformats writers.
+    # Duration is included, so formats that support it (M3U, XSPF, ZPL) get
+    # the probed length.
+    def to_record(self):
+        return PlaylistRecord(self.src, self.cid, self.tid,
+                              self.lengthMS if self.file_size >= 0 else None,
+                              self.base_dir)
@@ -0,0 +1,112 @@
+'''
+MediaScannerClass
+
+Walks one or more media directory trees, and finds all the media files in
+them, so a playlist can be built straight from a library instead of needing an
+existing WPL file.
+
+A single threaded os.walk() spends most of its time waiting on the disk (or
+network, for a NAS), one directory at a time.  Instead, each directory is
+listed with os.scandir() on a small pool of threads, so many directory listings
+are in flight at once:
+o Scanning a directory returns the media files and the sub-directories in it
+o As each scan completes, its sub-directories are submitted back to the pool
+o Files are handed back to the caller as each directory completes, so probing
+  can start while the rest of the tree is still being walked
+
+Symbolic links (and junctions) to directories are followed, but each directory
+is only ever scanned once, based on its (device, inode) identity.  This
+prevents loops like "Music/Link -> Music" from scanning forever.
+'''
+
+import os
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class MediaScannerClass:
+
+    # Constructor
+    def __init__(self, extensions, max_workers=8, output=print):
+        self.extensions  = tuple(ext.lower() for ext in extensions)
+        self.max_workers = max_workers
+        self.output      = output
+        self.visited     = set() # (st_dev, st_ino) of directories scanned
+        self.num_dirs    = 0
+        self.num_files   = 0
+
+    '''
+    List a single directory.  Runs on a pool thread.
+
+    Returns (list of media file paths, list of sub-directory paths)
+    '''
+    def scan_directory(self, directory):
+        files   = []
+        subdirs = []
+
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry.path)
+                        elif (entry.name.lower().endswith(self.extensions) and
+                              entry.is_file()):
+                            files.append(entry.path)
+                    except OSError:
+                        # Broken link, or entry removed while scanning.
+                        continue
+        except OSError as err:
+            self.output("Unable to scan \"{0}\": {1}".format(directory, err))
+
+        # Keep results stable within a directory, even though directories
+        # themselves complete in whatever order the pool gets to them.
+        files.sort()
+        return files, subdirs
+
+    '''
+    True if the directory hasn't been seen yet (and marks it as seen).
+    Only called from the thread driving the scan, so no locking is needed.
+    '''
+    def first_visit(self, directory):
+        try:
+            stat = os.stat(directory)
+        except OSError as err:
+            self.output("Unable to scan \"{0}\": {1}".format(directory, err))
+            return False
+
+        identity = (stat.st_dev, stat.st_ino)
+        if identity in self.visited:
+            return False
+
+        self.visited.add(identity)
+        return True
+
+    '''
+    Generator that yields the full path of every media file found under the
+    given directories.
+    '''
+    def scan(self, directories):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+
+            for directory in directories:
+                if self.first_visit(directory):
+                    pending.add(executor.submit(self.scan_directory,
+                                                os.path.abspath(directory)))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    files, subdirs = future.result()
+                    self.num_dirs += 1
+
+                    for subdir in subdirs:
+                        if self.first_visit(subdir):
+                            pending.add(executor.submit(self.scan_directory,
+                                                        subdir))
+
+                    for file_name in files:
+                        self.num_files += 1
+                        yield file_name
@@ -0,0 +1,192 @@
+'''
+MediaWatcherClass
+
+Keeps the media metadata cache (MediaCacheClass) warm, by watching the
+directories that the files in a playlist live in, and probing any new or
+changed media files in the background.  The next interactive run of
+playlisttool.py then finds the lengths already in the cache, instead of paying
+for every Shell.Application probe at once.
+
+No OS specific change notification APIs are used.  Instead this is a simple
+polling stat walker:
+o Every poll interval, each watched directory is listed with os.scandir()
+o An index of path -> (mtime, size) is kept from the previous poll
+o Anything new, or with a different mtime/size, that the cache doesn't already
+  know about is queued for probing
+o Anything that disappeared is dropped from the index (and the cache)
+
+Probing goes through MediaFileClass, the same as a normal playlist run, but is
+rate limited (probes per second) so the watcher doesn't hog the disk or the
+Shell while other things are going on.  The cache is saved every
+save_interval seconds while there's a backlog of probes, and whenever the
+queue drains, so progress survives the watcher being stopped (Ctrl+C) or
+crashing part way through a long backlog.
+'''
+
+import os
+import time
+
+from collections import deque
+
+from MediaFileClass import MediaFileClass
+from playlistformats import PlaylistRecord
+
+
+class MediaWatcherClass:
+
+    # Constructor
+    def __init__(self, directories, cache, poll_interval=30.0, probe_rate=2.0,
+                 output=print, save_interval=60.0):
+        self.directories   = sorted(set(directories))
+        self.cache         = cache
+        self.poll_interval = poll_interval # Seconds between directory polls
+        self.probe_rate    = probe_rate    # Max probes per second
+        self.output        = output
+        self.mtime_index   = {}            # path -> (mtime_ns, size)
+        self.save_interval = save_interval # Max seconds between saves
+        self.probe_queue   = deque()       # paths waiting to be probed
+        self.queued        = set()         # fast "already queued?" check
+        self.probed        = 0
+
+    '''
+    Build the set of directories to watch from a list of media file names
+    (ex. the src of each <media> entry in a playlist).
+    '''
+    @staticmethod
+    def get_directories_from_files(file_names):
+        directories = set()
+        for file_name in file_names:
+            directories.add(os.path.dirname(os.path.abspath(file_name)))
+        return directories
+
+    '''
+    Stat every media file in the watched directories, and compare against the
+    index from the previous poll.
+
+    Returns the number of files queued for probing.
+    '''
+    def poll(self):
+        seen = set()
+        failed_directories = set()
+        num_queued = 0
+
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not MediaFileClass.is_media_file(entry.name):
+                            continue
+
+                        try:
+                            if not entry.is_file():
+                                continue
+
+                            stat = entry.stat()
+                        except OSError as err:
+                            # Still there (ex. locked, or permissions), keep
+                            # what we have for it and try again next poll.
+                            seen.add(entry.path)
+                            self.output("Unable to stat \"{0}\": {1}".format(
+                                entry.path, err))
+                            continue
+
+                        state = (stat.st_mtime_ns, stat.st_size)
+                        seen.add(entry.path)
+
+                        if self.mtime_index.get(entry.path) == state:
+                            continue
+
+                        self.mtime_index[entry.path] = state
+
+                        if (entry.path not in self.queued and
+                            not self.cache.is_current(entry.path, stat.st_size,
+                                                      stat.st_mtime_ns)):
+                            self.probe_queue.append(entry.path)
+                            self.queued.add(entry.path)
+                            num_queued += 1
+            except OSError as err:
+                # Directory may be on a drive that isn't currently mounted,
+                # just try again next poll.
+                self.output("Unable to scan \"{0}\": {1}".format(directory,
+                                                                  err))
+                failed_directories.add(os.path.normcase(directory))
+
+        # Anything no longer present has been moved or deleted.  The files of
+        # a directory that couldn't be (fully) scanned are unknown, not gone.
+        for path in list(self.mtime_index.keys()):
+            if (path not in seen and os.path.normcase(os.path.dirname(path))
+                not in failed_directories):
+                del self.mtime_index[path]
+                self.cache.remove(path)
+
+        return num_queued
+
+    '''
+    Probe the next queued file through MediaFileClass, which stores the
+    results into MediaFileClass._cache.
+    '''
+    def probe_next(self):
+        path = self.probe_queue.popleft()
+        self.queued.discard(path)
+
+        # File may have been changed/removed again since it was queued.
+        if not os.path.isfile(path):
+            return
+
+        media_file = MediaFileClass(PlaylistRecord(path))
+        self.probed += 1
+        self.output("Probed: {0} ({1}ms)".format(path, media_file.lengthMS))
+
+    '''
+    Main watch loop.  Runs until interrupted (or for max_polls polls, if
+    given, which is mainly useful for testing).
+    '''
+    def run(self, max_polls=0):
+        MediaFileClass._cache = self.cache
+
+        probe_delay = 1.0 / self.probe_rate if self.probe_rate > 0 else 0
+        next_poll   = 0
+        num_polls   = 0
+        next_save   = time.monotonic() + self.save_interval
+
+        self.output("Watching {0} directories (poll every {1}s, {2} probes/s)"
+                    .format(len(self.directories), self.poll_interval,
+                            self.probe_rate))
+        try:
+            while True:
+                now = time.monotonic()
+
+                if now >= next_poll:
+                    if max_polls > 0 and num_polls >= max_polls:
+                        break
+
+                    num_queued = self.poll()
+                    num_polls += 1
+                    next_poll = now + self.poll_interval
+
+                    if num_queued > 0:
+                        self.output("Queued {0} files for probing ({1} total)"
+                                    .format(num_queued, len(self.probe_queue)))
+
+                if len(self.probe_queue) > 0:
+                    self.probe_next()
+
+                    # Save every save_interval seconds during a long backlog
+                    # of probes (and when it's done), so they aren't lost if
+                    # the watcher is stopped or crashes.
+                    if (len(self.probe_queue) == 0 or
+                        time.monotonic() >= next_save):
+                        self.cache.save()
+                        next_save = time.monotonic() + self.save_interval
+
+                    time.sleep(probe_delay)
+                else:
+                    self.cache.save()
+                    time.sleep(max(0, next_poll - time.monotonic()))
+        except KeyboardInterrupt:
+            self.output("Watcher stopped")
+        finally:
+            self.cache.save()
+
+        self.output("Probed {0} files, cache has {1} entries".format(
+            self.probed, len(self.cache.entries)))
@@ -0,0 +1,295 @@
+'''
+Playlist Analysis
+
+Statistics about a list of MediaFileClass objects, for the --analyze option of
+playlisttool.py.  This replaces loading the -c/--csv output into Excel for the
+usual questions:
+o How are the lengths spread out (histogram, percentiles)?
+o After -d/--distribute-files, how even is the play time of each bucket?
+o Which directories make up most of the play time?
+o How far off is the 0.062495 ms/byte length estimate used for files that have
+  no "Length" (see MediaFileClass.get_media_file_extra_details())?
+
+Lengths, sizes, bit rates, bucket numbers and directories are pulled out of the
+media files once, into NumPy arrays (strings become integer codes), and
+everything else is computed on those arrays with bincount/reduceat/percentile
+rather than Python loops.  For 1M files the statistics themselves take a
+fraction of a second; most of the time is in reading the attributes off the
+MediaFileClass objects.
+
+numpy is only imported when analyze_media_files() is called, so it isn't
+needed (or imported) by anything else in playlisttool.py.
+
+The report is a dict, suitable for json.dump():
+
+    {
+        "num_files": 1510, "num_bad_files": 2, "total_ms": ..., "total_size": ...,
+        "length_histogram": [ { "from_ms": 0, "to_ms": 60000, "count": 12 }, ...],
+        "length_percentiles": { "p0": ..., "p50": ..., "p100": ... },
+        "bit_rate_kbps": { "count": ..., "mean": ..., "min": ..., "max": ... },
+        "buckets": [ { "bucket": 0, "count": 9, "sum_ms": ..., "min_ms": ...,
+                       "max_ms": ..., "std_ms": ... }, ... ],
+        "bucket_balance": { "mean_ms": ..., "std_ms": ..., "spread_ms": ... },
+        "directories": [ { "directory": "c:\\music\\rock", "count": 40,
+                           "total_ms": ..., "total_size": ... }, ... ],
+        "estimate_error": { "ms_per_byte": 0.062495, "num_estimated": 1,
+                            "num_probed": 1505, ... }
+    }
+'''
+
+import re
+
+from MediaFileClass import MediaFileClass
+
+# Upper edges (in minutes) of the length histogram bins.  The last bin is
+# everything longer.
+histogram_minutes = [1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 45, 60, 90, 120]
+
+percentiles = [0, 1, 5, 10, 25, 50, 75, 90, 95, 99, 100]
+
+'''
+get_bit_rate_kbps
+
+Shell.Application gives bit rates as strings like "128kbps", so just pull out
+the number.  Returns NaN if there isn't one.
+'''
+def get_bit_rate_kbps(bit_rate):
+    match = re.search(r'(\d+)', bit_rate)
+    if match:
+        return float(match.group(1))
+    return float('nan')
+
+'''
+get_codes
+
+Turn count values into an array of integer codes, one per value, along with
+the list of distinct values (in first seen order) that the codes index.  A
+dict lookup per value is a lot cheaper than np.unique() sorting 1M strings.
+'''
+def get_codes(np, values, count):
+    codes = {}
+    array = np.fromiter((codes.setdefault(value, len(codes))
+                         for value in values), np.int64, count)
+    return list(codes.keys()), array
+
+'''
+get_group_stats
+
+For each distinct value in keys, compute count, sum, min, max and std of the
+matching values.  Done by sorting once on key and then using reduceat() over
+the runs of equal keys, so it's O(n log n) with no Python loop per group.
+
+Returns (unique_keys, counts, sums, mins, maxs, stds) as arrays.
+'''
+def get_group_stats(np, keys, values):
+    order = np.argsort(keys, kind='stable')
+    sorted_keys   = keys[order]
+    sorted_values = values[order].astype(np.float64)
+
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_keys)])
+
+    sums  = np.add.reduceat(sorted_values, starts)
+    mins  = np.minimum.reduceat(sorted_values, starts)
+    maxs  = np.maximum.reduceat(sorted_values, starts)
+    means = sums / counts
+
+    # Sum of squared differences from each group's own mean.
+    deviations = sorted_values - np.repeat(means, counts)
+    stds = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+
+    return sorted_keys[starts], counts, sums, mins, maxs, stds
+
+'''
+analyze_media_files
+
+Build the report (see top of file) for the given list of MediaFileClass
+objects.  Bad files (file_size < 0) are only counted, and left out of
+everything else.
+'''
+def analyze_media_files(media_files):
+    import numpy as np
+
+    files = [file for file in media_files if file.file_size >= 0]
+    num_files = len(files)
+
+    report = { 'num_files'     : num_files,
+               'num_bad_files' : len(media_files) - num_files }
+
+    if num_files == 0:
+        return report
+
+    lengths   = np.fromiter((file.lengthMS for file in files), np.int64,
+                            num_files)
+    sizes     = np.fromiter((file.file_size for file in files), np.int64,
+                            num_files)
+    buckets   = np.fromiter((int(file.bucket_number) for file in files),
+                            np.int64, num_files)
+    estimated = np.fromiter((file.length_estimated for file in files),
+                            np.bool_, num_files)
+
+    # Bit rates and directories repeat a lot, so only the distinct values are
+    # parsed, and each file just gets an integer code for its value.  That
+    # also lets directories be grouped the same way as bucket numbers.
+    rate_names, rate_codes = get_codes(np,
+                                       (file.bit_rate for file in files),
+                                       num_files)
+    bit_rates = np.array([get_bit_rate_kbps(rate) for rate in rate_names],
+                         np.float64)[rate_codes]
+
+    # Playlists made on Windows use "\\" even when read elsewhere, so the
+    # separator is taken from the first file rather than os.sep.  Cheaper than
+    # os.path.dirname() for every file.
+    separator = '\\' if '\\' in files[0].file_name else '/'
+    directory_names, directories = get_codes(np,
+        (file.file_name.rpartition(separator)[0] for file in files), num_files)
+
+    report['total_ms']   = int(lengths.sum())
+    report['total_size'] = int(sizes.sum())
+
+    # Length histogram
+    edges = np.array([0] + [minutes * 60000 for minutes in histogram_minutes]
+                     + [max(int(lengths.max()) + 1,
+                            histogram_minutes[-1] * 60000 + 1)])
+    counts, edges = np.histogram(lengths, bins=edges)
+    report['length_histogram'] = [ { 'from_ms' : int(edges[i]),
+                                     'to_ms'   : int(edges[i + 1]),
+                                     'count'   : int(counts[i]) }
+                                   for i in range(len(counts)) ]
+
+    # Percentile table
+    values = np.percentile(lengths, percentiles)
+    report['length_percentiles'] = { 'p{0}'.format(p) : float(v)
+                                     for p, v in zip(percentiles, values) }
+
+    # Bit rates, for the files that have one.
+    known_bit_rates = bit_rates[~np.isnan(bit_rates)]
+    report['bit_rate_kbps'] = { 'count' : int(len(known_bit_rates)) }
+    if len(known_bit_rates) > 0:
+        report['bit_rate_kbps'].update({
+            'mean' : float(known_bit_rates.mean()),
+            'min'  : float(known_bit_rates.min()),
+            'max'  : float(known_bit_rates.max()) })
+
+    # Per bucket play time (only once -d/--distribute-files has run).
+    report['buckets'] = []
+    in_bucket = buckets >= 0
+    if in_bucket.any():
+        keys, counts, sums, mins, maxs, stds = get_group_stats(np,
+            buckets[in_bucket], lengths[in_bucket])
+        report['buckets'] = [ { 'bucket' : int(keys[i]),
+                                'count'  : int(counts[i]),
+                                'sum_ms' : int(sums[i]),
+                                'min_ms' : int(mins[i]),
+                                'max_ms' : int(maxs[i]),
+                                'std_ms' : float(stds[i]) }
+                              for i in range(len(keys)) ]
+        report['bucket_balance'] = { 'mean_ms'   : float(sums.mean()),
+                                     'std_ms'    : float(sums.std()),
+                                     'spread_ms' : int(sums.max() - sums.min()) }
+
+    # Per directory totals, most play time first.
+    total_ms   = np.bincount(directories, weights=lengths)
+    total_size = np.bincount(directories, weights=sizes)
+    counts     = np.bincount(directories)
+    order      = np.argsort(-total_ms, kind='stable')
+    report['directories'] = [ { 'directory'  : directory_names[i],
+                                'count'      : int(counts[i]),
+                                'total_ms'   : int(total_ms[i]),
+                                'total_size' : int(total_size[i]) }
+                              for i in order ]
+
+    # How good is the ms/byte estimate?  Check it against every file that did
+    # have a real length.
+    probed = ~estimated & (lengths > 0) & (sizes > 0)
+    report['estimate_error'] = { 'ms_per_byte'   : MediaFileClass._ms_per_byte,
+                                 'num_estimated' : int(estimated.sum()),
+                                 'num_probed'    : int(probed.sum()) }
+    if probed.any():
+        actual   = lengths[probed].astype(np.float64)
+        estimate = MediaFileClass._ms_per_byte * sizes[probed]
+        error    = np.abs(estimate - actual)
+        relative = error / actual * 100
+        report['estimate_error'].update({
+            'mean_abs_error_ms'   : float(error.mean()),
+            'median_error_pct'    : float(np.median(relative)),
+            'p90_error_pct'       : float(np.percentile(relative, 90)),
+            'max_error_pct'       : float(relative.max()),
+            'median_ms_per_byte'  : float(np.median(actual / sizes[probed])) })
+
+    return report
+
+'''
+format_ms
+
+Milliseconds as "H:MM:SS", for the summary.
+'''
+def format_ms(ms):
+    seconds = int(ms) // 1000
+    return "{0}:{1:02}:{2:02}".format(seconds // 3600, (seconds // 60) % 60,
+                                      seconds % 60)
+
+'''
+output_analysis
+
+Output a readable summary of the report through the output function (ex.
+playlisttool.output_string).  Only the top max_directories directories are
+shown, the JSON has all of them.
+'''
+def output_analysis(report, output=print, max_directories=10):
+    output('[=========== Playlist Analysis ===========]')
+    output('Files: {0}  Bad files: {1}'.format(report['num_files'],
+                                               report['num_bad_files']))
+    if report['num_files'] == 0:
+        return
+
+    output('Total length: {0}  Total size: {1:,} bytes'.format(
+        format_ms(report['total_ms']), report['total_size']))
+
+    output('Length histogram:')
+    for entry in report['length_histogram']:
+        output('  {0:>8} - {1:<8} {2:8}'.format(format_ms(entry['from_ms']),
+                                               format_ms(entry['to_ms']),
+                                               entry['count']))
+
+    output('Length percentiles:')
+    output('  ' + '  '.join('{0}={1}'.format(p, format_ms(v))
+                            for p, v in report['length_percentiles'].items()))
+
+    bit_rates = report['bit_rate_kbps']
+    if bit_rates['count'] > 0:
+        output('Bit rate (kbps): mean {0:.0f}  min {1:.0f}  max {2:.0f}  '
+               '({3} files)'.format(bit_rates['mean'], bit_rates['min'],
+                                    bit_rates['max'], bit_rates['count']))
+
+    if len(report['buckets']) > 0:
+        output('Buckets: {0}'.format(len(report['buckets'])))
+        output('  {0:>6} {1:>6} {2:>9} {3:>9} {4:>9} {5:>9}'.format(
+            'Bucket', 'Files', 'Total', 'Min', 'Max', 'Std Dev'))
+        for entry in report['buckets']:
+            output('  {0:>6} {1:>6} {2:>9} {3:>9} {4:>9} {5:>9}'.format(
+                entry['bucket'], entry['count'], format_ms(entry['sum_ms']),
+                format_ms(entry['min_ms']), format_ms(entry['max_ms']),
+                format_ms(entry['std_ms'])))
+        balance = report['bucket_balance']
+        output('  Bucket total: mean {0}  std dev {1}  max-min {2}'.format(
+            format_ms(balance['mean_ms']), format_ms(balance['std_ms']),
+            format_ms(balance['spread_ms'])))
+
+    output('Top directories (by length):')
+    for entry in report['directories'][:max_directories]:
+        output('  {0:>9} {1:>6} files  {2}'.format(format_ms(entry['total_ms']),
+                                                   entry['count'],
+                                                   entry['directory']))
+
+    error = report['estimate_error']
+    output('Length estimate ({0} ms/byte): {1} files estimated, checked '
+           'against {2} probed files'.format(error['ms_per_byte'],
+                                             error['num_estimated'],
+                                             error['num_probed']))
+    if error['num_probed'] > 0:
+        output('  mean abs error {0}  median {1:.1f}%  p90 {2:.1f}%  max '
+               '{3:.1f}%  (median actual ms/byte {4:.6f})'.format(
+               format_ms(error['mean_abs_error_ms']),
+               error['median_error_pct'], error['p90_error_pct'],
+               error['max_error_pct'], error['median_ms_per_byte']))
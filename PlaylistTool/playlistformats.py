@@ -0,0 +1,599 @@
+'''
+Playlist Formats
+
+Readers and writers for the playlist formats PlaylistTool understands, all
+built around one simple record per playlist entry:
+
+    PlaylistRecord(src, cid, tid, duration, base_dir)
+
+    src      : Path (or URL) of the media file, as it is in the playlist
+    cid, tid : WMP content/track GUIDs ("" if the format doesn't have them)
+    duration : Length in ms, if the playlist itself says (None if not known).
+               When known, MediaFileClass uses it instead of probing the file.
+    base_dir : Directory of the playlist the entry was read from, which a
+               relative src is relative to ("" if it's not from a playlist).
+               get_record_path() is the path to probe/compare the file by.
+
+Writers write src as it was read, unless the new playlist is in a different
+directory, in which case relative entries are rebased onto it (see
+get_output_src()).
+
+Supported formats:
+    .wpl        Windows Media Player playlist (SMIL/XML)
+    .zpl        Zune playlist (same SMIL/XML layout as WPL, with durations)
+    .m3u/.m3u8  Extended M3U (#EXTINF durations, #PLAYLIST title)
+    .xspf       XML Shareable Playlist Format
+
+Readers are generators, yielding one record at a time, and never hold more
+than the current entry in memory (XML is read with ElementTree.iterparse and
+each <media>/<track> element is discarded as soon as it's been turned into a
+record).  Writers consume any iterable of records, so converting between
+formats is a single streaming pass:
+
+    header, records = read_playlist("big.wpl")
+    write_playlist("big.m3u8", records, header)
+
+The playlist's title/author/meta details are collected into a PlaylistHeader
+as the file is read.  read_playlist() reads up to the first entry before
+returning, so the header is already filled in by then.
+
+New formats can be added with register_format().
+'''
+
+import itertools
+import ntpath
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+
+from collections import namedtuple
+from urllib.parse import quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+PlaylistRecord = namedtuple('PlaylistRecord', ['src', 'cid', 'tid', 'duration',
+                                               'base_dir'],
+                            defaults=('', '', None, ''))
+
+'''
+Title, author and any <meta name=".." content=".."/> details of a playlist.
+'''
+class PlaylistHeader:
+    def __init__(self, title="", author=""):
+        self.title  = title
+        self.author = author
+        self.meta   = [] # List of (name, content), in file order
+
+    def get_meta(self, name, default=None):
+        for meta_name, content in self.meta:
+            if meta_name.lower() == name.lower():
+                return content
+        return default
+
+    '''
+    Number of entries, from the ItemCount (WPL) or itemCount (ZPL) meta tag.
+    -1 if the playlist doesn't say.
+    '''
+    def get_item_count(self):
+        try:
+            return int(self.get_meta('ItemCount', -1))
+        except ValueError:
+            return -1
+
+# extension -> reader/writer function.  See register_format()
+readers = {}
+writers = {}
+
+def register_format(extensions, reader, writer):
+    for extension in extensions:
+        readers[extension] = reader
+        writers[extension] = writer
+
+def get_extension(file_name):
+    return os.path.splitext(file_name)[1].lower()
+
+def is_supported(file_name):
+    return get_extension(file_name) in readers
+
+'''
+read_playlist
+
+Open the playlist and return (PlaylistHeader, iterator of PlaylistRecords).
+'''
+def read_playlist(file_name):
+    extension = get_extension(file_name)
+    if extension not in readers:
+        raise ValueError('Unsupported playlist format "{0}" ({1})'.format(
+            extension, ', '.join(sorted(readers))))
+
+    header  = PlaylistHeader()
+    records = readers[extension](file_name, header)
+
+    # Read up to the first record, so the header has been read
+    first = next(records, None)
+    if first == None:
+        return header, iter(())
+
+    return header, itertools.chain([first], records)
+
+'''
+write_playlist
+
+Write the records out in the format given by the file's extension.
+
+item_count is needed by formats that have it in their header (WPL/ZPL).  If
+it's not known (records is a stream), the entries are spooled to a temp file
+first and counted on the way.
+
+The playlist is written to a temp file in the same directory, which replaces
+file_name once it's complete.  records may still be reading from file_name
+(ex. --convert of a playlist onto itself, or --merge into one of its inputs),
+so it can't be truncated until they're done, and a failed write leaves the
+old file as it was.
+'''
+def write_playlist(file_name, records, header, item_count=None):
+    extension = get_extension(file_name)
+    if extension not in writers:
+        raise ValueError('Unsupported playlist format "{0}" ({1})'.format(
+            extension, ', '.join(sorted(writers))))
+
+    temp_file = '{0}.{1}.tmp'.format(file_name, os.getpid())
+    try:
+        writers[extension](temp_file, records, header, item_count)
+        os.replace(temp_file, file_name)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+'''
+get_src_key
+
+Normalized form of an entry's src, used to spot the same file listed more than
+once.  Windows paths (drive letter, UNC or any backslash) are case-folded and
+get consistent separators, since "C:\\Music\\A.mp3" and "c:/music/a.mp3" are
+the same file there.  Other paths are only normalized (case matters).
+'''
+def get_src_key(src):
+    if re.match(r'^[A-Za-z]:', src) or '\\' in src:
+        return ntpath.normcase(ntpath.normpath(src))
+
+    return posixpath.normpath(src)
+
+'''
+merge_playlists
+
+Read each playlist in turn, and return (header, iterator of records) for all
+of their entries, in order, with duplicates dropped.  An entry is a duplicate
+if its normalized src (get_src_key), or its tid, has already been seen.  The
+first one seen is kept.
+
+This is a single pass through each file, with just a set lookup per entry, so
+the cost is linear in the total number of entries.  Only the keys seen so far
+are kept in memory, never the entries themselves.
+
+The header is the first playlist's.  If stats (a dict) is given, 'read' and
+'duplicates' counts are added to it as the entries are read.
+'''
+def merge_playlists(file_names, stats=None):
+    if stats == None:
+        stats = {}
+    stats['read'] = 0
+    stats['duplicates'] = 0
+
+    header, first_records = read_playlist(file_names[0])
+
+    def merged_records():
+        seen_srcs = set()
+        seen_tids = set()
+
+        for index, file_name in enumerate(file_names):
+            if index == 0:
+                records = first_records
+            else:
+                records = read_playlist(file_name)[1]
+
+            for record in records:
+                stats['read'] += 1
+
+                src_key = get_src_key(get_record_path(record))
+                if (src_key in seen_srcs or
+                    (record.tid and record.tid in seen_tids)):
+                    stats['duplicates'] += 1
+                    continue
+
+                seen_srcs.add(src_key)
+                if record.tid:
+                    seen_tids.add(record.tid)
+
+                yield record
+
+    return header, merged_records()
+
+'''
+is_relative_src
+
+Whether src is relative: not an absolute path (including Windows drive/UNC
+paths, on any OS) or a URL.
+'''
+def is_relative_src(src):
+    return not (re.match(r'^([A-Za-z]:)?[\\/]', src) or '://' in src)
+
+'''
+get_playlist_dir
+
+The directory a playlist's relative entries are relative to.
+'''
+def get_playlist_dir(playlist_file_name):
+    return os.path.dirname(os.path.abspath(playlist_file_name))
+
+'''
+resolve_src
+
+Relative entries are relative to the playlist's directory (base_dir), not the
+current directory.  Absolute paths and URLs are left alone.
+'''
+def resolve_src(src, base_dir):
+    if not base_dir or not is_relative_src(src):
+        return src
+
+    return os.path.normpath(os.path.join(base_dir, src))
+
+'''
+get_record_path
+
+The path of the record's media file, for probing it or comparing it with
+other entries (relative src resolved).
+'''
+def get_record_path(record):
+    return resolve_src(record.src, record.base_dir)
+
+'''
+get_output_src
+
+The src to write for the record in the playlist file_name: src as it was
+read, unless it's relative and file_name is in another directory than the
+playlist it came from, in which case it's made relative to file_name's
+directory (or absolute, if it can't be, ex. a different Windows drive).
+'''
+def get_output_src(record, file_name):
+    if not record.base_dir or not is_relative_src(record.src):
+        return record.src
+
+    output_dir = get_playlist_dir(file_name)
+    if os.path.normcase(output_dir) == os.path.normcase(record.base_dir):
+        return record.src
+
+    path = get_record_path(record)
+    try:
+        return os.path.relpath(path, output_dir)
+    except ValueError:
+        return path
+
+def xml_attribute(value):
+    return escape(value, { '"' : '&quot;', "'" : '&apos;' })
+
+def local_tag(elem):
+    return elem.tag.rsplit('}', 1)[-1]
+
+def parse_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+'''
+read_smil
+
+Reader for WPL and ZPL files, which share the same layout:
+
+    <?wpl version="1.0"?>
+    <smil>
+        <head>
+            <meta name="ItemCount" content="8"/>
+            <author>The Author</author>
+            <title>The Title</title>
+        </head>
+        <body>
+            <seq>
+                <media src="C:\\Music\\file1.wma" cid="GUID" tid="GUID"/>
+                ...
+
+ZPL <media> elements may also have a duration attribute (ms).
+'''
+def read_smil(file_name, header):
+    seq = None
+    base_dir = get_playlist_dir(file_name)
+
+    with open(file_name, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            tag = local_tag(elem)
+
+            if event == 'start':
+                if tag == 'seq':
+                    seq = elem
+                continue
+
+            if tag == 'media':
+                yield PlaylistRecord(
+                    elem.get('src', ''), elem.get('cid', ''),
+                    elem.get('tid', ''), parse_int(elem.get('duration')),
+                    base_dir)
+
+                # Done with it, don't let the tree keep growing.
+                if seq != None:
+                    seq.remove(elem)
+            elif tag == 'meta':
+                if elem.get('name') != None:
+                    header.meta.append((elem.get('name'),
+                                        elem.get('content', '')))
+            elif tag == 'title':
+                header.title = (elem.text or '').strip()
+            elif tag == 'author':
+                header.author = (elem.text or '').strip()
+
+'''
+get_entries_and_count
+
+Returns (entries, item_count, spool).  If item_count isn't already known, the
+formatted entries are spooled through a temp file to count them, and spool is
+the (rewound) temp file.  format_entry turns a record into the text for it.
+'''
+def get_entries_and_count(records, item_count, format_entry):
+    # Count already known, so entries can be formatted as they're written.
+    if item_count != None:
+        return (format_entry(record) for record in records), item_count, None
+
+    spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    item_count = 0
+    for record in records:
+        spool.write(format_entry(record))
+        item_count += 1
+
+    spool.seek(0)
+    return None, item_count, spool
+
+def write_smil(file_name, records, header, item_count, version_line,
+               generator, include_duration):
+    def format_media(record):
+        line = '            <media src="{0}"'.format(xml_attribute(
+            get_output_src(record, file_name)))
+        if record.cid:
+            line += ' cid="{0}"'.format(xml_attribute(record.cid))
+        if record.tid:
+            line += ' tid="{0}"'.format(xml_attribute(record.tid))
+        if include_duration and record.duration != None:
+            line += ' duration="{0}"'.format(int(record.duration))
+        return line + '/>\n'
+
+    entries, item_count, spool = get_entries_and_count(records, item_count,
+                                                       format_media)
+
+    # Keep the original head meta tags (and their order), but with an up to
+    # date item count, and without a total duration that's no longer right.
+    meta = [(name, content) for name, content in header.meta
+            if name.lower() not in ('itemcount', 'totalduration')]
+    if not any(name.lower() == 'generator' for name, content in meta):
+        meta.insert(0, ('Generator', generator))
+    meta.insert(1, ('ItemCount', str(item_count)))
+
+    try:
+        with open(file_name, 'w', encoding='utf-8') as f:
+            f.write('{0}\n<smil>\n    <head>\n'.format(version_line))
+            for name, content in meta:
+                f.write('        <meta name="{0}" content="{1}"/>\n'.format(
+                    xml_attribute(name), xml_attribute(content)))
+            if header.author:
+                f.write('        <author>{0}</author>\n'.format(
+                    escape(header.author)))
+            f.write('        <title>{0}</title>\n'.format(escape(header.title)))
+            f.write('    </head>\n    <body>\n        <seq>\n')
+
+            if spool != None:
+                shutil.copyfileobj(spool, f)
+            else:
+                for entry in entries:
+                    f.write(entry)
+
+            f.write('        </seq>\n    </body>\n</smil>\n')
+    finally:
+        if spool != None:
+            spool.close()
+
+def write_wpl(file_name, records, header, item_count):
+    write_smil(file_name, records, header, item_count, '<?wpl version="1.0"?>',
+               'playlisttool.py', include_duration=False)
+
+def write_zpl(file_name, records, header, item_count):
+    write_smil(file_name, records, header, item_count, '<?zpl version="2.0"?>',
+               'playlisttool.py', include_duration=True)
+
+'''
+read_m3u
+
+Reader for M3U/M3U8 files:
+
+    #EXTM3U
+    #PLAYLIST:The Title
+    #EXTINF:261,Artist - Title
+    C:\\Music\\file1.mp3
+
+The #EXTINF length (seconds, -1 for unknown) applies to the next entry.
+Anything else starting with '#' is ignored.
+
+.m3u8 is always UTF-8.  Plain .m3u is often in some legacy code page, so any
+bytes that aren't valid UTF-8 are carried through as-is (surrogateescape) and
+written back out unchanged.
+'''
+def read_m3u(file_name, header):
+    duration = None
+    base_dir = get_playlist_dir(file_name)
+
+    with open(file_name, 'r', encoding='utf-8-sig',
+              errors='surrogateescape') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith('#'):
+                if line.startswith('#EXTINF:'):
+                    seconds = parse_int(line[len('#EXTINF:'):].split(',')[0])
+                    duration = (seconds * 1000 if seconds != None and
+                                seconds >= 0 else None)
+                elif line.startswith('#PLAYLIST:'):
+                    header.title = line[len('#PLAYLIST:'):].strip()
+                continue
+
+            yield PlaylistRecord(line, '', '', duration, base_dir)
+            duration = None
+
+def write_m3u(file_name, records, header, item_count):
+    with open(file_name, 'w', encoding='utf-8',
+              errors='surrogateescape') as f:
+        f.write('#EXTM3U\n')
+        if header.title:
+            f.write('#PLAYLIST:{0}\n'.format(header.title))
+
+        for record in records:
+            seconds = -1
+            if record.duration != None:
+                seconds = int(round(record.duration / 1000))
+            src = get_output_src(record, file_name)
+            name = os.path.splitext(re.split(r'[\\/]', src)[-1])[0]
+            f.write('#EXTINF:{0},{1}\n{2}\n'.format(seconds, name, src))
+
+'''
+uri_to_path / path_to_uri
+
+XSPF locations are URIs.  Local files are converted to/from file:// URIs,
+relative paths to/from relative URIs (relative to the playlist), and anything
+else (http://...) is kept as is.
+
+    C:\\Music\\a b.mp3  <-> file:///C:/Music/a%20b.mp3
+    \\\\NAS\\Music\\a.mp3 <-> file://NAS/Music/a.mp3
+    /home/me/a.mp3     <-> file:///home/me/a.mp3
+'''
+def uri_to_path(uri):
+    if not uri.startswith('file:'):
+        return uri if '://' in uri else unquote(uri)
+
+    parsed = urlparse(uri)
+    path = unquote(parsed.path)
+
+    if parsed.netloc and parsed.netloc != 'localhost':
+        return '\\\\{0}{1}'.format(parsed.netloc, path.replace('/', '\\'))
+
+    if re.match(r'^/[A-Za-z]:', path):
+        return path[1:].replace('/', '\\')
+
+    return path
+
+def path_to_uri(path):
+    if '://' in path:
+        return path
+
+    if path.startswith('\\\\'):
+        return 'file:' + quote(path.replace('\\', '/'))
+
+    if re.match(r'^[A-Za-z]:', path):
+        return 'file:///' + quote(path.replace('\\', '/'), safe='/:')
+
+    if is_relative_src(path):
+        return quote(path.replace('\\', '/'))
+
+    return 'file://' + quote(path)
+
+'''
+read_xspf
+
+Reader for XSPF files:
+
+    <playlist version="1" xmlns="http://xspf.org/ns/0/">
+        <title>The Title</title>
+        <creator>The Author</creator>
+        <trackList>
+            <track>
+                <location>file:///C:/Music/file1.mp3</location>
+                <duration>261000</duration>
+                <meta rel="cid">GUID</meta>
+                <meta rel="tid">GUID</meta>
+            </track>
+            ...
+
+The cid/tid <meta> elements are only written by write_xspf(), so WMP GUIDs
+survive a round trip through XSPF.
+'''
+def read_xspf(file_name, header):
+    track_list = None
+    in_track   = False
+    base_dir   = get_playlist_dir(file_name)
+
+    with open(file_name, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            tag = local_tag(elem)
+
+            if event == 'start':
+                if tag == 'trackList':
+                    track_list = elem
+                elif tag == 'track':
+                    in_track = True
+                continue
+
+            if tag == 'track':
+                in_track = False
+                fields = { 'location' : '', 'duration' : None,
+                           'cid' : '', 'tid' : '' }
+                for child in elem:
+                    child_tag = local_tag(child)
+                    if child_tag in ('location', 'duration'):
+                        fields[child_tag] = (child.text or '').strip()
+                    elif (child_tag == 'meta' and
+                          child.get('rel') in ('cid', 'tid')):
+                        fields[child.get('rel')] = (child.text or '').strip()
+
+                yield PlaylistRecord(
+                    uri_to_path(fields['location']), fields['cid'],
+                    fields['tid'], parse_int(fields['duration']), base_dir)
+
+                if track_list != None:
+                    track_list.remove(elem)
+            elif not in_track and tag == 'title':
+                header.title = (elem.text or '').strip()
+            elif not in_track and tag == 'creator':
+                header.author = (elem.text or '').strip()
+
+def write_xspf(file_name, records, header, item_count):
+    with open(file_name, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<playlist version="1" xmlns="http://xspf.org/ns/0/">\n')
+        if header.title:
+            f.write('    <title>{0}</title>\n'.format(escape(header.title)))
+        if header.author:
+            f.write('    <creator>{0}</creator>\n'.format(
+                escape(header.author)))
+        f.write('    <trackList>\n')
+
+        for record in records:
+            f.write('        <track>\n            <location>{0}</location>\n'
+                    .format(escape(path_to_uri(
+                        get_output_src(record, file_name)))))
+            if record.duration != None:
+                f.write('            <duration>{0}</duration>\n'.format(
+                    int(record.duration)))
+            if record.cid:
+                f.write('            <meta rel="cid">{0}</meta>\n'.format(
+                    escape(record.cid)))
+            if record.tid:
+                f.write('            <meta rel="tid">{0}</meta>\n'.format(
+                    escape(record.tid)))
+            f.write('        </track>\n')
+
+        f.write('    </trackList>\n</playlist>\n')
+
+register_format(['.wpl'], read_smil, write_wpl)
+register_format(['.zpl'], read_smil, write_zpl)
+register_format(['.m3u', '.m3u8'], read_m3u, write_m3u)
+register_format(['.xspf'], read_xspf, write_xspf)
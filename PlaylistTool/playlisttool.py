@@ -140,9 +140,11 @@ playlist ordered in the way I want. It works, and after listening to the new
 playlist, it accomplished what I wanted.
 
 Execution Notes:
-    May need to install lxml and beautifulsoup
+    Playlists are read/written with the standard library (playlistformats.py)
+    so beautifulsoup/lxml are no longer needed.  Probing media files still
+    needs pywin32 (win32com.client).
 
-        pip install beautifulsoup4 lxml
+        pip install pywin32
 
 Example usage:
     python playlisttool.py -p "test.wpl" -d -c -o out.csv -v -w NewPlayList.wpl
@@ -156,8 +158,13 @@ Reference:
 
 
 usage: playlisttool.py [-h] [-a] [-b BUCKET_THRESHOLD] [-c] [-d]
-    [-o OUTPUT_FILENAME] -p PLAYLIST_FILE [-r] [-t PLAYLIST_TITLE] [-v]
-    [-w WPL_FILE]
+    [-o OUTPUT_FILENAME] [-p PLAYLIST_FILE] [-r] [-t PLAYLIST_TITLE] [-v]
+    [-w WPL_FILE] [--cache-file CACHE_FILE] [--watch]
+    [--poll-interval POLL_INTERVAL] [--probe-rate PROBE_RATE]
+    [--scan DIR [DIR ...]] [--scan-threads SCAN_THREADS]
+    [--extensions EXTENSIONS] [--dedupe] [--remove-duplicates]
+    [--merge PLAYLIST_FILE [PLAYLIST_FILE ...]] [--weighted]
+    [--play-history PLAY_HISTORY_FILE] [--analyze JSON_FILE] [--convert]
 
 Playlist Tool
 
@@ -176,7 +183,8 @@ options:
                         the the name of the new playlist file. Use -w/--wpl-file
                         param to specify the new WPL file name.
   -p PLAYLIST_FILE, --playlist-file PLAYLIST_FILE
-                        Name of playlist file to process.
+                        Name of playlist file to process (.wpl, .zpl, .m3u,
+                        .m3u8 or .xspf). Required unless --scan is used.
   -r, --remove-bad-files
                         Remove any bad files found (really just ignores them)
                         Does not remove from storage.
@@ -185,91 +193,331 @@ options:
                         specified)
   -v, --verbose         Enable for verbose output
   -w WPL_FILE, --wpl-file WPL_FILE
-                        Name of new wpl file to create.
+                        Name of new playlist file to create. Format is based
+                        on the extension: .wpl, .zpl, .m3u, .m3u8 or .xspf
+  --cache-file CACHE_FILE
+                        File used to cache media file lengths between runs,
+                        so files are only probed when new or changed.  Use ""
+                        to disable the cache.
+  --watch               Watch the directories referenced by the playlist, and
+                        probe new or changed files into the cache in the
+                        background.  Runs until Ctrl+C.
+  --poll-interval POLL_INTERVAL
+                        Seconds between directory polls in --watch mode.
+  --probe-rate PROBE_RATE
+                        Maximum files probed per second in --watch mode.
+  --scan DIR [DIR ...]  Build the list of files by walking these directory
+                        trees (instead of reading -p/--playlist-file).
+  --scan-threads SCAN_THREADS
+                        Number of threads used to walk directories with --scan.
+  --extensions EXTENSIONS
+                        Comma separated list of file extensions --scan looks
+                        for. Ex: ".mp3,.wma". Default is common audio/video
+                        types.
+  --dedupe              List media files with identical contents (same file
+                        in more than one place).
+  --remove-duplicates   Same as --dedupe, but also removes all but the first
+                        of each set of duplicates before distributing. Does
+                        not remove from storage.
+  --merge PLAYLIST_FILE [PLAYLIST_FILE ...]
+                        Combine these playlists into one (instead of reading
+                        -p/--playlist-file), keeping the first of any file
+                        listed more than once.
+  --weighted            With -d, order the buckets and the files within them
+                        so higher rated and less recently played files tend
+                        to come first, instead of a plain random order.
+  --play-history PLAY_HISTORY_FILE
+                        CSV file of path,play_count,last_played used by
+                        --weighted.
+  --analyze JSON_FILE   Output a summary of file lengths, bucket play time
+                        (with -d) and per directory totals, and write the full
+                        report to this JSON file. Needs numpy.
+  --convert             Just convert the -p playlist to the format of the -w
+                        file (by extension), entry for entry, without probing
+                        any files.
+
+Playlist formats:
+    Besides WPL, playlists can be read and written as Zune (.zpl), M3U/M3U8
+    and XSPF.  The format is picked by file extension, for both -p and -w, so
+    any mix works:
+
+        python playlisttool.py -p "All.m3u8" -d -w "Distributed.xspf"
+
+    Durations in the playlist itself (M3U #EXTINF, XSPF <duration>, ZPL
+    duration attribute) are used as is, so those files don't need probing.
+    Entries are streamed from the file one at a time, and --convert streams
+    them straight back out, so even very large playlists convert in a single
+    pass, in bounded memory:
+
+        python playlisttool.py -p "Huge.wpl" --convert -w "Huge.m3u8"
+
+Merging playlists:
+    Several playlists (ex. one per genre) can be combined into one master
+    list, and then distributed or just written out:
+
+        python playlisttool.py --merge Rock.wpl Jazz.m3u8 Misc.xspf -d -w All.wpl
+        python playlisttool.py --merge Rock.wpl Jazz.wpl --convert -w All.wpl
+
+    Each playlist is streamed in turn, and any entry whose file (compared
+    case-insensitively for Windows paths) or tid was already seen is dropped,
+    keeping the first one.  It's a single pass with a set lookup per entry,
+    so tens of millions of entries merge in linear time.
+
+Scanning directories instead of reading a playlist:
+    A playlist can also be built straight from the media library, without an
+    existing WPL file:
+
+        python playlisttool.py --scan "D:\Music" "\\NAS\Music" -d -w All.wpl
+
+    Directory trees are walked with os.scandir() on a pool of threads
+    (--scan-threads), so a large library on a NAS is limited by how many
+    directory listings can be in flight, rather than one at a time.  Linked
+    directories are followed, but each directory is only scanned once, so
+    link loops are harmless.
+
+Analyzing a playlist:
+    Instead of loading the -c/--csv output into Excel, --analyze gives the
+    usual numbers directly:
+
+        python playlisttool.py -p "test.wpl" -d --analyze analysis.json
+
+    o Length histogram and percentiles
+    o With -d, each bucket's total/min/max/std dev of play time, and how even
+      the bucket totals are
+    o Total length/size for each directory
+    o How far off the 0.062495 ms/byte length estimate (used for files with
+      no "Length") is, checked against every file that was probed properly
+
+    A summary is output, and the full report is written as JSON.  The numbers
+    are computed with numpy (playlistanalysis.py), which is only needed, and
+    only imported, when --analyze is used.
+
+Media cache and watch mode:
+    Probing each file through Shell.Application is by far the slowest part of
+    a run.  Probed lengths are kept in a cache file (--cache-file, default is
+    mediacache.json next to this script), keyed by path, size and mtime, so a
+    file is only probed again when it changes.
+
+    To keep that cache warm as new files are added, leave a watcher running:
+
+        python playlisttool.py -p "test.wpl" --watch --probe-rate 1
+
+    ...and the next "python playlisttool.py -p test.wpl -d -w new.wpl" run
+    finds all the lengths already known.
 '''
 
 
-from bs4 import BeautifulSoup
-from bs4.formatter import HTMLFormatter
 import argparse
+import csv
 from datetime import datetime
+import json
+import math
 import os
 import random
-import re
 
 # MediaFileClass.py is expected to be in the same directory
 # An instance of this class represents 1 <media> entry in the playlist.
 from MediaFileClass import MediaFileClass
 
+# Persistent cache of probed media file details (length, bit rate)
+from MediaCacheClass import MediaCacheClass
+
+# Readers/writers for WPL, ZPL, M3U/M3U8 and XSPF playlists
+import playlistformats
+
+# --analyze statistics (numpy is only imported if --analyze is used)
+import playlistanalysis
+
 # Global array of media file sources found within the playlist.
 media_files = None
 
 # Global options object, produced by argparse.ArgumentParser.parse_args()
 options = None
 
-# Soup object based on the playlist file (XML format)
-playlist_soup = None
+# Counts of entries read/dropped by --merge
+merge_stats = {}
+
+# Title/author/meta details of the playlist (playlistformats.PlaylistHeader)
+playlist_header = None
+
+# Iterator of playlistformats.PlaylistRecord, one per entry in the playlist.
+# Entries are read from the file as this is iterated, so it can only be
+# iterated once.
+playlist_records = None
 
 '''
-get_playlist_soup_from_file
+read_playlist_file
+
+This function opens the given playlist (any format playlistformats.py
+supports, based on the file extension), reading its header details into the
+global playlist_header variable.  The entries themselves are read as
+playlist_records is iterated.
 
-This function uses BeautifulSoup to read the given playlist into the 
-global playlist_soup variable.
+Returns True if the playlist could be opened.
 '''
-def get_playlist_soup_from_file(playlist_filename):
-    global playlist_soup
+def read_playlist_file(playlist_filename):
+    global playlist_header
+    global playlist_records
 
     if not os.path.isfile(playlist_filename):
-        output_string('XML File: "{0}" not valid '.format(playlist_filename))
-        return
+        output_string('Playlist File: "{0}" not valid '.format(
+            playlist_filename))
+        return False
 
-    # Need to specify encoding as utf-8 here, because some media file names can
-    # contain special chars like umlauts over "o"'s or tilde's over "n"'s
-    with open(playlist_filename, "r", encoding="utf-8") as xmlFile:
-        playlist_soup = BeautifulSoup(xmlFile, 'xml')
+    try:
+        playlist_header, playlist_records = playlistformats.read_playlist(
+            playlist_filename)
+    except Exception as err:
+        output_string('Unable to read playlist "{0}"'.format(playlist_filename))
+        output_string('[Exception] {0}: {1}'.format(type(err), err))
+        return False
 
-    output_playlist_details(playlist_soup)
+    output_playlist_details(playlist_header)
+    return True
 
 
 '''
-output_playlist_details
+read_merged_playlist_files
+
+Same as read_playlist_file, but for --merge: the entries of all the given
+playlists are read in turn as if they were one playlist, dropping any entry
+whose file (or tid) was already seen.  See playlistformats.merge_playlists()
+
+Returns True if the playlists could be opened.
+'''
+def read_merged_playlist_files(playlist_filenames):
+    global playlist_header
+    global playlist_records
+    global merge_stats
+
+    for playlist_filename in playlist_filenames:
+        if not os.path.isfile(playlist_filename):
+            output_string('Playlist File: "{0}" not valid '.format(
+                playlist_filename))
+            return False
+
+        if not playlistformats.is_supported(playlist_filename):
+            output_string('Playlist File: "{0}" is not a supported format'
+                          .format(playlist_filename))
+            return False
+
+    try:
+        playlist_header, playlist_records = playlistformats.merge_playlists(
+            playlist_filenames, merge_stats)
+    except Exception as err:
+        output_string('Unable to read playlist "{0}"'.format(
+            playlist_filenames[0]))
+        output_string('[Exception] {0}: {1}'.format(type(err), err))
+        return False
+
+    output_playlist_details(playlist_header)
+    return True
+
+
+'''
+output_merge_stats
+
+Output how many entries --merge read, and how many were dropped as duplicates.
+Only meaningful once playlist_records has been read through.
+'''
+def output_merge_stats():
+    output_string('Merged {0} playlists: {1} entries read, {2} duplicates '
+                  'dropped'.format(len(options.merge_files),
+                                   merge_stats['read'],
+                                   merge_stats['duplicates']))
+
 
-Output basic information of the playlist, based on several Meta tags.
 '''
-def output_playlist_details(playlist):
-    all_meta = playlist.find_all('meta')
+create_new_playlist_header
 
-    item_count = -1
-    for elem in all_meta:
-        if (elem.has_attr('name') and elem.has_attr('content') and not
-            elem['name'] == 'Generator'):
-            item_count = int(elem['content'])
+Create the header details for a new playlist, for when the list of files
+didn't come from an existing playlist (--scan).
+'''
+def create_new_playlist_header():
+    global playlist_header
+
+    playlist_header = playlistformats.PlaylistHeader(title='Scanned Media')
+
+
+'''
+output_playlist_details
 
-    output_string("Title     : {0}".format(playlist.title.get_text()))
-    output_string("Author    : {0}".format(playlist.author.get_text()))
-    output_string("Item Count: {0}".format(item_count))
+Output basic information of the playlist, based on several Meta tags.
+'''
+def output_playlist_details(header):
+    output_string("Title     : {0}".format(header.title))
+    output_string("Author    : {0}".format(header.author))
+    output_string("Item Count: {0}".format(header.get_item_count()))
 
 
 '''
 get_file_list_from_playlist
 
-This function reads the specified playlist file and builds an array of soup
-objects for all the <media> tags.
+This function builds an array of MediaFileClass objects, one for each entry
+read from the playlist.
 
-Each entry in the Playlist XML follows the form:
+Each entry in a WPL Playlist XML follows the form:
     <media src="C:\Path\To\Media\File.mp3" cid=GUID  tid=GUID/>
+
+...and entries from other formats are read into the same (src, cid, tid,
+duration) form.  See playlistformats.py
+'''
+def get_file_list_from_playlist(records):
+    global options
+    global media_files
+
+    media_files = []
+
+    # Iterate through the playlist and fill the list with MediaFileClass
+    # objects based on all the entries found
+    for record in records:
+        media_files.append(MediaFileClass(record))
+
+    prepare_file_list(media_files)
+
+
 '''
-def get_file_list_from_playlist(playlist):
+get_file_list_from_directories
+
+Same as get_file_list_from_playlist, but the list of MediaFileClass objects is
+built from all the media files found by walking the given directory trees
+(--scan), instead of from an existing playlist.
+
+Directories are walked on a pool of threads (see MediaScannerClass.py), and
+each file found is handed straight to MediaFileClass as soon as its directory
+has been listed.
+'''
+def get_file_list_from_directories(directories):
     global options
     global media_files
 
+    from MediaScannerClass import MediaScannerClass
+
+    extensions = MediaFileClass._media_extensions
+    if (len(options.extensions) > 0):
+        extensions = [ext.strip() if ext.strip().startswith('.') else
+                      '.' + ext.strip() for ext in options.extensions.split(',')]
+
+    scanner = MediaScannerClass(extensions, max_workers = options.scan_threads,
+                                output = output_string)
+
     media_files = []
+    for file_name in scanner.scan(directories):
+        media_files.append(MediaFileClass(
+            playlistformats.PlaylistRecord(file_name)))
 
-    # Iterate through the XML file and fill the list with MediaFileClass objects
-    # base on all the <media> elements found
-    for media in playlist.find_all('media'):
-        media_files.append(MediaFileClass(media))
+    output_string('Scanned {0} directories'.format(scanner.num_dirs))
 
+    prepare_file_list(media_files)
+
+
+'''
+prepare_file_list
+
+Common handling for a freshly built list of MediaFileClass objects: report (and
+optionally remove) invalid files, and sort by length.
+'''
+def prepare_file_list(media_files):
     # Invalid files are mostly those that have likely been moved or deleted
     # but the playlist itself was never updated.
     list_invalid_files(media_files)
@@ -322,6 +570,51 @@ def list_invalid_files(files):
         for bad_index in bad_file_indices:
             del files[bad_index]
 
+'''
+remove_duplicate_files
+
+Find media files with identical contents (see DuplicateFinderClass.py) and
+list them.
+
+If --remove-duplicates is specified, all but the first (in playlist order) of
+each set of duplicates are removed from the list, before it's distributed.
+Like -r/--remove-bad-files, nothing is removed from storage.
+'''
+def remove_duplicate_files(files):
+    global options
+
+    from DuplicateFinderClass import DuplicateFinderClass
+
+    finder = DuplicateFinderClass(max_workers = options.scan_threads)
+    duplicates = finder.find_duplicates(files)
+
+    output_string('Duplicate check: {0} partial hashes, {1} full hashes, '
+                  '{2:,} bytes read'.format(finder.num_partial,
+                                            finder.num_full, finder.bytes_read))
+
+    if (len(duplicates) == 0):
+        output_string('No duplicate files found')
+        return files
+
+    output_string('Duplicate files found:')
+    for group in duplicates:
+        output_string('{0}'.format(group[0].file_name))
+        for duplicate in group[1:]:
+            output_string('    {0}'.format(duplicate.file_name))
+
+    if not options.remove_duplicates:
+        return files
+
+    # Remove by identity, as the same path may legitimately appear in more
+    # than one MediaFileClass object.
+    remove = set()
+    for group in duplicates:
+        for duplicate in group[1:]:
+            remove.add(id(duplicate))
+
+    output_string('Removing {0} duplicate files'.format(len(remove)))
+    return [file for file in files if id(file) not in remove]
+
 '''
 distribute_list
 
@@ -373,7 +666,11 @@ def distribute_list(mediaFiles, length_threshold):
 
 
     # Shuffle to randomly distributes the bucket boundary entries.
-    random.shuffle(new_list)
+    # With --weighted, higher rated/less recently played ones tend to go first.
+    if (options.weighted):
+        new_list = weighted_order(new_list)
+    else:
+        random.shuffle(new_list)
     output_string("Buckets Created: {0}".format ( len(new_list) ) )
 
     # Need to keep track of the bucket indexes which will be used during the
@@ -417,7 +714,10 @@ def distribute_list(mediaFiles, length_threshold):
 
     debug_print(boundary_indices)
 
-    randomize_buckets(new_list, boundary_indices)
+    if (options.weighted):
+        weighted_randomize_buckets(new_list, boundary_indices)
+    else:
+        randomize_buckets(new_list, boundary_indices)
 
     return new_list
 
@@ -496,6 +796,111 @@ def randomize_buckets(mediaFiles, bucket_indices):
         mediaFiles[current_file_index], mediaFiles[swap_index]
 
 
+'''
+get_track_weight
+
+Weight used by --weighted ordering.  Bigger weight means the file tends to be
+placed earlier.
+
+o Rating: Unrated is 1, up to 6 for 5 Stars
+o Last played: Multiplied by 1 + (days since last played / 30), capped at a
+  year.  Files never played (or not in --play-history) get the full year.
+o Play count: Divided by 1 + log(1 + play count), so often played files are
+  gently pushed back.
+'''
+def get_track_weight(media_file, now):
+    weight = 1.0 + media_file.rating
+
+    days = 365
+    if media_file.last_played != None:
+        days = min(max((now - media_file.last_played).days, 0), 365)
+    weight *= 1.0 + days / 30.0
+
+    weight /= 1.0 + math.log1p(media_file.play_count)
+
+    return weight
+
+
+'''
+weighted_order
+
+Returns a new list of the given media files, in a random order where files with
+bigger weights (see get_track_weight) tend to come first.
+
+Uses Efraimidis-Spirakis weighted random sampling (without replacement): each
+file gets a key of u^(1/weight), u being uniform random in (0,1], and sorting
+by key (descending) gives the weighted order.  That's one pass to make the keys
+and one sort, O(n log n), rather than repeatedly scanning the remaining
+weights to pick the next file.  log(u)/weight sorts the same as u^(1/weight),
+and doesn't underflow for large weights.
+'''
+def weighted_order(mediaFiles):
+    now = datetime.now()
+
+    keyed = [(math.log(1.0 - random.random()) / get_track_weight(file, now),
+              file) for file in mediaFiles]
+    keyed.sort(key=lambda x: x[0], reverse=True)
+
+    return [file for key, file in keyed]
+
+
+'''
+weighted_randomize_buckets
+
+Same idea as randomize_buckets, but each bucket's files (everything between
+two bucket boundaries) are put in weighted_order(), instead of being randomly
+swapped around.
+'''
+def weighted_randomize_buckets(mediaFiles, bucket_indices):
+    for i in range(0, len(bucket_indices)):
+        first_in_bucket_index = bucket_indices[i] + 1
+        if (i + 1 < len(bucket_indices)):
+            end_of_bucket_index = bucket_indices[i + 1]
+        else:
+            end_of_bucket_index = len(mediaFiles)
+
+        mediaFiles[first_in_bucket_index:end_of_bucket_index] = weighted_order(
+            mediaFiles[first_in_bucket_index:end_of_bucket_index])
+
+
+'''
+load_play_history
+
+Read play counts and last played times from the given CSV file, and set them
+on the matching media files.  Used by --weighted ordering.
+
+Each line is:  path,play_count,last_played
+    C:\Music\files\file1.wma,12,2024-07-03 14:22:50
+
+last_played can be empty (never played).  A header line is fine, it's skipped.
+'''
+def load_play_history(file_name, mediaFiles):
+    files_by_path = {}
+    for file in mediaFiles:
+        files_by_path[os.path.normcase(os.path.abspath(file.file_name))] = file
+
+    num_found = 0
+    with open(file_name, 'r', encoding='utf-8', newline='') as history_file:
+        for row in csv.reader(history_file):
+            if len(row) < 2 or not row[1].strip().isdigit():
+                continue
+
+            file = files_by_path.get(os.path.normcase(os.path.abspath(row[0])))
+            if file == None:
+                continue
+
+            file.play_count = int(row[1])
+            if len(row) > 2 and len(row[2].strip()) > 0:
+                try:
+                    file.last_played = datetime.fromisoformat(row[2].strip())
+                except ValueError:
+                    debug_print('Bad last_played value: {0}'.format(row))
+            num_found += 1
+
+    output_string('Play history found for {0} of {1} files'.format(num_found,
+        len(mediaFiles)))
+
+
 '''
 output_list_of_files
 
@@ -571,87 +976,88 @@ def output_as_csv(mediaFiles):
     else:
         write_to_console()
 
+'''
+analyze_files
+
+Output the --analyze summary for the list of files (length histogram and
+percentiles, per bucket play time, per directory totals, length estimate
+error), and write the full report as JSON to options.analyze_file.  See
+playlistanalysis.py
+'''
+def analyze_files(mediaFiles):
+    global options
+
+    try:
+        report = playlistanalysis.analyze_media_files(mediaFiles)
+    except ImportError as err:
+        output_string('--analyze needs numpy (pip install numpy): {0}'
+                      .format(err))
+        return
+
+    playlistanalysis.output_analysis(report, output_string)
+
+    with open(options.analyze_file, 'w') as f:
+        json.dump(report, f, indent=4)
+    output_string('Analysis written to "{0}"'.format(options.analyze_file))
+
 '''
 write_new_playlist
 
-This function handles writing the list of files in mediaFiles to the wpl file
-given in options.wpl_file and other params.
+This function handles writing the list of files in mediaFiles to the playlist
+file given in options.wpl_file and other params.  The format written is based
+on the file extension (.wpl, .zpl, .m3u, .m3u8 or .xspf), so this can also
+convert between formats.
 
 Params:
-    mediaFiles: Array of BS4 objects for each <media> tag found in playlist
+    mediaFiles: Array of MediaFileClass objects, in the order to be written
     options   : ArgumentParser options.
-    playlist  : BS4 object representing the playlist.
+    header    : playlistformats.PlaylistHeader of the playlist.
 '''
-def write_new_playlist(mediaFiles, options, playlist):
+def write_new_playlist(mediaFiles, options, header):
     if mediaFiles == None:
         output_string('[write_new_playlist] No files to process')
         return
 
-    # Get <SEQ> tag. If it's not present, then likely bad/unexpected WPL file
-    seq_elem = playlist.find('seq')
-    if seq_elem == None:
-        output_string("Unable to find <SEQ> tag in playlist: {0}"
-                      .format(options.playlist_file))
-        return
+    update_playlist_title(header)
 
-    # Update ItemCount. Invalid files may have been pruned with
-    # the -r/--remove-bad-files switches
-    item_count = playlist.find('meta', { "name" : "ItemCount" })
-    if item_count:
-        item_count["content"] = len(mediaFiles)
-
-    # Update Title
-    # If not specified via the -t/--title param, just append a simple date time
-    # string formatted as:  YYYYMMDD-HHMMSS  ex 20240703-142250.
-    # This will at least make it distinct from original when viewed in WMP.
-    #
-    # BUG:  The <Title> element is including carriage returns, which WMP shows
-    #       and looks terrible.  Figure out how to output the <TITLE> without
-    #       any carriage returns, so it's one line like:
-    #           <title>Distributed All</title>
-    #       not like:
-    #           <title>
-    #               Distributed All
-    #           </title>
-    #       Currently, I just hand edit after generating.
-    title = playlist.find('title')
-    if title:
-        if len(options.playlist_title) > 0:
-            title.string = options.playlist_title
-        else:
-            now = datetime.now().strftime("%Y%m%d-%H%M%S")
-            title.string = "{0} ({1})".format(title.string, now)
-    else:
-        # TBD: Should do something here. Maybe something clever based on
-        #      filename.
-        pass
+    # ItemCount is written based on the list, as invalid files may have been
+    # pruned with the -r/--remove-bad-files switches
+    playlistformats.write_playlist(options.wpl_file,
+                                   (media.to_record() for media in mediaFiles),
+                                   header, item_count=len(mediaFiles))
 
-    # helper function, to replace the <SEQ> element from the playList.
-    replace_seq_with_mediafiles(seq_elem, mediaFiles)
 
-    # Default indent is 1 space, this will change it to 4 spaces.
-    # WMP doesn't care, but made debugging a lot easier.
-    indent_formatter = HTMLFormatter(indent=4)
+'''
+update_playlist_title
 
-    # Write everything out into (or overwrite) the specified WPL file
-    # This routine removes the XML Prolog string "<?xml.....?>" which does
-    # not appear in 'normal' WPL files.
-    with open(options.wpl_file, "w", encoding="utf-8") as xmlFile:
-        xml_text = playlist.prettify(formatter=indent_formatter)
-        xml_text = re.sub(r"<\?xml.*\?>\n", "", xml_text)
-        xmlFile.write(xml_text)
+If not specified via the -t/--title param, just append a simple date time
+string formatted as:  YYYYMMDD-HHMMSS  ex 20240703-142250.
+This will at least make it distinct from original when viewed in WMP.
+'''
+def update_playlist_title(header):
+    if len(options.playlist_title) > 0:
+        header.title = options.playlist_title
+    else:
+        now = datetime.now().strftime("%Y%m%d-%H%M%S")
+        header.title = "{0} ({1})".format(header.title, now).strip()
 
 
 '''
-replace_seq_with_mediafiles
+convert_playlist
 
-Clear and replace the contents of the <SEQ> element, with the new list of
-media file elements.
+Stream the entries of the playlist straight into the new playlist file
+(--convert), in the format given by the -w/--wpl-file extension.  Nothing is
+probed or sorted, and only one entry is held in memory at a time, so this
+works for playlists of any size.
 '''
-def replace_seq_with_mediafiles(seq, mediaFiles):
-    seq.clear()
-    for media in mediaFiles:
-        seq.append(media.to_media_element_string())
+def convert_playlist(records, header):
+    update_playlist_title(header)
+
+    playlistformats.write_playlist(options.wpl_file, records, header)
+
+    output_string('Converted "{0}" to "{1}"'.format(
+        options.playlist_file or ', '.join(options.merge_files),
+        options.wpl_file))
 
 
 '''
@@ -663,13 +1069,22 @@ def output_options():
     global options
     output_string('[=========== Playlist Tool  ===========]')
     output_string('Playlist File     : {0}'.format(options.playlist_file))
+    output_string('Scan Directories  : {0}'.format(options.scan_directories))
+    output_string('Merge Playlists   : {0}'.format(options.merge_files))
     output_string('New Playlist File : {0}'.format(options.wpl_file))
     output_string('Bucket Threshold  : {0}'.format(options.bucket_threshold))
     output_string('Output File       : {0}'.format(options.output_filename))
     output_string('Output as CSV     : {0}'.format(options.output_as_csv))
     output_string('Distribute Files  : {0}'.format(options.distribute_files))
     output_string('Remove Bad Files  : {0}'.format(options.remove_bad_files))
+    output_string('Find Duplicates   : {0}'.format(options.dedupe))
+    output_string('Remove Duplicates : {0}'.format(options.remove_duplicates))
+    output_string('Weighted Order    : {0}'.format(options.weighted))
+    output_string('Play History File : {0}'.format(options.play_history_file))
+    output_string('Analyze File      : {0}'.format(options.analyze_file))
     output_string('Verbose output    : {0}'.format(options.verbose_output))
+    output_string('Cache File        : {0}'.format(options.cache_file))
+    output_string('Watch             : {0}'.format(options.watch))
 
 def debug_print(str):
     global options
@@ -720,10 +1135,11 @@ def parse_args():
     )
 
     parser.add_argument('-p','--playlist-file',
-        required = True,
+        required = False,
         dest     = 'playlist_file',
         default  = '',
-        help     = 'Name of playlist file to process.'
+        help     = ('Name of playlist file to process (.wpl, .zpl, .m3u, '
+                    '.m3u8 or .xspf). Required unless --scan is used.')
     )
 
     parser.add_argument('-r','--remove-bad-files',
@@ -754,22 +1170,231 @@ def parse_args():
         required = False,
         dest     = 'wpl_file',
         default  = '',
-        help     = 'Name of new wpl file to create. '
+        help     = ('Name of new playlist file to create. Format is based '
+                    'on the extension: .wpl, .zpl, .m3u, .m3u8 or .xspf')
+    )
+
+    parser.add_argument('--cache-file',
+        required = False,
+        dest     = 'cache_file',
+        default  = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'mediacache.json'),
+        help     = ('File used to cache media file lengths between runs, so '
+                    'files are only probed when new or changed.  Use "" to '
+                    'disable the cache.')
+    )
+
+    parser.add_argument('--watch',
+        required = False,
+        dest     = 'watch',
+        action   = "store_true",
+        default  = False,
+        help     = ('Watch the directories referenced by the playlist, and '
+                    'probe new or changed files into the cache in the '
+                    'background.  Runs until Ctrl+C.')
+    )
+
+    parser.add_argument('--poll-interval',
+        required = False,
+        dest     = 'poll_interval',
+        type     = float,
+        default  = 30.0,
+        help     = 'Seconds between directory polls in --watch mode.'
+    )
+
+    parser.add_argument('--probe-rate',
+        required = False,
+        dest     = 'probe_rate',
+        type     = float,
+        default  = 2.0,
+        help     = 'Maximum files probed per second in --watch mode.'
+    )
+
+    parser.add_argument('--scan',
+        required = False,
+        dest     = 'scan_directories',
+        nargs    = '+',
+        default  = [],
+        metavar  = 'DIR',
+        help     = ('Build the list of files by walking these directory trees '
+                    '(instead of reading -p/--playlist-file).')
+    )
+
+    parser.add_argument('--scan-threads',
+        required = False,
+        dest     = 'scan_threads',
+        type     = int,
+        default  = 8,
+        help     = 'Number of threads used to walk directories with --scan.'
+    )
+
+    parser.add_argument('--extensions',
+        required = False,
+        dest     = 'extensions',
+        default  = '',
+        help     = ('Comma separated list of file extensions --scan looks '
+                    'for. Ex: ".mp3,.wma". Default is common audio/video '
+                    'types.')
+    )
+
+    parser.add_argument('--dedupe',
+        required = False,
+        dest     = 'dedupe',
+        action   = "store_true",
+        default  = False,
+        help     = ('List media files with identical contents (same file in '
+                    'more than one place).')
+    )
+
+    parser.add_argument('--remove-duplicates',
+        required = False,
+        dest     = 'remove_duplicates',
+        action   = "store_true",
+        default  = False,
+        help     = ('Same as --dedupe, but also removes all but the first of '
+                    'each set of duplicates before distributing. Does not '
+                    'remove from storage.')
+    )
+
+    parser.add_argument('--merge',
+        required = False,
+        dest     = 'merge_files',
+        nargs    = '+',
+        default  = [],
+        metavar  = 'PLAYLIST_FILE',
+        help     = ('Combine these playlists into one (instead of reading '
+                    '-p/--playlist-file), keeping the first of any file '
+                    'listed more than once.')
+    )
+
+    parser.add_argument('--weighted',
+        required = False,
+        dest     = 'weighted',
+        action   = "store_true",
+        default  = False,
+        help     = ('With -d, order the buckets and the files within them '
+                    'so higher rated and less recently played files tend to '
+                    'come first, instead of a plain random order.')
+    )
+
+    parser.add_argument('--play-history',
+        required = False,
+        dest     = 'play_history_file',
+        default  = '',
+        help     = ('CSV file of path,play_count,last_played used by '
+                    '--weighted.')
+    )
+
+    parser.add_argument('--analyze',
+        required = False,
+        dest     = 'analyze_file',
+        default  = '',
+        metavar  = 'JSON_FILE',
+        help     = ('Output a summary of file lengths, bucket play time (with '
+                    '-d) and per directory totals, and write the full report '
+                    'to this JSON file. Needs numpy.')
+    )
+
+    parser.add_argument('--convert',
+        required = False,
+        dest     = 'convert',
+        action   = "store_true",
+        default  = False,
+        help     = ('Just convert the -p playlist to the format of the -w '
+                    'file (by extension), entry for entry, without probing '
+                    'any files.')
     )
 
     options = parser.parse_args()
 
+    if options.remove_duplicates:
+        options.dedupe = True
+
+    if (options.convert and (len(options.scan_directories) > 0 or
+                             len(options.wpl_file) == 0)):
+        parser.error('--convert requires -p/--playlist-file (or --merge) and '
+                     '-w/--wpl-file')
+
+    num_sources = ((len(options.playlist_file) > 0) +
+                   (len(options.scan_directories) > 0) +
+                   (len(options.merge_files) > 0))
+    if (num_sources != 1):
+        parser.error('one (and only one) of -p/--playlist-file, --scan or '
+                     '--merge is required')
+
+    if (options.watch and len(options.scan_directories) > 0):
+        parser.error('--watch requires -p/--playlist-file or --merge')
+
     return options
 
+'''
+watch_playlist_directories
+
+Keep the media cache warm for the given playlist, by watching the directories
+its media files live in.  See MediaWatcherClass.py for details.
+'''
+def watch_playlist_directories(records, cache):
+    from MediaWatcherClass import MediaWatcherClass
+
+    file_names = (playlistformats.get_record_path(record)
+                  for record in records)
+    directories = MediaWatcherClass.get_directories_from_files(file_names)
+
+    watcher = MediaWatcherClass(directories, cache,
+                                poll_interval = options.poll_interval,
+                                probe_rate    = options.probe_rate,
+                                output        = output_string)
+    watcher.run()
+
 def main(options):
     global media_files
-    global playlist_soup
 
     output_options()
 
-    get_playlist_soup_from_file(options.playlist_file)
+    cache = None
+    if (len(options.cache_file) > 0):
+        cache = MediaCacheClass(options.cache_file)
+        cache.load()
+        MediaFileClass._cache = cache
+
+    if (len(options.scan_directories) > 0):
+        get_file_list_from_directories(options.scan_directories)
+        create_new_playlist_header()
+    else:
+        if (len(options.merge_files) > 0):
+            if not read_merged_playlist_files(options.merge_files):
+                return
+        elif not read_playlist_file(options.playlist_file):
+            return
+
+        if (options.watch):
+            if cache == None:
+                output_string('--watch needs a cache file (--cache-file)')
+                return
+            watch_playlist_directories(playlist_records, cache)
+            return
+
+        if (options.convert):
+            convert_playlist(playlist_records, playlist_header)
+            if (len(options.merge_files) > 0):
+                output_merge_stats()
+            return
 
-    get_file_list_from_playlist(playlist_soup)
+        get_file_list_from_playlist(playlist_records)
+
+        if (len(options.merge_files) > 0):
+            output_merge_stats()
+
+    if cache:
+        output_string('Cache hits: {0}  misses: {1}'.format(cache.hits,
+                                                            cache.misses))
+        cache.save()
+
+    if (options.dedupe):
+        media_files = remove_duplicate_files(media_files)
+
+    if (len(options.play_history_file) > 0):
+        load_play_history(options.play_history_file, media_files)
 
     if (options.distribute_files):
         media_files = distribute_list(media_files, options.bucket_threshold)
@@ -777,11 +1402,14 @@ def main(options):
     if (options.output_as_csv):
         output_as_csv(media_files)
 
+    if (len(options.analyze_file) > 0):
+        analyze_files(media_files)
+
     if (options.verbose_output):
         output_list_of_files(media_files)
 
     if (len(options.wpl_file) > 0):
-        write_new_playlist(media_files, options, playlist_soup)
+        write_new_playlist(media_files, options, playlist_header)
 
 if __name__ == "__main__":
     options = parse_args()
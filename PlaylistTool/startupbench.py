@@ -0,0 +1,297 @@
+'''
+Start-up Benchmark for playlisttool.py
+
+Measures how long playlisttool.py takes to get going, for the main CLI modes,
+and fails if any mode goes over its budget.  Start-up time used to be
+dominated by importing BeautifulSoup and (through MediaFileClass)
+win32com.client, even for things like --help.  Playlists are now read without
+bs4, and win32com.client is only imported when a file actually needs probing.
+This benchmark is meant to keep it that way.
+
+For each mode, it records:
+o Time to first output (ms): Time from launching the process until the first
+  line of output shows up.  Best of --repeat runs.
+o Total time (ms): Time until the process exits.  Best of --repeat runs.
+o Import time (ms): Sum of the top level cumulative import times reported by
+  "python -X importtime"
+o Heavy modules: Which of bs4/lxml/win32com were imported at all.
+
+Modes:
+    help      : playlisttool.py --help
+    bad-args  : playlisttool.py  (missing -p, argparse error)
+    csv-cached: playlisttool.py -p <synthetic.wpl> -c, where every media file
+                is already in the media cache, so nothing needs probing.
+
+The synthetic playlist, media files (empty placeholder files) and a matching
+cache file are generated in a temp directory.
+
+Budgets are in ms, for time to first output, and the list of modules that a
+mode must not import.  Defaults are in default_budgets below, and can be
+overridden with -b/--budget-file, a JSON file in the same form.
+
+usage: startupbench.py [-h] [-b BUDGET_FILE] [-n NUM_FILES] [-o OUTPUT_FILE]
+                       [-r REPEAT]
+
+Example:
+    python startupbench.py -r 10 -o startup.json
+
+    Exit code is 1 if any mode is over budget.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+# Used to write a media cache that matches the synthetic playlist
+from MediaCacheClass import MediaCacheClass
+
+# Global options object, produced by argparse.ArgumentParser.parse_args()
+options = None
+
+playlist_tool = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'playlisttool.py')
+
+# Modules that are expensive to import, and are reported on for each mode.
+heavy_modules = ['bs4', 'lxml', 'win32com']
+
+default_budgets = {
+    'help'       : { 'first_output_ms' : 250,
+                     'forbidden_modules' : ['bs4', 'lxml', 'win32com'] },
+    'bad-args'   : { 'first_output_ms' : 250,
+                     'forbidden_modules' : ['bs4', 'lxml', 'win32com'] },
+    'csv-cached' : { 'first_output_ms' : 250,
+                     'forbidden_modules' : ['bs4', 'lxml', 'win32com'] },
+}
+
+'''
+create_cached_playlist
+
+Create a synthetic playlist of num_files placeholder media files, along with a
+media cache that already knows about every one of them.
+
+Returns (playlist_filename, cache_filename)
+'''
+def create_cached_playlist(directory, num_files):
+    media_directory = os.path.join(directory, 'media')
+    os.makedirs(media_directory, exist_ok=True)
+
+    cache_filename = os.path.join(directory, 'mediacache.json')
+    cache = MediaCacheClass(cache_filename)
+
+    media_lines = []
+    for i in range(num_files):
+        file_name = os.path.join(media_directory, 'track{0:06}.mp3'.format(i))
+        with open(file_name, 'wb') as f:
+            f.write(b'\0' * (i % 64))
+
+        stat = os.stat(file_name)
+        length_ms = 60000 + (i * 7919) % 3600000
+        cache.store(file_name, stat.st_size, stat.st_mtime_ns,
+                    '{0}:{1:02}:{2:02}'.format(length_ms // 3600000,
+                        (length_ms // 60000) % 60, (length_ms // 1000) % 60),
+                    length_ms, '128kbps', i % 6)
+        media_lines.append('            <media src="{0}"/>'.format(file_name))
+
+    playlist_filename = os.path.join(directory, 'bench.wpl')
+    with open(playlist_filename, 'w', encoding='utf-8') as f:
+        f.write('<?wpl version="1.0"?>\n<smil>\n    <head>\n'
+                '        <meta name="ItemCount" content="{0}"/>\n'
+                '        <author>startupbench</author>\n'
+                '        <title>Start-up Benchmark</title>\n'
+                '    </head>\n    <body>\n        <seq>\n{1}\n'
+                '        </seq>\n    </body>\n</smil>\n'.
+                format(num_files, '\n'.join(media_lines)))
+
+    cache.save()
+
+    return playlist_filename, cache_filename
+
+'''
+time_run
+
+Run the command once, returning (ms until first line of output, ms until
+exit).  Output is unbuffered so the first line shows up as soon as it's
+printed.
+'''
+def time_run(args):
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, playlist_tool] + args,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, env=env)
+    process.stdout.readline()
+    first_output = time.perf_counter()
+    process.stdout.read()
+    process.wait()
+    finished = time.perf_counter()
+
+    return ((first_output - start) * 1000, (finished - start) * 1000)
+
+'''
+get_import_details
+
+Run the command once under "python -X importtime", and return the total
+import time (ms) and which of the heavy_modules were imported.
+
+importtime lines look like:
+    import time: self [us] | cumulative | imported package
+    import time:       342 |       4821 |   encodings
+Top level imports are the ones with exactly 1 space of indent before the
+package name.
+'''
+def get_import_details(args):
+    result = subprocess.run([sys.executable, '-X', 'importtime', playlist_tool]
+                            + args, capture_output=True, text=True)
+
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+
+        package = fields[2]
+        if package.startswith(' ') and not package.startswith('  '):
+            total_us += int(fields[1])
+
+        imported.add(package.strip().split('.')[0])
+
+    return (total_us / 1000,
+            [module for module in heavy_modules if module in imported])
+
+def run_benchmarks(directory):
+    playlist_filename, cache_filename = create_cached_playlist(directory,
+                                                               options.num_files)
+    modes = {
+        'help'       : ['--help'],
+        'bad-args'   : [],
+        'csv-cached' : ['-p', playlist_filename, '-c',
+                        '--cache-file', cache_filename],
+    }
+
+    results = {}
+    for mode, args in modes.items():
+        runs = [time_run(args) for i in range(options.repeat)]
+        import_ms, modules = get_import_details(args)
+
+        results[mode] = {
+            'first_output_ms' : round(min(run[0] for run in runs), 2),
+            'total_ms'        : round(min(run[1] for run in runs), 2),
+            'import_ms'       : round(import_ms, 2),
+            'heavy_modules'   : modules,
+        }
+
+        output_string('{0:<11} first output: {1:8.2f}ms  total: {2:8.2f}ms  '
+                      'imports: {3:8.2f}ms  heavy modules: {4}'.format(mode,
+                      results[mode]['first_output_ms'],
+                      results[mode]['total_ms'], results[mode]['import_ms'],
+                      ', '.join(modules) if modules else '<none>'))
+    return results
+
+'''
+check_budgets
+
+Compare results against the budgets, outputting anything over budget.
+Returns True if everything is within budget.
+'''
+def check_budgets(results, budgets):
+    within_budget = True
+
+    for mode, budget in budgets.items():
+        if mode not in results:
+            continue
+
+        result = results[mode]
+        if result['first_output_ms'] > budget.get('first_output_ms',
+                                                  float('inf')):
+            output_string('**** {0}: first output {1}ms is over budget ({2}ms)'
+                          .format(mode, result['first_output_ms'],
+                                  budget['first_output_ms']))
+            within_budget = False
+
+        for module in budget.get('forbidden_modules', []):
+            if module in result['heavy_modules']:
+                output_string('**** {0}: imported {1}, which should be lazy'
+                              .format(mode, module))
+                within_budget = False
+
+    return within_budget
+
+def output_string(str):
+    print("{0} {1}".format("[{:%Y-%d-%m %H:%M:%S}]".format(datetime.now()),str))
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Playlist Tool Start-up Benchmark')
+
+    parser.add_argument('-b','--budget-file',
+        required = False,
+        dest     = 'budget_file',
+        default  = '',
+        help     = ('JSON file of per mode budgets. If omitted, built in '
+                    'defaults are used.')
+    )
+
+    parser.add_argument('-n','--num-files',
+        required = False,
+        dest     = 'num_files',
+        type     = int,
+        default  = 1500,
+        help     = 'Number of media files in the synthetic playlist.'
+    )
+
+    parser.add_argument('-o','--output-file',
+        required = False,
+        dest     = 'output_filename',
+        default  = '',
+        help     = 'Name of JSON file to write the results to.'
+    )
+
+    parser.add_argument('-r','--repeat',
+        required = False,
+        dest     = 'repeat',
+        type     = int,
+        default  = 5,
+        help     = 'Number of timed runs per mode (best is reported).'
+    )
+
+    options = parser.parse_args()
+
+    return options
+
+def main(options):
+    budgets = default_budgets
+    if (len(options.budget_file) > 0):
+        with open(options.budget_file, 'r') as f:
+            budgets = json.load(f)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmarks(directory)
+
+    within_budget = check_budgets(results, budgets)
+
+    if (len(options.output_filename) > 0):
+        with open(options.output_filename, 'w') as f:
+            json.dump({ 'python'        : sys.version,
+                        'num_files'     : options.num_files,
+                        'results'       : results,
+                        'budgets'       : budgets,
+                        'within_budget' : within_budget }, f, indent=4)
+
+    return within_budget
+
+if __name__ == "__main__":
+    options = parse_args()
+
+    if not main(options):
+        sys.exit(1)